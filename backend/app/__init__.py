@@ -1,12 +1,21 @@
 from flask import Flask
 from flask_cors import CORS
-from flask_jwt_extended import JWTManager
 from config import Config
-from extensions import db, migrate
+from extensions import db, migrate, jwt
 from app.routes.auth import auth_bp
 from app.routes.borrower import borrower_bp
 from app.routes.lender import lender_bp
 from app.routes.mediator import mediator_bp
+from app.routes.events import events_bp
+from app.utils.match_jobs import match_job_runner
+from app.cli import register_commands
+from app.utils.json_cache import json_field_cache
+from app.utils.auth import token_versions, refresh_tokens
+from app.utils.password_hashing import password_hasher
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.fieldsets import sparse_fieldsets
+from app.utils.compression import response_compressor
+from app.utils.events import event_bus
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -18,20 +27,39 @@ def create_app(config_class=Config):
     app.config.from_object(config_class)
 
     # Initialize extensions
-    CORS(app)
+    # after_request hooks run in reverse order; compression must see the final body
+    response_compressor.init_app(app)
+    CORS(app, expose_headers=[NEXT_CURSOR_HEADER])
     db.init_app(app)
     migrate.init_app(app, db)
-    JWTManager(app)
+    jwt.init_app(app)
+    token_versions.init_app(app)
+    refresh_tokens.init_app(app)
+    password_hasher.init_app(app)
+    sparse_fieldsets.init_app(app)
+    match_job_runner.init_app(app)
+    json_field_cache.init_app(app)
+    event_bus.init_app(app)
 
     # Register blueprints
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(borrower_bp, url_prefix='/borrower')
     app.register_blueprint(lender_bp, url_prefix='/lender')
     app.register_blueprint(mediator_bp, url_prefix='/mediator')
+    app.register_blueprint(events_bp, url_prefix='/events')
+
+    # Register CLI commands
+    register_commands(app)
 
     @app.route('/health')
     def health_check():
-        return {'status': 'healthy', 'database': 'PostgreSQL'}
+        return {
+            'status': 'healthy',
+            'database': 'PostgreSQL',
+            'json_field_cache': json_field_cache.stats(),
+            'password_hashing': password_hasher.stats(),
+            'events': event_bus.stats()
+        }
 
     return app
 
@@ -39,4 +67,3 @@ def create_app(config_class=Config):
 if __name__ == '__main__':
     app = create_app()
     app.run(debug=True)
-
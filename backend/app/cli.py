@@ -0,0 +1,115 @@
+import multiprocessing
+import os
+import click
+from extensions import db
+from app.models.models import Lender, Project
+from app.utils.auth import refresh_tokens
+from app.utils.unread_counters import reconcile_unread_counters
+from app.utils.read_cursors import backfill_read_cursors
+from app.utils.rematch import init_worker, rematch_chunk, load_checkpoint, save_checkpoint
+
+
+def register_commands(app):
+    """Register the backend's flask CLI commands."""
+
+    @app.cli.command('backfill-lender-criteria')
+    @click.option('--batch-size', default=500, show_default=True, help='Lenders committed per batch.')
+    def backfill_lender_criteria(batch_size):
+        """
+        Write the normalized criteria columns and rows for every lender.
+
+        Run migrations/lender_criteria.sql first to create them on an existing database.
+        """
+        lender_ids = [lender_id for lender_id, in db.session.query(Lender.id).order_by(Lender.id)]
+
+        for start in range(0, len(lender_ids), batch_size):
+            batch = lender_ids[start:start + batch_size]
+            for lender in Lender.query.filter(Lender.id.in_(batch)).all():
+                lender.normalize_lending_criteria()
+            db.session.commit()
+            click.echo(f'Normalized {min(start + batch_size, len(lender_ids))}/{len(lender_ids)} lenders')
+
+    @app.cli.command('purge-refresh-tokens')
+    def purge_refresh_tokens():
+        """Delete expired refresh tokens."""
+        deleted = refresh_tokens.purge_expired()
+        db.session.commit()
+        click.echo(f'Deleted {deleted} expired refresh tokens')
+
+    @app.cli.command('backfill-read-cursors')
+    def backfill_read_cursors_command():
+        """Create conversation read cursors from the per-message is_read flags."""
+        created = backfill_read_cursors()
+        repaired = reconcile_unread_counters()
+        db.session.commit()
+        click.echo(f'Created {created} read cursors, repaired {repaired} unread counters')
+
+    @app.cli.command('reconcile-unread-counters')
+    @click.option('--user-id', default=None, help='Only reconcile this recipient.')
+    def reconcile_unread(user_id):
+        """Recount unread messages and repair counters that drifted."""
+        repaired = reconcile_unread_counters(user_id)
+        db.session.commit()
+        click.echo(f'Repaired {repaired} unread counters')
+
+    @app.cli.command('rematch')
+    @click.option('--chunk-size', default=200, show_default=True, help='Projects per work unit.')
+    @click.option('--processes', default=os.cpu_count(), show_default=True, help='Worker processes.')
+    @click.option('--min-score', default=0.5, show_default=True, help='Minimum match score.')
+    @click.option('--checkpoint', 'checkpoint_path', default=os.path.join(app.instance_path, 'rematch_checkpoint.json'),
+                  show_default=True, help='Progress file used to resume an interrupted run.')
+    @click.option('--restart', is_flag=True, help='Ignore an existing checkpoint and start over.')
+    @click.option('--dry-run', is_flag=True, help='Report match churn without writing anything.')
+    def rematch(chunk_size, processes, min_score, checkpoint_path, restart, dry_run):
+        """Rescore every project against every lender in parallel."""
+        checkpoint = None if restart or dry_run else load_checkpoint(checkpoint_path)
+        if checkpoint and checkpoint['min_score'] != min_score:
+            raise click.UsageError(f"Checkpoint was written with --min-score {checkpoint['min_score']}; "
+                                   f"pass the same value or --restart.")
+
+        totals = checkpoint['totals'] if checkpoint else {'projects': 0, 'inserted': 0, 'updated': 0, 'deleted': 0}
+
+        # Projects are processed in id order, so everything up to the checkpoint id is done
+        query = db.session.query(Project.id).order_by(Project.id)
+        if checkpoint:
+            query = query.filter(Project.id > checkpoint['last_project_id'])
+            click.echo(f"Resuming after project {checkpoint['last_project_id']}")
+        project_ids = [project_id for project_id, in query]
+        chunks = [project_ids[start:start + chunk_size] for start in range(0, len(project_ids), chunk_size)]
+
+        if not chunks:
+            click.echo('Nothing to rematch')
+            return
+
+        # Workers open their own engines; do not share pooled connections with them
+        database_uri = app.config['SQLALCHEMY_DATABASE_URI']
+        db.session.remove()
+        db.engine.dispose()
+        if not dry_run:
+            os.makedirs(os.path.dirname(os.path.abspath(checkpoint_path)), exist_ok=True)
+
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(processes, initializer=init_worker, initargs=(database_uri, min_score)) as pool:
+            # imap keeps chunk order, which keeps the checkpoint a simple high-water mark
+            results = pool.imap(rematch_chunk, chunks) if not dry_run else pool.imap(_dry_run_chunk, chunks)
+            for done, result in enumerate(results, start=1):
+                for key in totals:
+                    totals[key] += getattr(result, key)
+                if not dry_run:
+                    save_checkpoint(checkpoint_path, {
+                        'min_score': min_score,
+                        'last_project_id': result.last_project_id,
+                        'totals': totals
+                    })
+                click.echo(f"[{done}/{len(chunks)}] {totals['projects']} projects: "
+                           f"+{totals['inserted']} inserted, ~{totals['updated']} updated, -{totals['deleted']} deleted")
+
+        if dry_run:
+            click.echo('Dry run: nothing was written')
+        elif os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+            click.echo('Rematch complete')
+
+
+def _dry_run_chunk(project_ids):
+    return rematch_chunk(project_ids, dry_run=True)
@@ -1,9 +1,16 @@
 from extensions import db
-from werkzeug.security import generate_password_hash, check_password_hash
+from app.utils.json_cache import json_field_cache
+from app.utils.password_hashing import password_hasher
 from datetime import datetime
 import uuid
 import json
 
+# session.info key listing users whose token_version the current transaction bumped
+REVOKED_TOKEN_USERS_KEY = 'revoked_token_users'
+
+# Numbers server-sent events across workers, see app/utils/events.py
+EVENT_ID_SEQUENCE = db.Sequence('event_ids', metadata=db.metadata)
+
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -16,6 +23,8 @@ class User(db.Model):
     company_name = db.Column(db.String(100))
     phone_number = db.Column(db.String(20))
     role = db.Column(db.String(20), nullable=False)  # 'borrower', 'lender', 'mediator'
+    # Part of every access token; bump it to invalidate the user's existing tokens
+    token_version = db.Column(db.Integer, nullable=False, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
@@ -25,10 +34,19 @@ class User(db.Model):
     mediator = db.relationship('Mediator', backref='user', uselist=False, cascade='all, delete-orphan')
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        return password_hasher.needs_rehash(self.password_hash)
+
+    def revoke_tokens(self):
+        """Invalidate all access and refresh tokens issued so far, e.g. after a password change. The caller commits."""
+        self.token_version = (self.token_version or 0) + 1
+        # TokenVersionCache drops the cached version once the transaction commits
+        db.session.info.setdefault(REVOKED_TOKEN_USERS_KEY, set()).add(self.id)
 
     def to_dict(self):
         return {
@@ -57,10 +75,12 @@ class Borrower(db.Model):
 
     def set_additional_info(self, info_dict):
         self.additional_info = json.dumps(info_dict)
+        json_field_cache.invalidate(self.__tablename__, self.id)
 
     def get_additional_info(self):
+        # Shared cached value: read-only, use thaw() for a mutable copy
         if self.additional_info:
-            return json.loads(self.additional_info)
+            return json_field_cache.get(self.__tablename__, self.id, self.updated_at, self.additional_info)
         return {}
 
     def to_dict(self):
@@ -75,21 +95,67 @@ class Borrower(db.Model):
 class Lender(db.Model):
     __tablename__ = 'lenders'
 
+    # Criteria stored as LenderCriterionValue rows
+    CATEGORICAL_CRITERIA = ('asset_types', 'deal_types', 'capital_types')
+
     id = db.Column(db.String(36), db.ForeignKey('users.id'), primary_key=True)
     lending_criteria = db.Column(db.Text)  # JSON string
+    # Normalized copy of lending_criteria for SQL candidate selection
+    min_loan_size = db.Column(db.Float, index=True)
+    max_loan_size = db.Column(db.Float, index=True)
+    criteria_normalized = db.Column(db.Boolean)  # False/NULL: columns do not capture the JSON exactly
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     matches = db.relationship('LenderMatch', backref='lender', lazy='dynamic')
     introduction_requests = db.relationship('IntroductionRequest', backref='lender', lazy='dynamic')
+    criteria_values = db.relationship('LenderCriterionValue', backref='lender', cascade='all, delete-orphan')
 
     def set_lending_criteria(self, criteria_dict):
         self.lending_criteria = json.dumps(criteria_dict)
+        json_field_cache.invalidate(self.__tablename__, self.id)
+        self.normalize_lending_criteria(criteria_dict)
+
+    def normalize_lending_criteria(self, criteria_dict=None):
+        """Rewrite the normalized criteria columns and rows from the JSON criteria."""
+        if criteria_dict is None:
+            criteria_dict = self.get_lending_criteria()
+
+        values = []
+        normalized = isinstance(criteria_dict, dict)
+        min_size = max_size = None
+
+        if normalized:
+            for criterion in self.CATEGORICAL_CRITERIA:
+                items = criteria_dict.get(criterion)
+                if items is None:
+                    continue
+                if not isinstance(items, (list, tuple)):
+                    normalized = False
+                    continue
+                # Non-string items can never equal a project's string column
+                for value in set(item for item in items if isinstance(item, str)):
+                    if len(value) > LenderCriterionValue.value.type.length:
+                        continue
+                    values.append(LenderCriterionValue(criterion=criterion, value=value))
+
+            if 'min_loan_size' in criteria_dict and 'max_loan_size' in criteria_dict:
+                bounds = (criteria_dict['min_loan_size'], criteria_dict['max_loan_size'])
+                if all(isinstance(bound, (int, float)) and bound == bound and abs(bound) <= 2 ** 53 for bound in bounds):
+                    min_size, max_size = float(bounds[0]), float(bounds[1])
+                else:
+                    normalized = False
+
+        self.criteria_values = values
+        self.min_loan_size = min_size
+        self.max_loan_size = max_size
+        self.criteria_normalized = normalized
 
     def get_lending_criteria(self):
+        # Shared cached value: read-only, use thaw() for a mutable copy
         if self.lending_criteria:
-            return json.loads(self.lending_criteria)
+            return json_field_cache.get(self.__tablename__, self.id, self.updated_at, self.lending_criteria)
         return {}
 
     def to_dict(self):
@@ -101,6 +167,17 @@ class Lender(db.Model):
         }
 
 
+class LenderCriterionValue(db.Model):
+    __tablename__ = 'lender_criteria_values'
+    __table_args__ = (
+        db.Index('idx_lender_criteria_values_lookup', 'criterion', 'value', 'lender_id'),
+    )
+
+    lender_id = db.Column(db.String(36), db.ForeignKey('lenders.id'), primary_key=True)
+    criterion = db.Column(db.String(20), primary_key=True)  # 'asset_types', 'deal_types', 'capital_types'
+    value = db.Column(db.String(50), primary_key=True)
+
+
 class Mediator(db.Model):
     __tablename__ = 'mediators'
 
@@ -124,7 +201,7 @@ class Project(db.Model):
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     borrower_id = db.Column(db.String(36), db.ForeignKey('borrowers.id'), nullable=False)
     project_address = db.Column(db.String(255), nullable=False)
-    asset_type = db.Column(db.String(50), nullable=False)
+    asset_type = db.Column(db.String(50), nullable=False, index=True)
     deal_type = db.Column(db.String(50), nullable=False)
     capital_type = db.Column(db.String(50), nullable=False)
     debt_request = db.Column(db.Float)
@@ -187,13 +264,28 @@ class Document(db.Model):
 
 class LenderMatch(db.Model):
     __tablename__ = 'lender_matches'
+    __table_args__ = (
+        db.UniqueConstraint('project_id', 'lender_id', name='uq_lender_matches_project_lender'),
+        # Keyset pagination of match listings, see app/utils/pagination.py
+        db.Index('idx_lender_matches_created', 'created_at', 'id'),
+        db.Index('idx_lender_matches_score', 'match_score', 'id'),
+        db.Index('idx_lender_matches_lender_created', 'lender_id', 'created_at', 'id'),
+        db.Index('idx_lender_matches_lender_score', 'lender_id', 'match_score', 'id'),
+        db.Index('idx_lender_matches_project_created', 'project_id', 'created_at', 'id'),
+        db.Index('idx_lender_matches_project_score', 'project_id', 'match_score', 'id'),
+        db.Index('idx_lender_matches_borrower_created', 'borrower_id', 'created_at', 'id'),
+        db.Index('idx_lender_matches_borrower_score', 'borrower_id', 'match_score', 'id'),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     project_id = db.Column(db.String(36), db.ForeignKey('projects.id'), nullable=False)
     lender_id = db.Column(db.String(36), db.ForeignKey('lenders.id'), nullable=False)
     borrower_id = db.Column(db.String(36), db.ForeignKey('borrowers.id'), nullable=False)
-    match_score = db.Column(db.Float)
+    # NOT NULL: a NULL in the (match_score, id) keyset would end score-ordered paging early
+    match_score = db.Column(db.Float, nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Moves on every score change so listing ETags notice rescoring
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Relationships
     borrower = db.relationship('Borrower', foreign_keys=[borrower_id])
@@ -237,12 +329,17 @@ class IntroductionRequest(db.Model):
 
 class Communication(db.Model):
     __tablename__ = 'communications'
+    __table_args__ = (
+        # Thread order and since/after_id/before windows, see app/utils/pagination.py
+        db.Index('idx_communications_project_created', 'project_id', 'created_at', 'id'),
+    )
 
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     project_id = db.Column(db.String(36), db.ForeignKey('projects.id'), nullable=False)
     sender_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
     recipient_id = db.Column(db.String(36), db.ForeignKey('users.id'), nullable=False)
     message = db.Column(db.Text, nullable=False)
+    # Superseded by message_read_cursors; only read by `flask backfill-read-cursors`
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -250,14 +347,102 @@ class Communication(db.Model):
     sender = db.relationship('User', foreign_keys=[sender_id])
     recipient = db.relationship('User', foreign_keys=[recipient_id])
 
-    def to_dict(self):
+    @property
+    def position(self):
+        """Sort key of the message within its conversation, comparable with a read cursor."""
+        return (self.created_at, self.id)
+
+    def is_read_up_to(self, read_up_to):
+        """
+        Whether the recipient has read this message.
+
+        Args:
+            read_up_to: The recipient's read cursor position for the project, or None
+        """
+        return read_up_to is not None and self.position <= read_up_to
+
+    def to_dict(self, read_up_to=None):
         return {
             'id': self.id,
             'project_id': self.project_id,
             'sender_id': self.sender_id,
             'recipient_id': self.recipient_id,
             'message': self.message,
-            'is_read': self.is_read,
+            'is_read': self.is_read_up_to(read_up_to),
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
+
+class MessageReadCursor(db.Model):
+    """How far a participant has read a project's conversation; messages at or before it are read."""
+    __tablename__ = 'message_read_cursors'
+
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    project_id = db.Column(db.String(36), db.ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True)
+    # (created_at, id) of the last read message, the same order the thread is listed in
+    read_up_to_at = db.Column(db.DateTime, nullable=False)
+    read_up_to_id = db.Column(db.String(36), nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    @property
+    def position(self):
+        return (self.read_up_to_at, self.read_up_to_id)
+
+    def to_dict(self):
+        return {
+            'project_id': self.project_id,
+            'read_up_to_id': self.read_up_to_id,
+            'read_up_to_at': self.read_up_to_at.isoformat(),
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class UnreadCounter(db.Model):
+    """Unread messages per recipient and project: received messages past the recipient's read cursor."""
+    __tablename__ = 'unread_counters'
+
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    project_id = db.Column(db.String(36), db.ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True)
+    unread_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class MatchJob(db.Model):
+    __tablename__ = 'match_jobs'
+
+    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    project_id = db.Column(db.String(36), db.ForeignKey('projects.id'), nullable=False)
+    status = db.Column(db.String(20), default='pending', index=True)  # 'pending', 'running', 'done', 'failed'
+    attempts = db.Column(db.Integer, default=0)
+    match_count = db.Column(db.Integer)
+    worker_id = db.Column(db.String(64))
+    error = db.Column(db.Text)
+    heartbeat_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    # Relationships
+    project = db.relationship('Project')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'project_id': self.project_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'match_count': self.match_count,
+            'error': self.error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+
+class RefreshToken(db.Model):
+    __tablename__ = 'refresh_tokens'
+
+    jti = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.String(36), db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    family_id = db.Column(db.String(36), nullable=False, index=True)  # All tokens rotated from one login
+    replaced_by = db.Column(db.String(36))
+    expires_at = db.Column(db.DateTime, nullable=False)
+    revoked_at = db.Column(db.DateTime)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -1,8 +1,10 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity
 from app.models.models import User, Borrower, Lender, Mediator
 from extensions import db
-from werkzeug.security import generate_password_hash
+from app.utils.lender_index import lender_index
+from app.utils.auth import refresh_tokens
+from app.utils.conditional import not_modified, add_validators, profile_validators
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -19,11 +21,17 @@ def login():
     if not user or not user.check_password(data['password']):
         return jsonify({'error': 'Invalid email or password'}), 401
 
-    access_token = create_access_token(identity=user.id)
+    # Upgrade hashes made with older cost parameters while the password is at hand
+    if user.password_needs_rehash():
+        user.set_password(data['password'])
+
+    access_token, refresh_token = refresh_tokens.issue(user)
+    db.session.commit()
 
     return jsonify({
         'user': user.to_dict(),
-        'access_token': access_token
+        'access_token': access_token,
+        'refresh_token': refresh_token
     }), 200
 
 
@@ -48,6 +56,8 @@ def register():
     user.set_password(data['password'])
 
     db.session.add(user)
+    # Assign the user id before the role-specific record references it
+    db.session.flush()
 
     # Create role-specific record
     if data['role'] == 'borrower':
@@ -64,26 +74,81 @@ def register():
         mediator = Mediator(id=user.id, commission_rate=data.get('commissionRate'))
         db.session.add(mediator)
 
+    access_token, refresh_token = refresh_tokens.issue(user)
     db.session.commit()
 
-    access_token = create_access_token(identity=user.id)
+    if data['role'] == 'lender':
+        lender_index.update(lender)
 
     return jsonify({
         'user': user.to_dict(),
-        'access_token': access_token
+        'access_token': access_token,
+        'refresh_token': refresh_token
     }), 201
 
 
+@auth_bp.route('/refresh', methods=['POST'])
+@jwt_required(refresh=True)
+def refresh():
+    user = User.query.get(get_jwt_identity())
+
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    tokens = refresh_tokens.rotate(get_jwt(), user)
+    db.session.commit()
+
+    if tokens is None:
+        return jsonify({'error': 'Refresh token has already been used'}), 401
+
+    access_token, refresh_token = tokens
+
+    return jsonify({
+        'access_token': access_token,
+        'refresh_token': refresh_token
+    }), 200
+
+
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required(refresh=True)
+def logout():
+    refresh_tokens.revoke_family(get_jwt()['fam'])
+    db.session.commit()
+
+    return jsonify({'message': 'Logged out successfully'}), 200
+
+
+@auth_bp.route('/logout-all', methods=['POST'])
+@jwt_required()
+def logout_all():
+    user = User.query.get(get_jwt_identity())
+
+    if not user:
+        return jsonify({'error': 'User not found'}), 404
+
+    # Ends every session of the user, including this one
+    user.revoke_tokens()
+    db.session.commit()
+
+    return jsonify({'message': 'Logged out of all sessions'}), 200
+
+
 @auth_bp.route('/profile', methods=['GET'])
 @jwt_required()
 def get_profile():
     user_id = get_jwt_identity()
+
+    etag, last_modified = profile_validators(user_id)
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
+
     user = User.query.get(user_id)
 
     if not user:
         return jsonify({'error': 'User not found'}), 404
 
-    return jsonify(user.to_dict()), 200
+    return add_validators(jsonify(user.to_dict()), etag, last_modified), 200
 
 
 @auth_bp.route('/change-password', methods=['POST'])
@@ -104,7 +169,14 @@ def change_password():
         return jsonify({'error': 'Current password is incorrect'}), 401
 
     user.set_password(data['newPassword'])
+    # Sign out every other session; this client continues with the new tokens
+    user.revoke_tokens()
+    access_token, refresh_token = refresh_tokens.issue(user)
     db.session.commit()
 
-    return jsonify({'message': 'Password changed successfully'}), 200
+    return jsonify({
+        'message': 'Password changed successfully',
+        'access_token': access_token,
+        'refresh_token': refresh_token
+    }), 200
 
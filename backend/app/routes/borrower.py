@@ -1,41 +1,44 @@
 from flask import Blueprint, request, jsonify, current_app, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models.models import User, Borrower, Lender, Project, Document, LenderMatch, IntroductionRequest, Communication
+from app.models.models import User, Borrower, Lender, Project, Document, LenderMatch, IntroductionRequest, Communication, MatchJob
 from extensions import db
 from app.utils.file_storage import save_file, get_file_path
-from app.utils.match_algorithm import find_matching_lenders
+from app.utils.match_algorithm import top_matching_lenders
+from app.utils.match_store import match_fields, sync_project_matches
+from app.utils.match_jobs import match_job_runner
+from app.utils.auth import role_required, current_role
+from app.utils.pagination import match_page, message_page, is_message_window, InvalidPageRequest
+from app.utils.streaming import listing_response
+from app.utils.serialization import FieldPlan, MatchListing, PROJECT_FIELDS, json_response
+from app.utils.fieldsets import fields_for_projection
+from app.utils.unread_counters import increment_unread, unread_counts
+from app.utils.read_cursors import advance_read_cursor, latest_message, read_cursors
+from app.utils.conditional import (not_modified, add_validators, profile_validators, project_list_validators,
+                                   match_list_validators, message_list_validators)
 import os
 from datetime import datetime
 from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import joinedload
 
 borrower_bp = Blueprint('borrower', __name__)
 
+# A borrower's matches with their project and lender
+match_listing = MatchListing(parties=('lender',))
 
-# Helper functions to check user roles
-def is_lender(user_id):
-    user = User.query.get(user_id)
-    return user and user.role == 'lender'
-
-
-def is_mediator(user_id):
-    user = User.query.get(user_id)
-    return user and user.role == 'mediator'
-
-
-def is_borrower(user_id):
-    user = User.query.get(user_id)
-    return user and user.role == 'borrower'
+project_plan = FieldPlan(Project, PROJECT_FIELDS)
 
 
 @borrower_bp.route('/profile', methods=['GET'])
-@jwt_required()
+@role_required('borrower')
 def get_profile():
     user_id = get_jwt_identity()
 
-    if not is_borrower(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     try:
+        etag, last_modified = profile_validators(user_id, Borrower)
+        cached = not_modified(etag, last_modified)
+        if cached:
+            return cached
+
         borrower = Borrower.query.get(user_id)
         user = User.query.get(user_id)
 
@@ -47,19 +50,16 @@ def get_profile():
             **user.to_dict()
         }
 
-        return jsonify(profile_data), 200
+        return add_validators(jsonify(profile_data), etag, last_modified), 200
     except SQLAlchemyError as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
 
 
 @borrower_bp.route('/profile', methods=['PUT'])
-@jwt_required()
+@role_required('borrower')
 def update_profile():
     user_id = get_jwt_identity()
 
-    if not is_borrower(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     try:
         data = request.get_json()
         if not data:
@@ -104,28 +104,32 @@ def update_profile():
 
 
 @borrower_bp.route('/projects', methods=['GET'])
-@jwt_required()
+@role_required('borrower')
 def get_projects():
     user_id = get_jwt_identity()
 
-    if not is_borrower(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     try:
-        projects = Project.query.filter_by(borrower_id=user_id).order_by(Project.created_at.desc()).all()
-        return jsonify([project.to_dict() for project in projects]), 200
+        etag, last_modified = project_list_validators(user_id)
+        cached = not_modified(etag, last_modified)
+        if cached:
+            return cached
+
+        # Only the requested columns are selected
+        plan = project_plan.select(fields_for_projection() or PROJECT_FIELDS)
+        rows = db.session.query(*(plan.columns or [Project.id])).filter(
+            Project.borrower_id == user_id
+        ).order_by(Project.created_at.desc())
+
+        return add_validators(json_response([plan.build(row) for row in rows]), etag, last_modified), 200
     except SQLAlchemyError as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
 
 
 @borrower_bp.route('/projects/<project_id>', methods=['GET'])
-@jwt_required()
+@role_required('borrower')
 def get_project(project_id):
     user_id = get_jwt_identity()
 
-    if not is_borrower(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     try:
         project = Project.query.filter_by(id=project_id, borrower_id=user_id).first()
 
@@ -138,13 +142,10 @@ def get_project(project_id):
 
 
 @borrower_bp.route('/projects', methods=['POST'])
-@jwt_required()
+@role_required('borrower')
 def create_project():
     user_id = get_jwt_identity()
 
-    if not is_borrower(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     try:
         data = request.get_json()
 
@@ -169,24 +170,15 @@ def create_project():
         )
 
         db.session.add(project)
-        db.session.commit()
-
-        # Find matching lenders using the algorithm
-        matching_lenders = find_matching_lenders(project)
-
-        # Create matches in the database
-        for lender, score in matching_lenders:
-            match = LenderMatch(
-                project_id=project.id,
-                lender_id=lender.id,
-                borrower_id=user_id,
-                match_score=score
-            )
-            db.session.add(match)
+        db.session.flush()
 
+        # Matching runs in the background; the job is committed with the project
+        job = match_job_runner.enqueue(project)
         db.session.commit()
 
-        return jsonify(project.to_dict()), 201
+        match_job_runner.submit(job.id)
+
+        return jsonify({**project.to_dict(), 'match_job_id': job.id}), 201
     except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({'error': f'Database error: {str(e)}'}), 500
@@ -195,13 +187,10 @@ def create_project():
 
 
 @borrower_bp.route('/projects/<project_id>', methods=['PUT'])
-@jwt_required()
+@role_required('borrower')
 def update_project(project_id):
     user_id = get_jwt_identity()
 
-    if not is_borrower(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     try:
         project = Project.query.filter_by(id=project_id, borrower_id=user_id).first()
 
@@ -213,6 +202,8 @@ def update_project(project_id):
         if not data:
             return jsonify({'error': 'No data provided'}), 400
 
+        previous_match_fields = match_fields(project)
+
         if data.get('projectAddress'):
             project.project_address = data['projectAddress']
         if data.get('assetType'):
@@ -232,6 +223,9 @@ def update_project(project_id):
 
         project.updated_at = datetime.utcnow()
 
+        # Apply the match diff in the same transaction as the edit
+        sync_project_matches(project, previous_match_fields)
+
         db.session.commit()
 
         return jsonify(project.to_dict()), 200
@@ -242,34 +236,74 @@ def update_project(project_id):
         return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
 
 
+@borrower_bp.route('/match-jobs/<job_id>', methods=['GET'])
+@role_required('borrower')
+def get_match_job(job_id):
+    user_id = get_jwt_identity()
+
+    try:
+        job = MatchJob.query.join(Project).filter(MatchJob.id == job_id, Project.borrower_id == user_id).first()
+
+        if not job:
+            return jsonify({'error': 'Match job not found'}), 404
+
+        return jsonify(job.to_dict()), 200
+    except SQLAlchemyError as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
+
 @borrower_bp.route('/matches', methods=['GET'])
-@jwt_required()
+@role_required('borrower')
 def get_matches():
     user_id = get_jwt_identity()
 
-    if not is_borrower(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
+    try:
+        etag, last_modified = match_list_validators(LenderMatch.borrower_id == user_id)
+        cached = not_modified(etag, last_modified)
+        if cached:
+            return cached
+
+        listing = match_listing.select(fields_for_projection())
+        query = listing.query().filter(LenderMatch.borrower_id == user_id)
+
+        try:
+            page = match_page(query, request.args)
+        except InvalidPageRequest as e:
+            return jsonify({'error': str(e)}), 400
+
+        return add_validators(listing_response(page, listing.serialize), etag), 200
+    except SQLAlchemyError as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
+
+@borrower_bp.route('/projects/<project_id>/top-lenders', methods=['GET'])
+@role_required('borrower')
+def get_top_lenders(project_id):
+    user_id = get_jwt_identity()
 
     try:
-        matches = LenderMatch.query.join(Project).filter(Project.borrower_id == user_id).order_by(
-            LenderMatch.created_at.desc()).all()
+        project = Project.query.filter_by(id=project_id, borrower_id=user_id).first()
 
-        result = []
-        for match in matches:
-            match_data = match.to_dict()
-            match_data['project'] = match.project.to_dict()
-
-            # Get lender info
-            lender_user = User.query.get(match.lender_id)
-            if lender_user:
-                match_data['lender'] = {
-                    'id': match.lender_id,
-                    'company_name': lender_user.company_name,
-                    'first_name': lender_user.first_name,
-                    'last_name': lender_user.last_name
-                }
+        if not project:
+            return jsonify({'error': 'Project not found'}), 404
+
+        limit = min(max(request.args.get('limit', 25, type=int), 1), 100)
+        top_lenders = top_matching_lenders(project, k=limit)
 
-            result.append(match_data)
+        lender_users = {user.id: user for user in User.query.filter(User.id.in_([lender.id for lender, _ in top_lenders]))}
+
+        result = []
+        for lender, score in top_lenders:
+            lender_user = lender_users.get(lender.id)
+            result.append({
+                'lender': {
+                    'id': lender.id,
+                    'company_name': lender_user.company_name if lender_user else None,
+                    'first_name': lender_user.first_name if lender_user else None,
+                    'last_name': lender_user.last_name if lender_user else None
+                },
+                'match_score': score
+            })
 
         return jsonify(result), 200
     except SQLAlchemyError as e:
@@ -277,13 +311,10 @@ def get_matches():
 
 
 @borrower_bp.route('/request-introduction', methods=['POST'])
-@jwt_required()
+@role_required('borrower')
 def request_introduction():
     user_id = get_jwt_identity()
 
-    if not is_borrower(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     try:
         data = request.get_json()
 
@@ -330,13 +361,10 @@ def request_introduction():
 
 
 @borrower_bp.route('/projects/<project_id>/documents', methods=['GET'])
-@jwt_required()
+@role_required('borrower')
 def get_documents(project_id):
     user_id = get_jwt_identity()
 
-    if not is_borrower(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     try:
         # Check if project belongs to borrower
         project = Project.query.filter_by(id=project_id, borrower_id=user_id).first()
@@ -352,13 +380,10 @@ def get_documents(project_id):
 
 
 @borrower_bp.route('/projects/<project_id>/documents', methods=['POST'])
-@jwt_required()
+@role_required('borrower')
 def upload_document(project_id):
     user_id = get_jwt_identity()
 
-    if not is_borrower(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     try:
         # Check if project belongs to borrower
         project = Project.query.filter_by(id=project_id, borrower_id=user_id).first()
@@ -416,7 +441,7 @@ def download_document(document_id):
         # Check if user has access to the document
         project = Project.query.get(document.project_id)
 
-        if not project or (project.borrower_id != user_id and not is_lender(user_id) and not is_mediator(user_id)):
+        if not project or (project.borrower_id != user_id and current_role() not in ('lender', 'mediator')):
             return jsonify({'error': 'Unauthorized access'}), 403
 
         try:
@@ -433,13 +458,10 @@ def download_document(document_id):
 
 
 @borrower_bp.route('/projects/<project_id>/messages', methods=['GET'])
-@jwt_required()
+@role_required('borrower')
 def get_messages(project_id):
     user_id = get_jwt_identity()
 
-    if not is_borrower(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     try:
         # Check if project belongs to borrower
         project = Project.query.filter_by(id=project_id, borrower_id=user_id).first()
@@ -447,16 +469,37 @@ def get_messages(project_id):
         if not project:
             return jsonify({'error': 'Project not found or does not belong to borrower'}), 404
 
-        messages = Communication.query.filter_by(project_id=project_id).filter(
+        # Validators aggregate the whole thread; windows are cheaper to answer directly
+        etag = None
+        if not is_message_window(request.args):
+            etag, last_modified = message_list_validators(
+                project_id,
+                (Communication.sender_id == user_id) | (Communication.recipient_id == user_id)
+            )
+            cached = not_modified(etag, last_modified)
+            if cached:
+                return cached
+
+        query = Communication.query.options(
+            joinedload(Communication.sender),
+            joinedload(Communication.recipient)
+        ).filter_by(project_id=project_id).filter(
             (Communication.sender_id == user_id) | (Communication.recipient_id == user_id)
-        ).order_by(Communication.created_at).all()
+        )
 
-        result = []
-        for message in messages:
-            message_data = message.to_dict()
+        try:
+            page = message_page(query, project_id, request.args)
+        except InvalidPageRequest as e:
+            return jsonify({'error': str(e)}), 400
+
+        # is_read of every message comes from its recipient's cursor
+        cursors = read_cursors(project_id)
+
+        def serialize(message):
+            message_data = message.to_dict(cursors.get(message.recipient_id))
 
             # Get sender info
-            sender = User.query.get(message.sender_id)
+            sender = message.sender
             if sender:
                 message_data['sender'] = {
                     'id': sender.id,
@@ -467,7 +510,7 @@ def get_messages(project_id):
                 }
 
             # Get recipient info
-            recipient = User.query.get(message.recipient_id)
+            recipient = message.recipient
             if recipient:
                 message_data['recipient'] = {
                     'id': recipient.id,
@@ -477,21 +520,18 @@ def get_messages(project_id):
                     'role': recipient.role
                 }
 
-            result.append(message_data)
+            return message_data
 
-        return jsonify(result), 200
+        return add_validators(listing_response(page, serialize), etag), 200
     except SQLAlchemyError as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
 
 
 @borrower_bp.route('/projects/<project_id>/messages', methods=['POST'])
-@jwt_required()
+@role_required('borrower')
 def send_message(project_id):
     user_id = get_jwt_identity()
 
-    if not is_borrower(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     try:
         # Check if project belongs to borrower
         project = Project.query.filter_by(id=project_id, borrower_id=user_id).first()
@@ -518,6 +558,7 @@ def send_message(project_id):
         )
 
         db.session.add(communication)
+        increment_unread(communication.recipient_id, project_id)
         db.session.commit()
 
         return jsonify(communication.to_dict()), 201
@@ -529,23 +570,21 @@ def send_message(project_id):
 
 
 @borrower_bp.route('/messages/<message_id>/read', methods=['PUT'])
-@jwt_required()
+@role_required('borrower')
 def mark_message_as_read(message_id):
     user_id = get_jwt_identity()
 
-    if not is_borrower(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     try:
         message = Communication.query.filter_by(id=message_id, recipient_id=user_id).first()
 
         if not message:
             return jsonify({'error': 'Message not found or user is not the recipient'}), 404
 
-        message.is_read = True
+        # Reading a message marks the conversation read up to it
+        cursor, _ = advance_read_cursor(user_id, message.project_id, message)
         db.session.commit()
 
-        return jsonify(message.to_dict()), 200
+        return jsonify(message.to_dict(cursor.position)), 200
     except SQLAlchemyError as e:
         db.session.rollback()
         return jsonify({'error': f'Database error: {str(e)}'}), 500
@@ -553,18 +592,55 @@ def mark_message_as_read(message_id):
         return jsonify({'error': f'Unexpected error: {str(e)}'}), 500
 
 
+@borrower_bp.route('/projects/<project_id>/read', methods=['PUT'])
+@role_required('borrower')
+def mark_conversation_as_read(project_id):
+    user_id = get_jwt_identity()
+
+    try:
+        # Check if project belongs to borrower
+        project = Project.query.filter_by(id=project_id, borrower_id=user_id).first()
+
+        if not project:
+            return jsonify({'error': 'Project not found or does not belong to borrower'}), 404
+
+        data = request.get_json(silent=True) or {}
+
+        # Read up to the given message, or the whole conversation
+        if data.get('messageId'):
+            message = Communication.query.filter_by(id=data['messageId'], project_id=project_id).filter(
+                (Communication.sender_id == user_id) | (Communication.recipient_id == user_id)
+            ).first()
+            if not message:
+                return jsonify({'error': 'Message not found in this conversation'}), 404
+        else:
+            message = latest_message(user_id, project_id)
+
+        cursor, marked_read = None, 0
+        if message:
+            cursor, marked_read = advance_read_cursor(user_id, project_id, message)
+            db.session.commit()
+
+        _, projects = unread_counts(user_id)
+
+        return jsonify({
+            'read_cursor': cursor.to_dict() if cursor else None,
+            'marked_read': marked_read,
+            'unread_count': projects.get(project_id, 0)
+        }), 200
+    except SQLAlchemyError as e:
+        db.session.rollback()
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
+
+
 @borrower_bp.route('/unread-messages', methods=['GET'])
-@jwt_required()
+@role_required('borrower')
 def get_unread_message_count():
     user_id = get_jwt_identity()
 
-    if not is_borrower(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     try:
-        count = Communication.query.filter_by(recipient_id=user_id, is_read=False).count()
+        count, projects = unread_counts(user_id)
 
-        return jsonify({'count': count}), 200
+        return jsonify({'count': count, 'projects': projects}), 200
     except SQLAlchemyError as e:
         return jsonify({'error': f'Database error: {str(e)}'}), 500
-
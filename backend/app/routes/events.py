@@ -0,0 +1,33 @@
+from flask import Blueprint, Response, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from app.utils.events import event_bus
+
+events_bp = Blueprint('events', __name__)
+
+
+@events_bp.route('/stream', methods=['GET'])
+# EventSource cannot set headers, so browsers pass the token as ?jwt=
+@jwt_required(locations=['headers', 'query_string'])
+def stream_events():
+    user_id = get_jwt_identity()
+
+    # Browsers resend the last id as a header; polyfills often use a query parameter
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    if last_event_id:
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            return jsonify({'error': 'Invalid Last-Event-ID'}), 400
+    else:
+        last_event_id = None
+
+    if not event_bus.accepting():
+        response = jsonify({'error': 'Too many open event streams, retry later'})
+        response.headers['Retry-After'] = '5'
+        return response, 503
+
+    response = Response(event_bus.stream(user_id, last_event_id), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    # Keep nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
@@ -1,25 +1,33 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask_jwt_extended import get_jwt_identity
 from app.models.models import User, Lender, LenderMatch, IntroductionRequest, Project, Borrower
 from extensions import db
+from sqlalchemy.orm import joinedload
+from app.utils.auth import role_required
+from app.utils.lender_index import lender_index
+from app.utils.match_store import sync_lender_matches
+from app.utils.pagination import match_page, InvalidPageRequest
+from app.utils.streaming import listing_response
+from app.utils.serialization import MatchListing
+from app.utils.fieldsets import fields_for_projection
+from app.utils.conditional import not_modified, add_validators, profile_validators, match_list_validators
 from datetime import datetime
 
 lender_bp = Blueprint('lender', __name__)
 
-
-# Helper function to check if user is a lender
-def is_lender(user_id):
-    user = User.query.get(user_id)
-    return user and user.role == 'lender'
+# A lender's matches with their project and borrower
+match_listing = MatchListing(parties=('borrower',))
 
 
 @lender_bp.route('/profile', methods=['GET'])
-@jwt_required()
+@role_required('lender')
 def get_profile():
     user_id = get_jwt_identity()
 
-    if not is_lender(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
+    etag, last_modified = profile_validators(user_id, Lender)
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
 
     lender = Lender.query.get(user_id)
     user = User.query.get(user_id)
@@ -32,17 +40,14 @@ def get_profile():
         **user.to_dict()
     }
 
-    return jsonify(profile_data), 200
+    return add_validators(jsonify(profile_data), etag, last_modified), 200
 
 
 @lender_bp.route('/profile', methods=['PUT'])
-@jwt_required()
+@role_required('lender')
 def update_profile():
     user_id = get_jwt_identity()
 
-    if not is_lender(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     data = request.get_json()
 
     user = User.query.get(user_id)
@@ -64,12 +69,16 @@ def update_profile():
     # Update lender data
     if data.get('lendingCriteria'):
         lender.set_lending_criteria(data['lendingCriteria'])
+        # Rescore this lender against existing projects in the same transaction
+        sync_lender_matches(lender)
 
     user.updated_at = datetime.utcnow()
     lender.updated_at = datetime.utcnow()
 
     db.session.commit()
 
+    lender_index.update(lender)
+
     profile_data = {
         **lender.to_dict(),
         **user.to_dict()
@@ -79,46 +88,35 @@ def update_profile():
 
 
 @lender_bp.route('/matches', methods=['GET'])
-@jwt_required()
+@role_required('lender')
 def get_matches():
     user_id = get_jwt_identity()
 
-    if not is_lender(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
+    etag, last_modified = match_list_validators(LenderMatch.lender_id == user_id)
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
 
-    matches = LenderMatch.query.filter_by(lender_id=user_id).order_by(LenderMatch.created_at.desc()).all()
+    listing = match_listing.select(fields_for_projection())
+    query = listing.query().filter(LenderMatch.lender_id == user_id)
 
-    result = []
-    for match in matches:
-        match_data = match.to_dict()
-        match_data['project'] = match.project.to_dict()
+    try:
+        page = match_page(query, request.args)
+    except InvalidPageRequest as e:
+        return jsonify({'error': str(e)}), 400
 
-        # Get borrower info
-        borrower = Borrower.query.get(match.borrower_id)
-        borrower_user = User.query.get(match.borrower_id)
-
-        if borrower and borrower_user:
-            match_data['borrower'] = {
-                'id': borrower.id,
-                'company_name': borrower_user.company_name,
-                'first_name': borrower_user.first_name,
-                'last_name': borrower_user.last_name
-            }
-
-        result.append(match_data)
-
-    return jsonify(result), 200
+    return add_validators(listing_response(page, listing.serialize), etag), 200
 
 
 @lender_bp.route('/introduction-requests', methods=['GET'])
-@jwt_required()
+@role_required('lender')
 def get_introduction_requests():
     user_id = get_jwt_identity()
 
-    if not is_lender(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
-
-    requests = IntroductionRequest.query.filter_by(
+    requests = IntroductionRequest.query.options(
+        joinedload(IntroductionRequest.project),
+        joinedload(IntroductionRequest.borrower).joinedload(Borrower.user)
+    ).filter_by(
         lender_id=user_id,
         request_status='pending'
     ).order_by(IntroductionRequest.requested_at.desc()).all()
@@ -129,8 +127,8 @@ def get_introduction_requests():
         req_data['project'] = req.project.to_dict()
 
         # Get borrower info
-        borrower = Borrower.query.get(req.borrower_id)
-        borrower_user = User.query.get(req.borrower_id)
+        borrower = req.borrower
+        borrower_user = borrower.user if borrower else None
 
         if borrower and borrower_user:
             req_data['borrower'] = {
@@ -146,13 +144,10 @@ def get_introduction_requests():
 
 
 @lender_bp.route('/introduction-requests/<request_id>/respond', methods=['POST'])
-@jwt_required()
+@role_required('lender')
 def respond_to_introduction(request_id):
     user_id = get_jwt_identity()
 
-    if not is_lender(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     data = request.get_json()
 
     if not data or 'accept' not in data:
@@ -1,25 +1,32 @@
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.models.models import User, Mediator, LenderMatch, Project, Borrower, Lender
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy.exc import SQLAlchemyError
+from app.models.models import User, Mediator, Project
 from extensions import db
+from app.utils.auth import role_required
+from app.utils.match_algorithm import top_matching_lenders
+from app.utils.pagination import match_page, InvalidPageRequest
+from app.utils.streaming import listing_response
+from app.utils.serialization import MatchListing
+from app.utils.fieldsets import fields_for_projection
+from app.utils.conditional import not_modified, add_validators, profile_validators, match_list_validators
 from datetime import datetime
 
 mediator_bp = Blueprint('mediator', __name__)
 
-
-# Helper function to check if user is a mediator
-def is_mediator(user_id):
-    user = User.query.get(user_id)
-    return user and user.role == 'mediator'
+# Every match with its project, borrower and lender
+match_listing = MatchListing(parties=('borrower', 'lender'))
 
 
 @mediator_bp.route('/profile', methods=['GET'])
-@jwt_required()
+@role_required('mediator')
 def get_profile():
     user_id = get_jwt_identity()
 
-    if not is_mediator(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
+    etag, last_modified = profile_validators(user_id, Mediator)
+    cached = not_modified(etag, last_modified)
+    if cached:
+        return cached
 
     mediator = Mediator.query.get(user_id)
     user = User.query.get(user_id)
@@ -32,17 +39,14 @@ def get_profile():
         **user.to_dict()
     }
 
-    return jsonify(profile_data), 200
+    return add_validators(jsonify(profile_data), etag, last_modified), 200
 
 
 @mediator_bp.route('/profile', methods=['PUT'])
-@jwt_required()
+@role_required('mediator')
 def update_profile():
     user_id = get_jwt_identity()
 
-    if not is_mediator(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
-
     data = request.get_json()
 
     user = User.query.get(user_id)
@@ -79,45 +83,50 @@ def update_profile():
 
 
 @mediator_bp.route('/matches', methods=['GET'])
-@jwt_required()
+@role_required('mediator')
 def get_all_matches():
-    user_id = get_jwt_identity()
+    try:
+        etag, last_modified = match_list_validators()
+        cached = not_modified(etag, last_modified)
+        if cached:
+            return cached
+
+        listing = match_listing.select(fields_for_projection())
+
+        try:
+            page = match_page(listing.query(), request.args)
+        except InvalidPageRequest as e:
+            return jsonify({'error': str(e)}), 400
 
-    if not is_mediator(user_id):
-        return jsonify({'error': 'Unauthorized access'}), 403
+        return add_validators(listing_response(page, listing.serialize), etag), 200
+    except SQLAlchemyError as e:
+        return jsonify({'error': f'Database error: {str(e)}'}), 500
 
-    matches = LenderMatch.query.order_by(LenderMatch.created_at.desc()).all()
+
+@mediator_bp.route('/projects/<project_id>/top-lenders', methods=['GET'])
+@role_required('mediator')
+def get_top_lenders(project_id):
+    project = Project.query.get(project_id)
+
+    if not project:
+        return jsonify({'error': 'Project not found'}), 404
+
+    limit = min(max(request.args.get('limit', 25, type=int), 1), 100)
+    top_lenders = top_matching_lenders(project, k=limit)
+
+    lender_users = {user.id: user for user in User.query.filter(User.id.in_([lender.id for lender, _ in top_lenders]))}
 
     result = []
-    for match in matches:
-        match_data = match.to_dict()
-        match_data['project'] = match.project.to_dict()
-
-        # Get borrower info
-        borrower = Borrower.query.get(match.borrower_id)
-        borrower_user = User.query.get(match.borrower_id)
-
-        if borrower and borrower_user:
-            match_data['borrower'] = {
-                'id': borrower.id,
-                'company_name': borrower_user.company_name,
-                'first_name': borrower_user.first_name,
-                'last_name': borrower_user.last_name
-            }
-
-        # Get lender info
-        lender = Lender.query.get(match.lender_id)
-        lender_user = User.query.get(match.lender_id)
-
-        if lender and lender_user:
-            match_data['lender'] = {
+    for lender, score in top_lenders:
+        lender_user = lender_users.get(lender.id)
+        result.append({
+            'lender': {
                 'id': lender.id,
-                'company_name': lender_user.company_name,
-                'first_name': lender_user.first_name,
-                'last_name': lender_user.last_name
-            }
-
-        result.append(match_data)
+                'company_name': lender_user.company_name if lender_user else None,
+                'first_name': lender_user.first_name if lender_user else None,
+                'last_name': lender_user.last_name if lender_user else None
+            },
+            'match_score': score
+        })
 
     return jsonify(result), 200
-
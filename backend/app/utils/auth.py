@@ -0,0 +1,269 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from functools import wraps
+from flask import current_app, jsonify
+from sqlalchemy import event, select
+from flask_jwt_extended import create_access_token, create_refresh_token, get_jwt, verify_jwt_in_request
+from extensions import db, jwt
+from app.models.models import User, RefreshToken, REVOKED_TOKEN_USERS_KEY
+
+
+class TokenVersionCache:
+    """
+    Per-process cache of users' token_version.
+
+    Access tokens carry the user's role and token_version as claims, so role checks
+    need no database access. Bumping users.token_version (see User.revoke_tokens)
+    invalidates every token issued before the change; other workers notice within
+    ttl seconds, the worker that made the change as soon as its transaction commits.
+    """
+
+    def __init__(self, ttl=30):
+        self.ttl = ttl
+        self._versions = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('TOKEN_VERSION_CACHE_SECONDS', self.ttl)
+
+        for name, listener in (('after_commit', _invalidate_revoked),
+                               ('after_rollback', _discard_revoked)):
+            if not event.contains(db.session, name, listener):
+                event.listen(db.session, name, listener)
+
+    def get(self, user_id):
+        """
+        Current token version of a user.
+
+        Args:
+            user_id: User id
+
+        Returns:
+            int or None: The version, or None if the user no longer exists
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._versions.get(user_id)
+        if entry is not None and now - entry[1] < self.ttl:
+            return entry[0]
+
+        row = db.session.query(User.token_version).filter(User.id == user_id).first()
+        version = row[0] if row else None
+        self.set(user_id, version, now)
+        return version
+
+    def set(self, user_id, version, fetched_at=None):
+        with self._lock:
+            self._versions[user_id] = (version, time.monotonic() if fetched_at is None else fetched_at)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._versions.pop(user_id, None)
+
+
+# One cache per worker process
+token_versions = TokenVersionCache()
+
+
+def _invalidate_revoked(session):
+    for user_id in session.info.pop(REVOKED_TOKEN_USERS_KEY, ()):
+        token_versions.invalidate(user_id)
+
+
+def _discard_revoked(session):
+    session.info.pop(REVOKED_TOKEN_USERS_KEY, None)
+
+
+class RefreshTokenStore:
+    """
+    Refresh token rotation backed by the refresh_tokens table.
+
+    A refresh token works once: rotate() revokes it and issues a successor in the
+    same family. Presenting a token that was already rotated means it leaked, so
+    the whole family is revoked. Revocation checks are answered from a per-process
+    cache; revoked tokens can never become valid again and stay cached until
+    evicted, valid ones are rechecked against the table after ttl seconds.
+    Rotated tokens are not refused by the check itself so that rotate() sees
+    their reuse and can revoke the family.
+    """
+
+    def __init__(self, ttl=30, maxsize=10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._status = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('REFRESH_TOKEN_CACHE_SECONDS', self.ttl)
+        self.maxsize = app.config.get('REFRESH_TOKEN_CACHE_SIZE', self.maxsize)
+
+    def _remember(self, jti, revoked):
+        with self._lock:
+            self._status[jti] = (revoked, time.monotonic())
+            self._status.move_to_end(jti)
+            while len(self._status) > self.maxsize:
+                self._status.popitem(last=False)
+
+    def is_revoked(self, jti):
+        """
+        Whether a refresh token was revoked or never issued.
+
+        Args:
+            jti: Token id
+
+        Returns:
+            bool: True if the token must be refused
+        """
+        with self._lock:
+            entry = self._status.get(jti)
+        if entry is not None and (entry[0] or time.monotonic() - entry[1] < self.ttl):
+            return entry[0]
+
+        row = db.session.query(RefreshToken.revoked_at, RefreshToken.replaced_by).filter(RefreshToken.jti == jti).first()
+        revoked = row is None or (row.revoked_at is not None and row.replaced_by is None)
+        self._remember(jti, revoked)
+        return revoked
+
+    def issue(self, user, family_id=None):
+        """
+        Create an access token and a refresh token for a user. The caller commits.
+
+        Args:
+            user: User object
+            family_id: Rotation family to continue (default: start a new one)
+
+        Returns:
+            tuple: (access token, refresh token)
+        """
+        jti = str(uuid.uuid4())
+        family_id = family_id or str(uuid.uuid4())
+        expires = current_app.config['JWT_REFRESH_TOKEN_EXPIRES']
+
+        refresh_token = create_refresh_token(
+            identity=user.id,
+            expires_delta=expires,
+            additional_claims={'jti': jti, 'fam': family_id, 'role': user.role, 'ver': user.token_version or 0}
+        )
+        db.session.add(RefreshToken(
+            jti=jti,
+            user_id=user.id,
+            family_id=family_id,
+            expires_at=datetime.utcnow() + expires
+        ))
+        self._remember(jti, False)
+
+        return issue_access_token(user), refresh_token
+
+    def rotate(self, jwt_payload, user):
+        """
+        Exchange a refresh token for a new token pair. The caller commits.
+
+        Args:
+            jwt_payload: Decoded refresh token
+            user: User object of the token's subject
+
+        Returns:
+            tuple or None: (access token, refresh token), or None if the token was
+            already used, in which case its family has been revoked
+        """
+        table = RefreshToken.__table__
+        successor = str(uuid.uuid4())
+
+        # Conditional update: of two concurrent uses of one token only one wins
+        result = db.session.connection().execute(
+            table.update()
+            .where(table.c.jti == jwt_payload['jti'])
+            .where(table.c.revoked_at.is_(None))
+            .values(revoked_at=datetime.utcnow(), replaced_by=successor)
+        )
+        if result.rowcount == 0:
+            self.revoke_family(jwt_payload['fam'])
+            return None
+
+        return self.issue(user, family_id=jwt_payload['fam'])
+
+    def revoke_family(self, family_id):
+        """Revoke every token rotated from the same login. The caller commits."""
+        table = RefreshToken.__table__
+        connection = db.session.connection()
+        jtis = [jti for jti, in connection.execute(
+            select(table.c.jti).where(table.c.family_id == family_id).where(table.c.replaced_by.is_(None))
+        )]
+        connection.execute(
+            table.update()
+            .where(table.c.family_id == family_id)
+            .where(table.c.revoked_at.is_(None))
+            .values(revoked_at=datetime.utcnow())
+        )
+        for jti in jtis:
+            self._remember(jti, True)
+
+    def purge_expired(self):
+        """
+        Delete expired tokens. The caller commits.
+
+        Returns:
+            int: Number of deleted rows
+        """
+        table = RefreshToken.__table__
+        result = db.session.connection().execute(table.delete().where(table.c.expires_at < datetime.utcnow()))
+        return result.rowcount
+
+
+# One cache per worker process
+refresh_tokens = RefreshTokenStore()
+
+
+def issue_access_token(user):
+    """
+    Create an access token carrying the user's role and token version.
+
+    Args:
+        user: User object
+
+    Returns:
+        str: Encoded JWT
+    """
+    return create_access_token(
+        identity=user.id,
+        additional_claims={'role': user.role, 'ver': user.token_version or 0}
+    )
+
+
+@jwt.token_in_blocklist_loader
+def is_token_revoked(jwt_header, jwt_payload):
+    # Tokens issued before role claims existed must be renewed by logging in again
+    if 'role' not in jwt_payload or 'ver' not in jwt_payload:
+        return True
+    if jwt_payload['type'] == 'refresh' and refresh_tokens.is_revoked(jwt_payload['jti']):
+        return True
+    return token_versions.get(jwt_payload['sub']) != jwt_payload['ver']
+
+
+def current_role():
+    """Role claim of the token on the current request."""
+    return get_jwt().get('role')
+
+
+def role_required(*roles):
+    """
+    Require a valid access token whose role claim is one of roles.
+
+    Args:
+        *roles: Allowed roles, e.g. 'borrower'
+
+    Returns:
+        Decorator for a view function
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            verify_jwt_in_request()
+            if current_role() not in roles:
+                return jsonify({'error': 'Unauthorized access'}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
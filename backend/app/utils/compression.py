@@ -0,0 +1,102 @@
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # Optional: only gzip is offered without it
+    brotli = None
+
+# Content types worth compressing; documents, images and archives are already compressed
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'text/html',
+    'text/plain',
+    'text/css',
+    'text/csv',
+    'text/event-stream',
+}
+
+
+class ResponseCompressor:
+    """
+    Compresses responses with brotli or gzip, as negotiated by Accept-Encoding.
+
+    Buffered responses smaller than COMPRESS_MIN_SIZE are sent as they are. Streamed
+    responses are compressed chunk by chunk and flushed after every chunk, so the
+    client still receives rows as they are produced. File downloads (direct
+    passthrough) and non-text content types are never touched.
+    """
+
+    def __init__(self, app=None):
+        self.gzip_level = 6
+        self.brotli_quality = 4
+        self.min_size = 1024
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.gzip_level = app.config.get('COMPRESS_GZIP_LEVEL', self.gzip_level)
+        self.brotli_quality = app.config.get('COMPRESS_BROTLI_QUALITY', self.brotli_quality)
+        self.min_size = app.config.get('COMPRESS_MIN_SIZE', self.min_size)
+        app.after_request(self.compress)
+
+    def _encodings(self):
+        return ['br', 'gzip'] if brotli is not None else ['gzip']
+
+    def compress(self, response):
+        """after_request hook applying the negotiated encoding."""
+        if response.mimetype not in COMPRESSIBLE_MIMETYPES or response.direct_passthrough:
+            return response
+
+        response.vary.add('Accept-Encoding')
+
+        if not 200 <= response.status_code < 300 or response.status_code == 204:
+            return response
+        if 'Content-Encoding' in response.headers:
+            return response
+
+        encoding = request.accept_encodings.best_match(self._encodings())
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = self._compress_stream(response.iter_encoded(), response.response, encoding)
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(self._compress_body(data, encoding))
+
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+    def _compress_body(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        return compressor.compress(data) + compressor.flush()
+
+    def _compress_stream(self, chunks, original, encoding):
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            process, flush, finish = compressor.process, compressor.flush, compressor.finish
+        else:
+            compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+            process = compressor.compress
+            flush = lambda: compressor.flush(zlib.Z_SYNC_FLUSH)  # noqa: E731
+            finish = compressor.flush
+
+        try:
+            for chunk in chunks:
+                data = process(chunk) + flush()
+                if data:
+                    yield data
+            yield finish()
+        finally:
+            if hasattr(original, 'close'):
+                original.close()
+
+
+response_compressor = ResponseCompressor()
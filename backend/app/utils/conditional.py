@@ -0,0 +1,177 @@
+import hashlib
+from datetime import datetime, timezone
+from flask import Response, request
+from flask_jwt_extended import get_jwt_identity
+from sqlalchemy import func
+from sqlalchemy.orm import aliased
+from extensions import db
+from app.models.models import User, Project, LenderMatch, Communication, MessageReadCursor
+
+
+def make_etag(*parts):
+    """
+    Weak ETag for a response from a cheap validator, e.g. a row count and max timestamp.
+
+    The request path, query string and caller are part of the tag, so pages,
+    filters and users never share a tag.
+    """
+    payload = repr((request.full_path, get_jwt_identity(), parts))
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _naive_utc(value):
+    """A timestamp as naive UTC; PostgreSQL returns TIMESTAMP WITH TIME ZONE columns timezone-aware."""
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _http_date(value):
+    # HTTP dates are UTC with whole seconds
+    return _naive_utc(value).replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def _settled(last_modified):
+    """
+    last_modified, or None while its second is still running.
+
+    A later change within the same second would carry the same HTTP date, so a
+    Last-Modified is only handed out once no such change can follow.
+    """
+    last_modified = _naive_utc(last_modified)
+    if last_modified is None or last_modified >= datetime.utcnow().replace(microsecond=0):
+        return None
+    return last_modified
+
+
+def not_modified(etag, last_modified=None):
+    """
+    304 response if the client's copy is still current, else None.
+
+    If-Modified-Since is only consulted when the request carries no If-None-Match,
+    and never while last_modified's second is still running. last_modified should
+    only be given when every change to the payload moves it forward.
+
+    Args:
+        etag: Tag from make_etag, or None to skip the check
+        last_modified: Datetime of the newest change (naive values are UTC), or None
+
+    Returns:
+        Response or None
+    """
+    if etag is None:
+        return None
+    last_modified = _settled(last_modified)
+    if request.if_none_match:
+        current = request.if_none_match.contains_weak(etag)
+    elif last_modified is not None and request.if_modified_since is not None:
+        current = _http_date(last_modified) <= request.if_modified_since
+    else:
+        current = False
+
+    if not current:
+        return None
+    return add_validators(Response(status=304), etag, last_modified)
+
+
+def add_validators(response, etag, last_modified=None):
+    """Attach ETag/Last-Modified and make clients revalidate before reuse."""
+    if etag is None:
+        return response
+    response.set_etag(etag, weak=True)
+    last_modified = _settled(last_modified)
+    if last_modified is not None:
+        response.last_modified = _http_date(last_modified)
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
+
+
+# ----------------------------------------------------------------------
+# Validators: one aggregate row per listing instead of the full result.
+# Each returns (etag, last_modified) for not_modified/add_validators.
+# ----------------------------------------------------------------------
+
+def project_list_validators(borrower_id):
+    """Validators of a borrower's project list: count and newest updated_at."""
+    count, newest = db.session.query(func.count(Project.id), func.max(Project.updated_at)).filter(
+        Project.borrower_id == borrower_id
+    ).one()
+    return make_etag(count, newest), _naive_utc(newest)
+
+
+def match_list_validators(*criteria):
+    """
+    Validators of a match listing, covering the embedded project and party names.
+
+    Rescoring moves lender_matches.updated_at, so the newest one is part of the
+    tag. Deleted rows move no timestamp, which is why no Last-Modified is derived.
+    """
+    borrower_user = aliased(User)
+    lender_user = aliased(User)
+    version = db.session.query(
+        func.count(LenderMatch.id),
+        func.max(LenderMatch.created_at),
+        func.max(LenderMatch.updated_at),
+        func.max(Project.updated_at),
+        func.max(borrower_user.updated_at),
+        func.max(lender_user.updated_at)
+    ).select_from(LenderMatch).join(Project, LenderMatch.project_id == Project.id).join(
+        borrower_user, LenderMatch.borrower_id == borrower_user.id
+    ).join(
+        lender_user, LenderMatch.lender_id == lender_user.id
+    ).filter(*criteria).one()
+    return make_etag(*version), None
+
+
+def message_list_validators(project_id, *criteria):
+    """
+    Validators of a project's message listing, covering read cursors and party names.
+
+    Args:
+        project_id: Project of the conversation
+        *criteria: Further filters on Communication
+
+    Returns:
+        tuple: (etag, None); read state has no single timestamp to serve as Last-Modified
+    """
+    sender = aliased(User)
+    recipient = aliased(User)
+    read_state = db.session.query(func.max(MessageReadCursor.updated_at)).filter(
+        MessageReadCursor.project_id == project_id
+    ).scalar_subquery()
+    version = db.session.query(
+        func.count(Communication.id),
+        func.max(Communication.created_at),
+        read_state,
+        func.max(sender.updated_at),
+        func.max(recipient.updated_at)
+    ).select_from(Communication).join(
+        sender, Communication.sender_id == sender.id
+    ).join(
+        recipient, Communication.recipient_id == recipient.id
+    ).filter(Communication.project_id == project_id, *criteria).one()
+    return make_etag(*version), None
+
+
+def profile_validators(user_id, role_model=None):
+    """
+    Validators of a profile from the user's and role record's updated_at.
+
+    Args:
+        user_id: User id
+        role_model: Borrower, Lender or Mediator (None for the plain user profile)
+
+    Returns:
+        tuple: (etag, last_modified), both None if the profile does not exist
+    """
+    columns = [User.updated_at] if role_model is None else [User.updated_at, role_model.updated_at]
+    query = db.session.query(*columns).filter(User.id == user_id)
+    if role_model is not None:
+        query = query.join(role_model, role_model.id == User.id)
+
+    row = query.first()
+    if row is None:
+        return None, None
+    timestamps = [_naive_utc(value) for value in row if value is not None]
+    return make_etag(*row), max(timestamps) if timestamps else None
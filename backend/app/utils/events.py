@@ -0,0 +1,420 @@
+import json
+import queue
+import re
+import select
+import threading
+import time
+from collections import deque, namedtuple
+from sqlalchemy import event, text
+from extensions import db
+from app.models.models import Communication, IntroductionRequest, LenderMatch, EVENT_ID_SEQUENCE
+from app.utils.serialization import dumps
+
+# id orders events as they were committed: a microsecond timestamp with the memory
+# backend, a value of the event_ids sequence shared by all workers with postgres
+Event = namedtuple('Event', ['id', 'type', 'user_ids', 'data'])
+
+# session.info key holding events staged by the current transaction
+PENDING_EVENTS_KEY = 'pending_events'
+
+# PostgreSQL rejects NOTIFY payloads of 8000 bytes or more
+NOTIFY_PAYLOAD_LIMIT = 7500
+
+# A user with more new matches than this in one write gets a single 'matches' event
+MATCH_EVENT_DETAIL_LIMIT = 20
+
+# How long the LISTEN thread blocks in select() before checking for shutdown
+LISTEN_POLL_SECONDS = 5
+LISTEN_RETRY_SECONDS = 5
+
+# Reconnect delay suggested to EventSource clients
+SSE_RETRY_MILLISECONDS = 3000
+
+CHANNEL_NAME = re.compile(r'^[a-z_][a-z0-9_]*$')
+
+
+def stage_event(session, event_type, user_ids, data):
+    """
+    Queue an event to be published once the session's transaction commits.
+
+    Args:
+        session: Session whose commit publishes the event
+        event_type: SSE event name, e.g. 'message'
+        user_ids: Users the event is delivered to
+        data: JSON-serializable payload
+    """
+    session.info.setdefault(PENDING_EVENTS_KEY, []).append((event_type, tuple(user_ids), data))
+
+
+def match_event_data(match):
+    """Payload of a 'match' event for a LenderMatch object or an inserted row dict."""
+    get = match.get if isinstance(match, dict) else lambda key: getattr(match, key)
+    return {
+        'id': get('id'),
+        'project_id': get('project_id'),
+        'lender_id': get('lender_id'),
+        'borrower_id': get('borrower_id'),
+        'match_score': get('match_score')
+    }
+
+
+def stage_match_events(session, rows):
+    """
+    Stage events for new match rows, coalesced per user.
+
+    The lender and borrower of each row get a 'match' event, except that a user
+    with more than MATCH_EVENT_DETAIL_LIMIT new matches, e.g. during a full-book
+    rematch, gets one 'matches' event with the count and should refetch instead.
+    """
+    rows_by_user = {}
+    for row in rows:
+        for user_id in (row['lender_id'], row['borrower_id']):
+            rows_by_user.setdefault(user_id, []).append(row)
+
+    for user_id, user_rows in rows_by_user.items():
+        if len(user_rows) > MATCH_EVENT_DETAIL_LIMIT:
+            stage_event(session, 'matches', (user_id,), {'count': len(user_rows)})
+            continue
+        for row in user_rows:
+            stage_event(session, 'match', (user_id,), match_event_data(row))
+
+
+def _stage_new_objects(session, flush_context):
+    # session.new still lists the objects that were just inserted
+    for obj in session.new:
+        if isinstance(obj, Communication):
+            stage_event(session, 'message', (obj.recipient_id,), {
+                'id': obj.id,
+                'project_id': obj.project_id,
+                'sender_id': obj.sender_id
+            })
+        elif isinstance(obj, IntroductionRequest):
+            stage_event(session, 'introduction_request', (obj.lender_id,), {
+                'id': obj.id,
+                'project_id': obj.project_id,
+                'borrower_id': obj.borrower_id
+            })
+        elif isinstance(obj, LenderMatch):
+            stage_event(session, 'match', (obj.lender_id, obj.borrower_id), match_event_data(obj))
+
+
+def _publish_pending(session):
+    pending = session.info.pop(PENDING_EVENTS_KEY, None)
+    if pending:
+        event_bus.publish(pending)
+
+
+def _discard_pending(session):
+    session.info.pop(PENDING_EVENTS_KEY, None)
+
+
+def format_event(event_id, event_type, data):
+    """One server-sent event."""
+    return f'id: {event_id}\nevent: {event_type}\ndata: {dumps(data)}\n\n'
+
+
+class Subscription:
+    """One connected client: a bounded queue of events for a user."""
+
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self.queue = queue.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, item):
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            # A client this far behind resyncs instead of holding memory
+            self.overflowed = True
+
+
+class EventBus:
+    """
+    In-process pub/sub that pushes newly created rows to server-sent event streams.
+
+    Events are staged while a transaction runs and published from the session's
+    after_commit hook, so clients never hear about rows that were rolled back.
+    The most recent EVENT_BUFFER_SIZE events are kept to answer Last-Event-ID
+    resumes; a client whose last event is older than that, or older than this
+    process, receives a 'resync' event and should refetch its lists.
+
+    With EVENT_BACKEND='postgres' committed events are sent with NOTIFY and every
+    worker picks them up from a LISTEN thread, so a client connected to any worker
+    sees events raised by all of them. Their ids come from the event_ids sequence,
+    taken under a transaction-level advisory lock so that id order is also NOTIFY
+    delivery order; a client can resume on any worker. The default 'memory'
+    backend only reaches clients of the publishing worker.
+
+    Every open stream holds a worker thread, so streams are served by threaded
+    workers (see gunicorn.conf.py) and limited to SSE_MAX_CONNECTIONS per process.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.backend = 'memory'
+        self._lock = threading.Lock()
+        self._subscribers = {}
+        self._buffer = deque()
+        self._last_id = 0
+        self._floor = 0
+        self._listener = None
+        self._stopped = threading.Event()
+        self.max_connections = 50
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('EVENT_BACKEND', 'memory')
+        if backend not in ('memory', 'postgres'):
+            raise ValueError(f'Unknown EVENT_BACKEND {backend!r}')
+        channel = app.config.get('EVENT_CHANNEL', 'app_events')
+        if not CHANNEL_NAME.match(channel):
+            raise ValueError(f'EVENT_CHANNEL must be a lowercase SQL identifier, got {channel!r}')
+
+        self.app = app
+        self.backend = backend
+        self.channel = channel
+        self.buffer_size = app.config.get('EVENT_BUFFER_SIZE', 1000)
+        self.queue_size = app.config.get('EVENT_QUEUE_SIZE', 100)
+        self.heartbeat_seconds = app.config.get('SSE_HEARTBEAT_SECONDS', 15)
+        self.max_stream_seconds = app.config.get('SSE_MAX_STREAM_SECONDS', 300)
+        self.max_connections = app.config.get('SSE_MAX_CONNECTIONS', self.max_connections)
+        app.extensions['event_bus'] = self
+
+        with self._lock:
+            if backend == 'postgres':
+                # Nothing can be resumed until the LISTEN thread knows where the sequence stands
+                self._floor = float('inf')
+            else:
+                # Events from before this process started were never buffered
+                self._floor = max(self._floor, self._new_id())
+
+        for name, listener in (('after_flush', _stage_new_objects),
+                               ('after_commit', _publish_pending),
+                               ('after_rollback', _discard_pending)):
+            if not event.contains(db.session, name, listener):
+                event.listen(db.session, name, listener)
+
+    def _new_id(self):
+        # Monotonic within the process even if the clock steps back
+        self._last_id = max(time.time_ns() // 1000, self._last_id + 1)
+        return self._last_id
+
+    # ------------------------------------------------------------------
+    # Publishing
+    # ------------------------------------------------------------------
+
+    def publish(self, pending):
+        """
+        Publish committed events.
+
+        Args:
+            pending: List of (event_type, user_ids, data) tuples, see stage_event
+        """
+        if self.backend == 'postgres':
+            try:
+                self._notify(pending)
+            except Exception:
+                # The events never got ids; local clients refetch rather than miss them
+                self.app.logger.exception('NOTIFY failed; dropping %d events', len(pending))
+                self._resync_all()
+            return
+
+        with self._lock:
+            events = [Event(self._new_id(), event_type, user_ids, data) for event_type, user_ids, data in pending]
+        self._deliver(events)
+
+    def _notify(self, pending):
+        engine = db.get_engine(self.app)
+        with engine.begin() as connection:
+            # Held until commit: a later id is never delivered before an earlier one
+            connection.execute(text('SELECT pg_advisory_xact_lock(hashtext(:channel))'), {'channel': self.channel})
+            ids = connection.execute(
+                text(f"SELECT nextval('{EVENT_ID_SEQUENCE.name}') FROM generate_series(1, :count)"),
+                {'count': len(pending)}
+            ).scalars().all()
+            for payload in self._payloads([Event(event_id, event_type, user_ids, data)
+                                           for event_id, (event_type, user_ids, data) in zip(ids, pending)]):
+                connection.execute(text('SELECT pg_notify(:channel, :payload)'),
+                                   {'channel': self.channel, 'payload': payload})
+
+    @staticmethod
+    def _payloads(events):
+        payloads, batch, size = [], [], 2
+        for item in events:
+            encoded = dumps(list(item))
+            if batch and size + len(encoded) + 1 > NOTIFY_PAYLOAD_LIMIT:
+                payloads.append('[' + ','.join(batch) + ']')
+                batch, size = [], 2
+            batch.append(encoded)
+            size += len(encoded) + 1
+        payloads.append('[' + ','.join(batch) + ']')
+        return payloads
+
+    def _deliver(self, events):
+        with self._lock:
+            for item in events:
+                self._last_id = max(self._last_id, item.id)
+                self._buffer.append(item)
+                for user_id in item.user_ids:
+                    for subscription in self._subscribers.get(user_id, ()):
+                        subscription.put(item)
+            while len(self._buffer) > self.buffer_size:
+                self._floor = max(self._floor, self._buffer.popleft().id)
+
+    def _resync_all(self):
+        with self._lock:
+            for subscribers in self._subscribers.values():
+                for subscription in subscribers:
+                    subscription.overflowed = True
+
+    # ------------------------------------------------------------------
+    # LISTEN/NOTIFY
+    # ------------------------------------------------------------------
+
+    def start(self):
+        """Start the LISTEN thread for this process (postgres backend only)."""
+        with self._lock:
+            if self.backend != 'postgres' or self._listener is not None:
+                return
+            self._listener = threading.Thread(target=self._listen_forever, name='event-listener', daemon=True)
+            self._listener.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _listen_forever(self):
+        engine = db.get_engine(self.app)
+        while not self._stopped.is_set():
+            connection = None
+            try:
+                connection = engine.raw_connection()
+                listener = connection.connection
+                listener.autocommit = True
+                cursor = listener.cursor()
+                cursor.execute(f'LISTEN {self.channel}')
+                # Events numbered up to here may have been sent before LISTEN took effect
+                cursor.execute(f'SELECT last_value FROM {EVENT_ID_SEQUENCE.name}')
+                last_value = cursor.fetchone()[0]
+                with self._lock:
+                    self._last_id = max(self._last_id, last_value)
+                    self._floor = last_value if self._floor == float('inf') else max(self._floor, last_value)
+
+                while not self._stopped.is_set():
+                    if not select.select([listener], [], [], LISTEN_POLL_SECONDS)[0]:
+                        continue
+                    listener.poll()
+                    while listener.notifies:
+                        notify = listener.notifies.pop(0)
+                        self._deliver([Event(event_id, event_type, tuple(user_ids), data)
+                                       for event_id, event_type, user_ids, data in json.loads(notify.payload)])
+            except Exception:
+                self.app.logger.exception('Event listener failed; reconnecting')
+                self._stopped.wait(LISTEN_RETRY_SECONDS)
+            finally:
+                if connection is not None:
+                    # Never hand the autocommit LISTEN connection back to the pool
+                    connection.invalidate()
+
+    # ------------------------------------------------------------------
+    # Subscribing
+    # ------------------------------------------------------------------
+
+    def subscribe(self, user_id, last_event_id=None):
+        """
+        Register a client for a user's events.
+
+        Args:
+            user_id: User whose events are wanted
+            last_event_id: Last event the client saw, if it is resuming
+
+        Returns:
+            tuple: (Subscription, backlog) where backlog lists the buffered events
+            after last_event_id, or is None when they are no longer all buffered
+        """
+        self.start()
+        with self._lock:
+            subscription = Subscription(user_id, self.queue_size)
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+
+            if last_event_id is None:
+                return subscription, []
+            if last_event_id < self._floor:
+                return subscription, None
+            return subscription, [item for item in self._buffer
+                                  if item.id > last_event_id and user_id in item.user_ids]
+
+    def accepting(self):
+        """Whether this process is below SSE_MAX_CONNECTIONS open streams."""
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values()) < self.max_connections
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def stream(self, user_id, last_event_id=None):
+        """
+        Server-sent event stream of a user's events.
+
+        Waiting clients only hold a blocked thread; a comment line is sent every
+        SSE_HEARTBEAT_SECONDS to keep proxies from closing the connection, and the
+        stream ends after SSE_MAX_STREAM_SECONDS so clients reconnect with a fresh
+        token and their Last-Event-ID.
+
+        Args:
+            user_id: User whose events are streamed
+            last_event_id: Value of the client's Last-Event-ID header, if any
+
+        Returns:
+            generator: SSE text chunks
+        """
+        def generate():
+            # Subscribing here ties the subscription to the generator's close()
+            subscription, backlog = self.subscribe(user_id, last_event_id)
+            try:
+                yield f'retry: {SSE_RETRY_MILLISECONDS}\n\n'
+                if backlog is None:
+                    yield format_event(self._last_id, 'resync', {})
+                    backlog = []
+                for item in backlog:
+                    yield format_event(item.id, item.type, item.data)
+
+                deadline = time.monotonic() + self.max_stream_seconds
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        return
+                    try:
+                        item = subscription.queue.get(timeout=min(self.heartbeat_seconds, remaining))
+                    except queue.Empty:
+                        if subscription.overflowed:
+                            yield format_event(self._last_id, 'resync', {})
+                            return
+                        yield ': keepalive\n\n'
+                        continue
+                    if subscription.overflowed:
+                        yield format_event(self._last_id, 'resync', {})
+                        return
+                    yield format_event(item.id, item.type, item.data)
+            finally:
+                self.unsubscribe(subscription)
+
+        return generate()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.backend,
+                'subscribers': sum(len(subscribers) for subscribers in self._subscribers.values()),
+                'buffered_events': len(self._buffer)
+            }
+
+
+# One bus per worker process
+event_bus = EventBus()
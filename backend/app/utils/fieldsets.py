@@ -0,0 +1,119 @@
+from flask import g, jsonify, request
+from app.utils.serialization import dumps
+
+
+class InvalidFields(ValueError):
+    """Malformed fields parameter; answered with a 400."""
+
+
+def parse_fields(value):
+    """
+    Parse a sparse fieldset such as 'id,match_score,project.asset_type,lender'.
+
+    Dotted names select fields of embedded objects; naming an embedded object
+    without a dot keeps all of it. Unknown names are ignored.
+
+    Args:
+        value: The fields parameter, or None
+
+    Returns:
+        dict or None: Field name -> None (whole value) or nested selection; None
+        when no selection was asked for
+
+    Raises:
+        InvalidFields: Empty field names
+    """
+    if value is None:
+        return None
+
+    tree = {}
+    for path in value.split(','):
+        parts = [part.strip() for part in path.split('.')]
+        if not all(parts):
+            raise InvalidFields(f"Invalid field '{path}'")
+        node = tree
+        for part in parts[:-1]:
+            child = node.get(part, {})
+            if child is None:
+                # Already selected whole
+                break
+            node[part] = child
+            node = child
+        else:
+            node[parts[-1]] = None
+    return tree
+
+
+def prune(data, tree):
+    """Keep only the selected fields of a dict, or of every dict in a list."""
+    if tree is None:
+        return data
+    if isinstance(data, list):
+        return [prune(item, tree) for item in data]
+    if isinstance(data, dict):
+        return {key: prune(value, tree[key]) for key, value in data.items() if key in tree}
+    return data
+
+
+def requested_fields():
+    """Parsed fields parameter of the current request, or None."""
+    if 'sparse_fields' not in g:
+        g.sparse_fields = parse_fields(request.args.get('fields'))
+    return g.sparse_fields
+
+
+def fields_for_projection():
+    """
+    Fieldset for a view that narrows its SELECT and output itself.
+
+    The response is then left alone by the generic pruning.
+    """
+    g.sparse_fields_applied = True
+    return requested_fields()
+
+
+def pending_fields():
+    """Fieldset still to be applied to the current response, or None."""
+    if g.get('sparse_fields_applied'):
+        return None
+    return requested_fields()
+
+
+class SparseFieldsets:
+    """
+    `?fields=` support for every JSON endpoint.
+
+    Listings that select columns themselves (see fields_for_projection) narrow
+    the SQL as well as the payload. Any other JSON response is pruned after the
+    view, and streamed listings prune row by row.
+    """
+
+    def init_app(self, app):
+        app.register_error_handler(InvalidFields, self._invalid_response)
+        app.before_request(self._parse_fields)
+        app.after_request(self._prune_response)
+
+    @staticmethod
+    def _parse_fields():
+        # Reject a malformed fieldset before the view runs
+        if 'fields' in request.args:
+            requested_fields()
+
+    @staticmethod
+    def _invalid_response(error):
+        return jsonify({'error': str(error)}), 400
+
+    @staticmethod
+    def _prune_response(response):
+        if 'fields' not in request.args or response.is_streamed or response.mimetype != 'application/json':
+            return response
+        if not 200 <= response.status_code < 300:
+            return response
+
+        tree = pending_fields()
+        if tree is not None:
+            response.set_data(dumps(prune(response.get_json(), tree)))
+        return response
+
+
+sparse_fieldsets = SparseFieldsets()
@@ -0,0 +1,114 @@
+import json
+import threading
+from collections import OrderedDict
+
+
+class FrozenDict(dict):
+    """A dict that refuses in-place changes, so cached values cannot be corrupted by callers."""
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('Cached JSON values are read-only; use thaw() for a mutable copy')
+
+    __setitem__ = __delitem__ = __ior__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return FrozenDict, (dict(self),)
+
+
+def freeze(value):
+    """Recursively turn parsed JSON into FrozenDict/tuple values."""
+    if isinstance(value, dict):
+        return FrozenDict((key, freeze(item)) for key, item in value.items())
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    """Mutable deep copy of a frozen value."""
+    if isinstance(value, dict):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(item) for item in value]
+    return value
+
+
+class JSONFieldCache:
+    """
+    Process-wide LRU cache of parsed JSON model columns.
+
+    Entries are keyed by (table, primary key) and are only served while the row's
+    updated_at and raw text still match, so an edit made by another worker is never
+    read stale. Setters invalidate their row explicitly. Values are returned frozen
+    because the same object is shared by every caller.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def init_app(self, app):
+        self.maxsize = app.config.get('JSON_FIELD_CACHE_SIZE', self.maxsize)
+
+    def get(self, table, pk, updated_at, raw):
+        """
+        Parsed, frozen value of a JSON column.
+
+        Args:
+            table: Table name of the model
+            pk: Primary key of the row (None for unsaved rows, which are not cached)
+            updated_at: The row's updated_at
+            raw: The column's JSON text
+
+        Returns:
+            The parsed value, frozen
+        """
+        key = (table, pk)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == updated_at and entry[1] == raw:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            self.misses += 1
+
+        value = freeze(json.loads(raw))
+
+        if pk is not None and updated_at is not None:
+            with self._lock:
+                self._entries[key] = (updated_at, raw, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+
+        return value
+
+    def invalidate(self, table, pk):
+        with self._lock:
+            self._entries.pop((table, pk), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else None
+            }
+
+
+# One cache per worker process
+json_field_cache = JSONFieldCache()
@@ -0,0 +1,338 @@
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import Counter, defaultdict
+from sqlalchemy import func
+from extensions import db
+from app.models.models import Lender
+
+# Criteria that are scored by set membership of a project attribute
+CATEGORICAL_CRITERIA = {
+    'asset_types': 'asset_type',
+    'deal_types': 'deal_type',
+    'capital_types': 'capital_type',
+}
+
+# Every criterion is worth the same amount, see calculate_match_score
+TOTAL_CRITERIA = len(CATEGORICAL_CRITERIA) + 1
+
+
+def required_hits(min_score):
+    """
+    Smallest number of matched criteria whose score reaches min_score.
+
+    Args:
+        min_score: Minimum match score
+
+    Returns:
+        int or None: Number of criteria, or None if min_score is unreachable
+    """
+    for hits in range(TOTAL_CRITERIA + 1):
+        if hits / TOTAL_CRITERIA >= min_score:
+            return hits
+    return None
+
+
+def _is_number(value):
+    # NaN bounds never compare true and would break the sorted endpoint lists
+    return isinstance(value, (int, float)) and value == value
+
+
+def parse_lender_criteria(lender):
+    """
+    Parse a lender's criteria for indexing.
+
+    Returns:
+        tuple: (criteria dict, regular) where regular is False when the criteria
+        have a shape the posting lists cannot represent exactly. Such lenders
+        are always handed to calculate_match_score.
+    """
+    try:
+        criteria = lender.get_lending_criteria()
+    except (TypeError, ValueError):
+        return None, False
+
+    if not isinstance(criteria, dict):
+        return criteria, False
+
+    for field in CATEGORICAL_CRITERIA:
+        values = criteria.get(field)
+        if values is None:
+            continue
+        if not isinstance(values, (list, tuple)):
+            return criteria, False
+        try:
+            set(values)
+        except TypeError:
+            return criteria, False
+
+    if 'min_loan_size' in criteria and 'max_loan_size' in criteria:
+        if not _is_number(criteria['min_loan_size']) or not _is_number(criteria['max_loan_size']):
+            return criteria, False
+
+    return criteria, True
+
+
+class LenderCriteriaIndex:
+    """
+    In-memory inverted index over lender lending criteria.
+
+    Keeps one posting list per value of asset_types, deal_types and capital_types,
+    plus the min_loan_size/max_loan_size bounds as two sorted endpoint lists so the
+    lenders whose loan range contains an amount can be found with two bisects.
+
+    The index is built lazily once per worker process and is kept current by
+    update()/remove() from the routes that change lenders. Changes made by other
+    workers are picked up by a cheap count/max(updated_at) check before each lookup,
+    with a periodic full rebuild as a safety net.
+    """
+
+    def __init__(self, max_age=300):
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self):
+        self._criteria = {}
+        self._postings = {field: defaultdict(set) for field in CATEGORICAL_CRITERIA}
+        self._irregular = set()
+        self._min_keys, self._min_ids = [], []
+        self._max_keys, self._max_ids = [], []
+        self._loaded = False
+        self._built_at = 0.0
+        self._snapshot = None
+        self._watermark = None
+
+    # ------------------------------------------------------------------
+    # Maintenance
+    # ------------------------------------------------------------------
+
+    def _add(self, lender_id, criteria, regular):
+        self._criteria[lender_id] = criteria
+        if not regular:
+            self._irregular.add(lender_id)
+            return
+
+        for field in CATEGORICAL_CRITERIA:
+            for value in set(criteria.get(field) or ()):
+                self._postings[field][value].add(lender_id)
+
+        if 'min_loan_size' in criteria and 'max_loan_size' in criteria:
+            min_size, max_size = criteria['min_loan_size'], criteria['max_loan_size']
+            position = bisect_right(self._min_keys, min_size)
+            self._min_keys.insert(position, min_size)
+            self._min_ids.insert(position, lender_id)
+            position = bisect_right(self._max_keys, max_size)
+            self._max_keys.insert(position, max_size)
+            self._max_ids.insert(position, lender_id)
+
+    def _discard(self, lender_id):
+        criteria = self._criteria.pop(lender_id, None)
+        if lender_id in self._irregular:
+            self._irregular.discard(lender_id)
+            return
+        if criteria is None:
+            return
+
+        for field in CATEGORICAL_CRITERIA:
+            postings = self._postings[field]
+            for value in set(criteria.get(field) or ()):
+                postings[value].discard(lender_id)
+                if not postings[value]:
+                    del postings[value]
+
+        if 'min_loan_size' in criteria and 'max_loan_size' in criteria:
+            self._remove_endpoint(self._min_keys, self._min_ids, criteria['min_loan_size'], lender_id)
+            self._remove_endpoint(self._max_keys, self._max_ids, criteria['max_loan_size'], lender_id)
+
+    @staticmethod
+    def _remove_endpoint(keys, ids, key, lender_id):
+        position = bisect_left(keys, key)
+        while position < len(keys) and keys[position] == key:
+            if ids[position] == lender_id:
+                del keys[position]
+                del ids[position]
+                return
+            position += 1
+
+    def update(self, lender):
+        """Add or replace a lender in the index."""
+        with self._lock:
+            if not self._loaded:
+                return
+            self._discard(lender.id)
+            criteria, regular = parse_lender_criteria(lender)
+            self._add(lender.id, criteria, regular)
+
+    def remove(self, lender_id):
+        """Drop a lender from the index."""
+        with self._lock:
+            self._discard(lender_id)
+
+    def rebuild(self):
+        """Rebuild the whole index from the lenders table."""
+        with self._lock:
+            self._reset()
+            snapshot = self._current_snapshot()
+            for lender in Lender.query.all():
+                criteria, regular = parse_lender_criteria(lender)
+                self._add(lender.id, criteria, regular)
+            self._loaded = True
+            self._built_at = time.monotonic()
+            self._snapshot = snapshot
+            self._watermark = snapshot[1]
+
+    @staticmethod
+    def _current_snapshot():
+        return tuple(db.session.query(func.count(Lender.id), func.max(Lender.updated_at)).one())
+
+    def sync(self):
+        """
+        Make sure the index reflects the lenders table.
+
+        Builds the index on first use, then only reloads lenders whose updated_at
+        moved past the last seen watermark.
+        """
+        with self._lock:
+            if not self._loaded or time.monotonic() - self._built_at > self.max_age:
+                self.rebuild()
+                return
+
+            snapshot = self._current_snapshot()
+            if snapshot == self._snapshot:
+                return
+
+            query = Lender.query
+            if self._watermark is not None:
+                query = query.filter(Lender.updated_at >= self._watermark)
+            for lender in query.all():
+                self._discard(lender.id)
+                criteria, regular = parse_lender_criteria(lender)
+                self._add(lender.id, criteria, regular)
+
+            if len(self._criteria) != snapshot[0]:
+                # Lenders were deleted, the watermark cannot tell which ones
+                self.rebuild()
+                return
+
+            self._snapshot = snapshot
+            self._watermark = snapshot[1]
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+
+    def loan_size_hits(self, amount):
+        """
+        Lenders whose loan-size criterion accepts the amount.
+
+        Args:
+            amount: Requested debt
+
+        Returns:
+            set: Lender ids with min_loan_size <= amount <= max_loan_size
+        """
+        with self._lock:
+            if not amount:
+                return set()
+            above_min = self._min_ids[:bisect_right(self._min_keys, amount)]
+            below_max = self._max_ids[bisect_left(self._max_keys, amount):]
+            return set(above_min).intersection(below_max)
+
+    def criteria_hits(self, project):
+        """
+        Count the matched criteria of every regular lender hit by the project.
+
+        Args:
+            project: Project object
+
+        Returns:
+            Counter: lender id -> number of matched criteria (lenders with no hit are absent)
+        """
+        with self._lock:
+            hits = Counter()
+            for field, attribute in CATEGORICAL_CRITERIA.items():
+                hits.update(self._postings[field].get(getattr(project, attribute), ()))
+            hits.update(self.loan_size_hits(project.debt_request))
+            return hits
+
+    def candidate_ids(self, project, min_score=0.5):
+        """
+        Lenders that can reach min_score for the project.
+
+        Irregular lenders are always returned so the caller can score them exactly.
+
+        Args:
+            project: Project object
+            min_score: Minimum match score
+
+        Returns:
+            set: Candidate lender ids
+        """
+        self.sync()
+        needed = required_hits(min_score)
+
+        with self._lock:
+            if needed is None:
+                return set()
+            if needed == 0:
+                return set(self._criteria)
+
+            hits = self.criteria_hits(project)
+            candidates = {lender_id for lender_id, count in hits.items() if count >= needed}
+            return candidates | self._irregular
+
+    def score_upper_bounds(self, project, min_score=0.5):
+        """
+        Upper bound on the number of matched criteria for every lender that may reach min_score.
+
+        Categorical criteria are counted exactly from the posting lists; the loan-size
+        criterion is left unchecked and counted as a hit whenever it could match.
+        Irregular lenders get the maximum bound.
+
+        Args:
+            project: Project object
+            min_score: Minimum match score
+
+        Returns:
+            list: (bound, lender id) tuples
+        """
+        self.sync()
+        needed = required_hits(min_score)
+
+        with self._lock:
+            if needed is None:
+                return []
+
+            categorical = Counter()
+            for field, attribute in CATEGORICAL_CRITERIA.items():
+                categorical.update(self._postings[field].get(getattr(project, attribute), ()))
+
+            # Lenders without a categorical hit can only reach one criterion
+            lender_ids = self._criteria if needed <= 1 else categorical
+            bounds = []
+            for lender_id in lender_ids:
+                if lender_id in self._irregular:
+                    continue
+                criteria = self._criteria[lender_id]
+                loan_possible = bool(project.debt_request) and 'min_loan_size' in criteria and 'max_loan_size' in criteria
+                bound = categorical[lender_id] + loan_possible
+                if bound >= needed:
+                    bounds.append((bound, lender_id))
+
+            bounds.extend((TOTAL_CRITERIA, lender_id) for lender_id in self._irregular)
+            return bounds
+
+    def get_criteria(self, lender_id):
+        """Parsed lending criteria for an indexed lender, or None."""
+        with self._lock:
+            return self._criteria.get(lender_id)
+
+    def irregular_ids(self):
+        """Lenders that the posting lists cannot answer for and must always be scored."""
+        with self._lock:
+            return set(self._irregular)
+
+
+# One index per worker process
+lender_index = LenderCriteriaIndex()
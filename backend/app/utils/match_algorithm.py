@@ -1,6 +1,21 @@
-import json
-from app.models.models import Lender
-from app.models.models import Project
+import heapq
+import itertools
+import numpy as np
+from sqlalchemy import and_, case, false, func, literal, or_
+from extensions import db
+from app.models.models import Lender, LenderCriterionValue
+from app.utils.lender_index import (
+    lender_index, parse_lender_criteria, required_hits, CATEGORICAL_CRITERIA, TOTAL_CRITERIA
+)
+
+# Upper bound on bound parameters per IN (...) clause when loading candidates
+CANDIDATE_BATCH_SIZE = 500
+
+# Upper bound on project x lender cells scored at once by the batch scorer
+MAX_MATRIX_CELLS = 4_000_000
+
+# Largest integer float64 holds exactly; bigger loan bounds are scored in Python
+_MAX_EXACT_INT = 2 ** 53
 
 
 def calculate_match_score(project, lender):
@@ -12,15 +27,26 @@ def calculate_match_score(project, lender):
         project: Project object
         lender: Lender object
 
+    Returns:
+        float: Match score between 0 and 1
+    """
+    return score_lending_criteria(project, lender.get_lending_criteria())
+
+
+def score_lending_criteria(project, lending_criteria):
+    """
+    Score a project against already parsed lending criteria.
+
+    Args:
+        project: Project object
+        lending_criteria: Lending criteria dict
+
     Returns:
         float: Match score between 0 and 1
     """
     score = 0
     total_criteria = 0
 
-    # Get lender criteria
-    lending_criteria = lender.get_lending_criteria()
-
     # Asset type match
     if 'asset_types' in lending_criteria and project.asset_type in lending_criteria['asset_types']:
         score += 1
@@ -49,22 +75,88 @@ def calculate_match_score(project, lender):
         return 0
 
 
-def find_matching_lenders(project, min_score=0.5):
+def load_lenders(lender_ids):
+    """
+    Load lenders by id in batches small enough for any database's parameter limit.
+
+    Args:
+        lender_ids: Iterable of lender ids
+
+    Returns:
+        list: Lender objects
+    """
+    lender_ids = sorted(lender_ids)
+    lenders = []
+    for start in range(0, len(lender_ids), CANDIDATE_BATCH_SIZE):
+        batch = lender_ids[start:start + CANDIDATE_BATCH_SIZE]
+        lenders.extend(Lender.query.filter(Lender.id.in_(batch)).all())
+    return lenders
+
+
+def candidate_lender_query(project, min_score=0.5):
+    """
+    Lenders that can reach min_score, selected in SQL from the normalized criteria.
+
+    Categorical hits come from an indexed lookup on lender_criteria_values and the
+    loan-size hit from the min/max_loan_size columns. Lenders whose normalized
+    columns do not capture their JSON criteria exactly are always included.
+
+    Args:
+        project: Project object
+        min_score: Minimum match score (default: 0.5)
+
+    Returns:
+        Query: Lender query
+    """
+    needed = required_hits(min_score)
+    if needed is None:
+        return Lender.query.filter(false())
+    if needed == 0:
+        return Lender.query
+
+    hits = db.session.query(
+        LenderCriterionValue.lender_id,
+        func.count().label('hits')
+    ).filter(or_(*[
+        and_(LenderCriterionValue.criterion == criterion, LenderCriterionValue.value == getattr(project, attribute))
+        for criterion, attribute in CATEGORICAL_CRITERIA.items()
+    ])).group_by(LenderCriterionValue.lender_id).subquery()
+
+    loan_hit = literal(0)
+    if project.debt_request:
+        loan_hit = case(
+            (and_(Lender.min_loan_size <= project.debt_request, Lender.max_loan_size >= project.debt_request), 1),
+            else_=0
+        )
+
+    return Lender.query.outerjoin(hits, hits.c.lender_id == Lender.id).filter(or_(
+        func.coalesce(hits.c.hits, 0) + loan_hit >= needed,
+        Lender.criteria_normalized.isnot(True)
+    ))
+
+
+def find_matching_lenders(project, min_score=0.5, use_index=True):
     """
     Find lenders that match a project with a minimum score.
 
     Args:
         project: Project object
         min_score: Minimum match score (default: 0.5)
+        use_index: Select candidates from the worker's in-memory index (default) or,
+            for processes that should not hold one, with an SQL query
 
     Returns:
         list: List of tuples (lender, score) sorted by score in descending order
     """
     matches = []
 
-    lenders = Lender.query.all()
+    # Only lenders that can still reach min_score are loaded and scored
+    if use_index:
+        candidates = load_lenders(lender_index.candidate_ids(project, min_score))
+    else:
+        candidates = candidate_lender_query(project, min_score).all()
 
-    for lender in lenders:
+    for lender in candidates:
         score = calculate_match_score(project, lender)
         if score >= min_score:
             matches.append((lender, score))
@@ -74,3 +166,194 @@ def find_matching_lenders(project, min_score=0.5):
 
     return matches
 
+
+def iter_lender_scores(project, min_score=0.5):
+    """
+    Yield matching lenders in score order, scoring as few lenders as possible.
+
+    Every candidate enters a heap keyed on an upper bound of its score: the
+    categorical criteria are already known from the index posting lists and the
+    unchecked loan-size criterion is assumed to match. A lender is only scored
+    exactly when it reaches the top of the heap, and a lender is yielded once its
+    exact score is at least every remaining upper bound. Stopping the generator
+    early therefore skips scoring everything below the last yielded score.
+
+    Args:
+        project: Project object
+        min_score: Minimum match score (default: 0.5)
+
+    Yields:
+        tuple: (lender id, score) by score descending, then lender id
+    """
+    heap = [(-hits / TOTAL_CRITERIA, lender_id, True)
+            for hits, lender_id in lender_index.score_upper_bounds(project, min_score)]
+    heapq.heapify(heap)
+
+    while heap:
+        negative_score, lender_id, is_bound = heapq.heappop(heap)
+        if not is_bound:
+            yield lender_id, -negative_score
+            continue
+
+        score = score_lending_criteria(project, lender_index.get_criteria(lender_id))
+        if score >= min_score:
+            heapq.heappush(heap, (-score, lender_id, False))
+
+
+def top_matching_lenders(project, k=25, min_score=0.5):
+    """
+    The k best matching lenders of a project.
+
+    Only pops k exact scores off the iter_lender_scores heap and loads just those
+    k lenders, so the cost no longer grows with the number of matches.
+
+    Args:
+        project: Project object
+        k: Number of lenders to return (default: 25)
+        min_score: Minimum match score (default: 0.5)
+
+    Returns:
+        list: List of tuples (lender, score) sorted by score in descending order
+    """
+    ranked = list(itertools.islice(iter_lender_scores(project, min_score), k))
+    lenders = {lender.id: lender for lender in load_lenders(lender_id for lender_id, _ in ranked)}
+    return [(lenders[lender_id], score) for lender_id, score in ranked if lender_id in lenders]
+
+
+class LenderCriteriaMatrix:
+    """
+    Lending criteria of a fixed list of lenders encoded as arrays.
+
+    Each categorical criterion becomes a vocabulary of values and one uint64 bitset
+    row per lender; loan sizes become min/max vectors plus a mask of lenders that
+    set both bounds. Lenders whose criteria cannot be encoded exactly are kept in
+    `fallback` and scored with calculate_match_score.
+    """
+
+    def __init__(self, lenders):
+        self.lenders = list(lenders)
+        count = len(self.lenders)
+
+        self.vocabularies = {field: {} for field in CATEGORICAL_CRITERIA}
+        members = {field: [] for field in CATEGORICAL_CRITERIA}
+        self.min_loan = np.full(count, np.nan)
+        self.max_loan = np.full(count, np.nan)
+        self.has_loan_range = np.zeros(count, dtype=bool)
+        fallback = []
+
+        for column, lender in enumerate(self.lenders):
+            criteria, regular = parse_lender_criteria(lender)
+            if regular and 'min_loan_size' in criteria and 'max_loan_size' in criteria:
+                bounds = (criteria['min_loan_size'], criteria['max_loan_size'])
+                if any(isinstance(bound, int) and abs(bound) > _MAX_EXACT_INT for bound in bounds):
+                    regular = False
+                else:
+                    self.min_loan[column], self.max_loan[column] = bounds
+                    self.has_loan_range[column] = True
+            if not regular:
+                fallback.append(column)
+                continue
+
+            for field in CATEGORICAL_CRITERIA:
+                vocabulary = self.vocabularies[field]
+                for value in set(criteria.get(field) or ()):
+                    members[field].append((column, vocabulary.setdefault(value, len(vocabulary))))
+
+        self.bitsets = {}
+        for field, vocabulary in self.vocabularies.items():
+            bitset = np.zeros((count, max(1, -(-len(vocabulary) // 64))), dtype=np.uint64)
+            if members[field]:
+                columns, positions = np.array(members[field]).T
+                np.bitwise_or.at(bitset, (columns, positions // 64),
+                                 np.left_shift(np.uint64(1), (positions % 64).astype(np.uint64)))
+            self.bitsets[field] = bitset
+
+        self.fallback = np.array(fallback, dtype=np.intp)
+
+    def __len__(self):
+        return len(self.lenders)
+
+    def _encode_value(self, field, value):
+        position = self.vocabularies[field].get(value)
+        if position is None:
+            return 0, 0
+        return position // 64, 1 << (position % 64)
+
+    def score(self, projects):
+        """
+        Score projects against every lender.
+
+        Args:
+            projects: Sequence of Project objects (or rows with the same attributes)
+
+        Returns:
+            numpy.ndarray: float64 matrix of shape (len(projects), len(lenders))
+        """
+        hits = np.zeros((len(projects), len(self.lenders)), dtype=np.uint8)
+
+        for field, attribute in CATEGORICAL_CRITERIA.items():
+            encoded = [self._encode_value(field, getattr(project, attribute)) for project in projects]
+            words = np.array([word for word, _ in encoded], dtype=np.intp)
+            masks = np.array([mask for _, mask in encoded], dtype=np.uint64)
+            hits += (self.bitsets[field][:, words] & masks).T != 0
+
+        debts = np.array([project.debt_request if project.debt_request else np.nan for project in projects],
+                         dtype=np.float64)[:, None]
+        hits += self.has_loan_range & (self.min_loan <= debts) & (debts <= self.max_loan)
+
+        scores = hits / TOTAL_CRITERIA
+
+        for column in self.fallback:
+            lender = self.lenders[column]
+            scores[:, column] = [calculate_match_score(project, lender) for project in projects]
+
+        return scores
+
+
+def iter_score_matrix(projects, lenders, chunk_size=None):
+    """
+    Score many projects against many lenders, one chunk of projects at a time.
+
+    Args:
+        projects: Sequence of Project objects
+        lenders: LenderCriteriaMatrix or list of Lender objects
+        chunk_size: Projects per chunk (default: sized to MAX_MATRIX_CELLS)
+
+    Yields:
+        tuple: (project chunk, score matrix for that chunk)
+    """
+    matrix = lenders if isinstance(lenders, LenderCriteriaMatrix) else LenderCriteriaMatrix(lenders)
+    projects = list(projects)
+    if chunk_size is None:
+        chunk_size = max(1, MAX_MATRIX_CELLS // max(1, len(matrix)))
+
+    for start in range(0, len(projects), chunk_size):
+        chunk = projects[start:start + chunk_size]
+        yield chunk, matrix.score(chunk)
+
+
+def batch_find_matching_lenders(projects, lenders=None, min_score=0.5, chunk_size=None):
+    """
+    Find matching lenders for many projects at once.
+
+    Args:
+        projects: Sequence of Project objects
+        lenders: LenderCriteriaMatrix or list of Lender objects (default: all lenders)
+        min_score: Minimum match score (default: 0.5)
+        chunk_size: Projects scored per chunk
+
+    Returns:
+        dict: Project id -> list of tuples (lender, score) sorted by score in descending order
+    """
+    if lenders is None:
+        lenders = Lender.query.all()
+    matrix = lenders if isinstance(lenders, LenderCriteriaMatrix) else LenderCriteriaMatrix(lenders)
+
+    results = {}
+    for chunk, scores in iter_score_matrix(projects, matrix, chunk_size):
+        for project, row in zip(chunk, scores):
+            columns = np.flatnonzero(row >= min_score)
+            columns = columns[np.argsort(-row[columns], kind='stable')]
+            results[project.id] = [(matrix.lenders[column], float(row[column])) for column in columns]
+
+    return results
@@ -0,0 +1,278 @@
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import select
+from extensions import db
+from app.models.models import MatchJob, Project
+from app.utils.match_algorithm import find_matching_lenders
+from app.utils.match_store import save_project_matches
+
+
+class MatchJobRunner:
+    """
+    Local worker pool that runs matching for new projects outside the request.
+
+    Jobs live in the match_jobs table, so no broker is needed. A job is claimed
+    with a conditional UPDATE from 'pending' to 'running', which lets several
+    gunicorn workers share the table without running a job twice. While a process
+    holds jobs, a heartbeat thread refreshes their heartbeat_at every
+    MATCH_JOB_HEARTBEAT_SECONDS, so only jobs of a dead process outlive their lease.
+    The match diff and the 'done' status are committed together, and only while
+    this process still owns the job, so a job that dies or loses its lease mid-run
+    leaves nothing behind and is simply requeued.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+        self._executor = None
+        self._sweeper = None
+        self._heartbeat = None
+        self._active = 0
+        self._stopped = threading.Event()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['match_job_runner'] = self
+        if app.config.get('MATCH_JOB_WORKERS', 0) > 0:
+            app.before_first_request(self.start)
+
+    @property
+    def workers(self):
+        return self.app.config.get('MATCH_JOB_WORKERS', 0)
+
+    def start(self):
+        """Start the worker pool, the stale job sweeper and the lease heartbeat for this process."""
+        with self._lock:
+            if self._executor is not None or self.workers <= 0:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='match-job')
+            self._sweeper = threading.Thread(target=self._sweep_forever, name='match-job-sweeper', daemon=True)
+            self._sweeper.start()
+            self._heartbeat = threading.Thread(target=self._heartbeat_forever, name='match-job-heartbeat',
+                                               daemon=True)
+            self._heartbeat.start()
+
+    def enqueue(self, project):
+        """
+        Create a pending match job for a project. The caller commits.
+
+        Args:
+            project: Project object
+
+        Returns:
+            MatchJob: The new job
+        """
+        job = MatchJob(id=str(uuid.uuid4()), project_id=project.id, status='pending', attempts=0)
+        db.session.add(job)
+        return job
+
+    def submit(self, job_id):
+        """
+        Claim a committed job and hand it to the pool, or run it inline when the pool is disabled.
+
+        Returns:
+            bool: False if another worker had already claimed the job
+        """
+        if self.workers <= 0:
+            return self.run_job(job_id)
+        if not self._claim(job_id):
+            return False
+        self._dispatch(job_id)
+        return True
+
+    def _dispatch(self, job_id):
+        self.start()
+        with self._lock:
+            self._active += 1
+        self._executor.submit(self._run_in_context, job_id)
+
+    def _run_in_context(self, job_id):
+        with self.app.app_context():
+            try:
+                self._run_claimed(job_id)
+            except Exception:
+                self.app.logger.exception('Match job %s crashed', job_id)
+            finally:
+                with self._lock:
+                    self._active -= 1
+
+    def _claim_values(self):
+        now = datetime.utcnow()
+        return {
+            'status': 'running',
+            'worker_id': self.worker_id,
+            'heartbeat_at': now,
+            'attempts': MatchJob.__table__.c.attempts + 1,
+            'updated_at': now
+        }
+
+    def _claim(self, job_id):
+        table = MatchJob.__table__
+        result = db.session.connection().execute(
+            table.update().where((table.c.id == job_id) & (table.c.status == 'pending')).values(**self._claim_values())
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def _claim_pending(self, limit):
+        """
+        Claim up to limit pending jobs, oldest first, so that each is taken by one process only.
+
+        PostgreSQL claims them in one UPDATE over a FOR UPDATE SKIP LOCKED subquery;
+        other databases claim the candidates one conditional UPDATE at a time.
+
+        Returns:
+            list: Ids of the jobs this process now owns
+        """
+        if limit <= 0:
+            return []
+        table = MatchJob.__table__
+        connection = db.session.connection()
+        candidates = select(table.c.id).where(table.c.status == 'pending').order_by(table.c.created_at).limit(limit)
+
+        if connection.dialect.name == 'postgresql':
+            result = connection.execute(
+                table.update().where(
+                    table.c.id.in_(candidates.with_for_update(skip_locked=True))
+                ).values(**self._claim_values()).returning(table.c.id)
+            )
+            claimed = [job_id for job_id, in result]
+            db.session.commit()
+            return claimed
+
+        candidate_ids = [job_id for job_id, in connection.execute(candidates)]
+        db.session.commit()
+        return [job_id for job_id in candidate_ids if self._claim(job_id)]
+
+    def _owned(self, job_id):
+        return (MatchJob.id == job_id) & (MatchJob.worker_id == self.worker_id) & (MatchJob.status == 'running')
+
+    def run_job(self, job_id):
+        """
+        Claim and run one job. Safe to call for a job another worker already took.
+
+        Returns:
+            bool: True if this call ran the job to completion
+        """
+        if not self._claim(job_id):
+            return False
+        return self._run_claimed(job_id)
+
+    def _run_claimed(self, job_id):
+        job = MatchJob.query.get(job_id)
+        try:
+            project = Project.query.get(job.project_id)
+            matches = []
+            if project:
+                matches = find_matching_lenders(project)
+                save_project_matches(project, matches)
+
+            finished = MatchJob.query.filter(self._owned(job_id)).update({
+                MatchJob.status: 'done',
+                MatchJob.match_count: len(matches),
+                MatchJob.error: None,
+                MatchJob.updated_at: datetime.utcnow()
+            }, synchronize_session=False)
+            if not finished:
+                # The lease expired and the job was requeued; its new owner writes the matches
+                db.session.rollback()
+                self.app.logger.warning('Match job %s lost its lease; discarding this run', job_id)
+                return False
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            job = MatchJob.query.filter(self._owned(job_id)).first()
+            if job is None:
+                return False
+            retry = job.attempts < self.app.config.get('MATCH_JOB_MAX_ATTEMPTS', 3)
+            job.status = 'pending' if retry else 'failed'
+            job.error = str(e)
+            db.session.commit()
+            if retry:
+                self.submit(job_id)
+            return False
+
+    def heartbeat(self):
+        """
+        Extend the lease of every job this process holds, running or queued in the pool.
+
+        Returns:
+            int: Number of jobs refreshed
+        """
+        refreshed = MatchJob.query.filter(
+            MatchJob.worker_id == self.worker_id,
+            MatchJob.status == 'running'
+        ).update({MatchJob.heartbeat_at: datetime.utcnow()}, synchronize_session=False)
+        db.session.commit()
+        return refreshed
+
+    def recover(self):
+        """
+        Requeue jobs whose worker died, then claim pending jobs up to this pool's free capacity.
+
+        Returns:
+            int: Number of jobs claimed by this process
+        """
+        lease = timedelta(seconds=self.app.config.get('MATCH_JOB_LEASE_SECONDS', 300))
+        max_attempts = self.app.config.get('MATCH_JOB_MAX_ATTEMPTS', 3)
+        expired = datetime.utcnow() - lease
+
+        stale_jobs = MatchJob.query.filter(
+            MatchJob.status == 'running',
+            MatchJob.heartbeat_at < expired
+        ).all()
+        for job in stale_jobs:
+            job.status = 'pending' if job.attempts < max_attempts else 'failed'
+            if job.status == 'failed':
+                job.error = 'Worker lease expired'
+        db.session.commit()
+
+        with self._lock:
+            capacity = self.workers - self._active
+        claimed = self._claim_pending(capacity)
+        for job_id in claimed:
+            self._dispatch(job_id)
+        return len(claimed)
+
+    def _sweep_forever(self):
+        interval = self.app.config.get('MATCH_JOB_SWEEP_SECONDS', 60)
+        # Sweep right away so jobs left behind by a dead process are picked up on boot
+        while True:
+            with self.app.app_context():
+                try:
+                    self.recover()
+                except Exception:
+                    self.app.logger.exception('Match job sweep failed')
+            if self._stopped.wait(interval):
+                return
+
+    def _heartbeat_forever(self):
+        interval = self.app.config.get('MATCH_JOB_HEARTBEAT_SECONDS', 60)
+        while not self._stopped.wait(interval):
+            with self._lock:
+                active = self._active
+            if not active:
+                continue
+            with self.app.app_context():
+                try:
+                    self.heartbeat()
+                except Exception:
+                    self.app.logger.exception('Match job heartbeat failed')
+
+    def shutdown(self, wait=True):
+        self._stopped.set()
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+# One pool per worker process
+match_job_runner = MatchJobRunner()
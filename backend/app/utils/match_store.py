@@ -0,0 +1,281 @@
+import uuid
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import bindparam
+from sqlalchemy.dialects import postgresql
+from extensions import db
+from app.models.models import LenderMatch, IntroductionRequest, Project
+from app.utils.lender_index import lender_index
+from app.utils.events import stage_match_events
+from app.utils.match_algorithm import calculate_match_score, find_matching_lenders, iter_score_matrix, load_lenders
+
+MatchDiff = namedtuple('MatchDiff', ['inserted', 'updated', 'deleted'])
+
+# Rows per multi-row INSERT / executemany batch
+WRITE_BATCH_SIZE = 1000
+
+# Project attributes that feed calculate_match_score
+MATCH_FIELDS = ('asset_type', 'deal_type', 'capital_type', 'debt_request')
+
+# Columns the scorer needs; loading rows instead of Project objects keeps rematching cheap
+PROJECT_MATCH_COLUMNS = (
+    Project.id,
+    Project.borrower_id,
+    Project.asset_type,
+    Project.deal_type,
+    Project.capital_type,
+    Project.debt_request,
+)
+
+
+def _introduced_pairs(matches):
+    """(project_id, lender_id) pairs of matches created by an accepted introduction request."""
+    if not matches:
+        return set()
+    lender_ids = {match.lender_id for match in matches}
+    project_ids = {match.project_id for match in matches}
+
+    query = db.session.query(IntroductionRequest.project_id, IntroductionRequest.lender_id).filter(
+        IntroductionRequest.request_status == 'accepted'
+    )
+    if len(lender_ids) == 1:
+        query = query.filter(IntroductionRequest.lender_id == next(iter(lender_ids)))
+    else:
+        query = query.filter(IntroductionRequest.project_id.in_(project_ids))
+    return {tuple(row) for row in query}
+
+
+def existing_match_rows(*criteria, **filters):
+    """
+    Lightweight (id, project_id, lender_id, match_score) rows for a diff.
+
+    Args:
+        *criteria: SQL expressions passed to filter
+        **filters: Column filters passed to filter_by, e.g. project_id=...
+
+    Returns:
+        list: Row tuples
+    """
+    return db.session.query(
+        LenderMatch.id,
+        LenderMatch.project_id,
+        LenderMatch.lender_id,
+        LenderMatch.match_score
+    ).filter(*criteria).filter_by(**filters).all()
+
+
+def _batches(items, size=WRITE_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def write_matches(rows):
+    """
+    Insert or update match rows keyed on (project_id, lender_id) with batched statements.
+
+    PostgreSQL gets multi-row INSERT ... ON CONFLICT DO UPDATE upserts; other databases
+    get an executemany INSERT of the rows, which must then be new pairs.
+
+    Args:
+        rows: List of dicts with id, project_id, lender_id, borrower_id, match_score, created_at, updated_at
+    """
+    table = LenderMatch.__table__
+    connection = db.session.connection()
+
+    if connection.dialect.name == 'postgresql':
+        statement = postgresql.insert(table)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.project_id, table.c.lender_id],
+            set_={'match_score': statement.excluded.match_score, 'updated_at': statement.excluded.updated_at}
+        )
+        for batch in _batches(rows):
+            connection.execute(statement.values(batch))
+        return
+
+    for batch in _batches(rows):
+        connection.execute(table.insert(), batch)
+
+
+def update_match_scores(updates):
+    """
+    Update match scores by id with one executemany per batch.
+
+    Args:
+        updates: List of (match_id, score) tuples
+    """
+    table = LenderMatch.__table__
+    statement = table.update().where(table.c.id == bindparam('match_id')).values(
+        match_score=bindparam('new_score'),
+        updated_at=datetime.utcnow()
+    )
+    connection = db.session.connection()
+    for batch in _batches(updates):
+        connection.execute(statement, [{'match_id': match_id, 'new_score': score} for match_id, score in batch])
+
+
+def delete_matches(match_ids):
+    """Delete match rows by id in batches."""
+    table = LenderMatch.__table__
+    connection = db.session.connection()
+    for batch in _batches(list(match_ids)):
+        connection.execute(table.delete().where(table.c.id.in_(batch)))
+
+
+def apply_match_diff(existing_matches, desired, dry_run=False):
+    """
+    Bring a set of LenderMatch rows in line with freshly computed scores.
+
+    Only the differences are written: new pairs are inserted, changed scores are
+    updated and pairs that no longer qualify are deleted, each with batched
+    statements instead of one ORM object per row. Matches created by an accepted
+    introduction request are never deleted. The caller commits.
+
+    Args:
+        existing_matches: Rows (or LenderMatch objects) covering the scope being
+            recomputed, see existing_match_rows
+        desired: dict (project_id, lender_id) -> (borrower_id, score)
+        dry_run: Only count the differences, write nothing
+
+    Returns:
+        MatchDiff: Number of inserted, updated and deleted rows
+    """
+    # Core statements below bypass the unit of work; pending projects must exist first
+    db.session.flush()
+
+    protected = _introduced_pairs(existing_matches)
+    seen = set()
+    updates = []
+    delete_ids = []
+
+    for match in existing_matches:
+        key = (match.project_id, match.lender_id)
+        if key in seen:
+            # Duplicate row for the same pair
+            delete_ids.append(match.id)
+            continue
+        seen.add(key)
+
+        if key in desired:
+            score = desired[key][1]
+            if match.match_score != score:
+                updates.append((match.id, score))
+        elif key not in protected:
+            delete_ids.append(match.id)
+
+    now = datetime.utcnow()
+    inserts = [
+        {
+            'id': str(uuid.uuid4()),
+            'project_id': project_id,
+            'lender_id': lender_id,
+            'borrower_id': borrower_id,
+            'match_score': score,
+            'created_at': now,
+            'updated_at': now
+        }
+        for (project_id, lender_id), (borrower_id, score) in desired.items()
+        if (project_id, lender_id) not in seen
+    ]
+
+    if dry_run:
+        return MatchDiff(len(inserts), len(updates), len(delete_ids))
+
+    if delete_ids:
+        delete_matches(delete_ids)
+    if updates:
+        update_match_scores(updates)
+    if inserts:
+        write_matches(inserts)
+        stage_match_events(db.session, inserts)
+
+    return MatchDiff(len(inserts), len(updates), len(delete_ids))
+
+
+def save_project_matches(project, matches, lender_ids=None):
+    """
+    Persist a project's match set as a diff against what is stored.
+
+    Args:
+        project: Project object (or row with id and borrower_id)
+        matches: List of tuples (lender, score)
+        lender_ids: Restrict the diff to these lenders (default: all of the project's matches)
+
+    Returns:
+        MatchDiff: Number of inserted, updated and deleted rows
+    """
+    existing_matches = existing_match_rows(project_id=project.id)
+    if lender_ids is not None:
+        existing_matches = [match for match in existing_matches if match.lender_id in lender_ids]
+
+    desired = {(project.id, lender.id): (project.borrower_id, score) for lender, score in matches}
+
+    return apply_match_diff(existing_matches, desired)
+
+
+def sync_lender_matches(lender, min_score=0.5):
+    """
+    Recompute one lender's matches against every project.
+
+    Scores only this lender, so a criteria change costs O(projects) instead of a
+    full rematch. Projects have no status yet, so every project is treated as open.
+
+    Args:
+        lender: Lender object with its new criteria
+        min_score: Minimum match score (default: 0.5)
+
+    Returns:
+        MatchDiff: Number of inserted, updated and deleted rows
+    """
+    projects = db.session.query(*PROJECT_MATCH_COLUMNS).all()
+
+    desired = {}
+    for chunk, scores in iter_score_matrix(projects, [lender]):
+        for project, score in zip(chunk, scores[:, 0]):
+            if score >= min_score:
+                desired[(project.id, lender.id)] = (project.borrower_id, float(score))
+
+    existing_matches = existing_match_rows(lender_id=lender.id)
+
+    return apply_match_diff(existing_matches, desired)
+
+
+def match_fields(project):
+    """Snapshot of the project attributes that affect matching."""
+    return {field: getattr(project, field) for field in MATCH_FIELDS}
+
+
+def sync_project_matches(project, previous, min_score=0.5):
+    """
+    Recompute a project's matches after an edit, limited to what the edit can change.
+
+    - No matching field changed: nothing to do.
+    - Only debt_request changed: only lenders whose loan-size criterion flips
+      between the old and new amount can change score, so only those are rescored.
+    - Any categorical field changed: the project is rematched through the index.
+
+    Args:
+        project: Project object with the new values applied
+        previous: match_fields(project) taken before the edit
+        min_score: Minimum match score (default: 0.5)
+
+    Returns:
+        MatchDiff: Number of inserted, updated and deleted rows
+    """
+    changed = {field for field in MATCH_FIELDS if getattr(project, field) != previous[field]}
+    if not changed:
+        return MatchDiff(0, 0, 0)
+
+    if changed == {'debt_request'}:
+        lender_index.sync()
+        affected = (lender_index.loan_size_hits(previous['debt_request'])
+                    ^ lender_index.loan_size_hits(project.debt_request))
+        affected |= lender_index.irregular_ids()
+
+        matches = []
+        for lender in load_lenders(affected):
+            score = calculate_match_score(project, lender)
+            if score >= min_score:
+                matches.append((lender, score))
+        return save_project_matches(project, matches, lender_ids=affected)
+
+    return save_project_matches(project, find_matching_lenders(project, min_score))
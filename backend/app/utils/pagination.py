@@ -0,0 +1,266 @@
+import base64
+import json
+from collections import namedtuple
+from datetime import datetime, timezone
+from sqlalchemy import tuple_
+from extensions import db
+from app.models.models import Communication, LenderMatch, Project
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Unpaged listings are read from a server-side cursor this many rows at a time
+UNPAGED_BATCH_SIZE = 500
+
+# Response header carrying the cursor of the next page
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+# rows is a list when paged, otherwise the ordered query to stream from
+Page = namedtuple('Page', ['rows', 'next_cursor', 'paged'])
+
+
+class InvalidPageRequest(ValueError):
+    """Malformed cursor, limit or filter; answered with a 400."""
+
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return {'dt': value.isoformat()}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        return datetime.fromisoformat(value['dt'])
+    return value
+
+
+def _matches_column(value, column):
+    """Whether a decoded cursor value can be compared with a key column."""
+    if value is None:
+        return column.nullable
+    python_type = column.type.python_type
+    if python_type is float:
+        return isinstance(value, (int, float)) and not isinstance(value, bool)
+    return isinstance(value, python_type)
+
+
+def encode_cursor(sort, values):
+    """Opaque cursor for the row after which the next page starts."""
+    payload = json.dumps([sort, [_encode_value(value) for value in values]], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Parse a cursor made by encode_cursor.
+
+    Returns:
+        tuple: (sort name, list of key values)
+
+    Raises:
+        InvalidPageRequest: The cursor is malformed
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        sort, values = json.loads(payload)
+        if not isinstance(sort, str) or not isinstance(values, list):
+            raise ValueError(sort)
+        return sort, [_decode_value(value) for value in values]
+    except (ValueError, TypeError, KeyError):
+        raise InvalidPageRequest('Invalid cursor')
+
+
+def page_size(args):
+    """
+    Requested page size, or None when the client did not ask for paging.
+
+    Paging is opt-in so existing clients keep getting the full list.
+    """
+    if 'limit' not in args and 'cursor' not in args:
+        return None
+    limit = args.get('limit', DEFAULT_PAGE_SIZE, type=int)
+    if limit is None or limit < 1:
+        raise InvalidPageRequest('limit must be a positive integer')
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def keyset_page(query, sort, key_columns, args):
+    """
+    One page of a query ordered by key_columns descending.
+
+    The next page starts strictly after the last row's key, so its cost does not
+    depend on how deep the client has scrolled, unlike OFFSET. The last key
+    column must be unique.
+
+    Args:
+        query: Query to page through
+        sort: Name of the sort order, stored in the cursor
+        key_columns: Columns to order by, e.g. (LenderMatch.created_at, LenderMatch.id)
+        args: Request args with optional limit and cursor
+
+    Returns:
+        Page: Without limit or cursor, rows is the whole ordered query, read in
+        batches of UNPAGED_BATCH_SIZE
+
+    Raises:
+        InvalidPageRequest: Malformed limit or cursor, or a cursor of another sort
+            order or with values of the wrong type
+    """
+    query = query.order_by(*[column.desc() for column in key_columns])
+
+    limit = page_size(args)
+    if limit is None:
+        return Page(query.yield_per(UNPAGED_BATCH_SIZE), None, False)
+
+    cursor = args.get('cursor')
+    if cursor:
+        cursor_sort, values = decode_cursor(cursor)
+        if cursor_sort != sort or len(values) != len(key_columns):
+            raise InvalidPageRequest('Cursor does not belong to this sort order')
+        # A tampered cursor must not reach the database as an unbindable parameter
+        if not all(_matches_column(value, column) for value, column in zip(values, key_columns)):
+            raise InvalidPageRequest('Invalid cursor')
+        query = query.filter(tuple_(*key_columns) < tuple_(*values))
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return Page(rows, None, True)
+
+    rows = rows[:limit]
+    last = rows[-1]
+    return Page(rows, encode_cursor(sort, [getattr(last, column.key) for column in key_columns]), True)
+
+
+# ----------------------------------------------------------------------
+# Match listings
+# ----------------------------------------------------------------------
+
+MATCH_SORTS = {
+    'created_at': (LenderMatch.created_at, LenderMatch.id),
+    'match_score': (LenderMatch.match_score, LenderMatch.id),
+}
+
+
+def match_page(query, args):
+    """
+    Filter, sort and page a LenderMatch query from request args.
+
+    Supported args: sort (created_at or match_score, newest/highest first),
+    min_score, asset_type, project_id, limit and cursor.
+
+    Args:
+        query: Query over LenderMatch joined to Project, see MatchListing.query
+        args: Request args
+
+    Returns:
+        Page: See keyset_page
+
+    Raises:
+        InvalidPageRequest: Unknown sort or malformed filter, limit or cursor
+    """
+    sort = args.get('sort', 'created_at')
+    if sort not in MATCH_SORTS:
+        raise InvalidPageRequest(f'sort must be one of: {", ".join(MATCH_SORTS)}')
+
+    if 'min_score' in args:
+        min_score = args.get('min_score', type=float)
+        if min_score is None:
+            raise InvalidPageRequest('min_score must be a number')
+        query = query.filter(LenderMatch.match_score >= min_score)
+    if args.get('project_id'):
+        query = query.filter(LenderMatch.project_id == args['project_id'])
+    if args.get('asset_type'):
+        query = query.filter(Project.asset_type == args['asset_type'])
+
+    return keyset_page(query, sort, MATCH_SORTS[sort], args)
+
+
+# ----------------------------------------------------------------------
+# Message threads
+# ----------------------------------------------------------------------
+
+# Thread order; served by idx_communications_project_created
+MESSAGE_KEY = (Communication.created_at, Communication.id)
+
+# Args that ask for part of a thread instead of all of it
+MESSAGE_WINDOW_ARGS = ('since', 'after_id', 'before', 'limit')
+
+
+def _parse_since(value):
+    try:
+        since = datetime.fromisoformat(value)
+    except ValueError:
+        raise InvalidPageRequest('since must be an ISO 8601 timestamp')
+    if since.tzinfo is not None:
+        # created_at is stored as naive UTC
+        since = since.astimezone(timezone.utc).replace(tzinfo=None)
+    return since
+
+
+def _message_position(project_id, message_id, arg):
+    position = db.session.query(*MESSAGE_KEY).filter(
+        Communication.id == message_id,
+        Communication.project_id == project_id
+    ).first()
+    if position is None:
+        raise InvalidPageRequest(f'{arg} is not a message of this conversation')
+    return tuple(position)
+
+
+def is_message_window(args):
+    """Whether the request asks for part of a thread, see message_page."""
+    return any(name in args for name in MESSAGE_WINDOW_ARGS)
+
+
+def message_page(query, project_id, args):
+    """
+    Select part of a project's message thread from request args.
+
+    - since (ISO timestamp) or after_id (message id): the messages after it, oldest
+      first, for clients that only need what is new.
+    - before (message id): the messages just before it, for loading older history.
+    - limit alone: the newest messages of the thread.
+
+    Every window is read from the (project_id, created_at, id) index, so its cost
+    does not grow with the length of the thread. Rows are always in thread order.
+    When more messages remain, next_cursor is the message id to pass as after_id
+    (forward) or before (backward) to continue. Without any of these args, rows is
+    the whole ordered thread, read in batches of UNPAGED_BATCH_SIZE.
+
+    Args:
+        query: Query over Communication, filtered to the conversation
+        project_id: Project of the conversation
+        args: Request args
+
+    Returns:
+        Page: See keyset_page
+
+    Raises:
+        InvalidPageRequest: Malformed timestamp or limit, or an id from another conversation
+    """
+    if not is_message_window(args):
+        return Page(query.order_by(*MESSAGE_KEY).yield_per(UNPAGED_BATCH_SIZE), None, False)
+
+    limit = page_size(args) or DEFAULT_PAGE_SIZE
+    forward = bool(args.get('since') or args.get('after_id'))
+
+    if args.get('since'):
+        query = query.filter(Communication.created_at > _parse_since(args['since']))
+    if args.get('after_id'):
+        after = _message_position(project_id, args['after_id'], 'after_id')
+        query = query.filter(tuple_(*MESSAGE_KEY) > tuple_(*after))
+    if args.get('before'):
+        before = _message_position(project_id, args['before'], 'before')
+        query = query.filter(tuple_(*MESSAGE_KEY) < tuple_(*before))
+
+    if forward:
+        rows = query.order_by(*MESSAGE_KEY).limit(limit + 1).all()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return Page(rows, rows[-1].id if more else None, True)
+
+    rows = query.order_by(*[column.desc() for column in MESSAGE_KEY]).limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit][::-1]
+    return Page(rows, rows[0].id if more else None, True)
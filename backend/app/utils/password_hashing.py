@@ -0,0 +1,124 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import jsonify
+from werkzeug.security import DEFAULT_PBKDF2_ITERATIONS, check_password_hash, generate_password_hash
+
+
+class PasswordHashingBusy(Exception):
+    """Raised when the hashing queue is full; answered with a 429."""
+
+
+def _normalize_method(method):
+    # werkzeug stores 'pbkdf2:sha256' as 'pbkdf2:sha256:<default iterations>'
+    parts = method.split(':')
+    if parts[0] == 'pbkdf2' and len(parts) == 2:
+        parts.append(str(DEFAULT_PBKDF2_ITERATIONS))
+    return ':'.join(parts)
+
+
+class PasswordHasher:
+    """
+    Runs password hashing on a small dedicated thread pool.
+
+    The request thread still waits for its hash; the pool does not free it. What
+    it bounds is how many hashes a process runs at once: at most `workers` run
+    and at most `queue_size` more wait, anything beyond that is rejected right
+    away with PasswordHashingBusy (a 429) instead of piling up, so a burst of
+    logins cannot take every core from the other endpoints' request threads.
+
+    That only happens with threaded workers, as configured in gunicorn.conf.py,
+    whose thread count exceeds workers + queue_size. A sync worker serves one
+    request at a time and never reaches the limit.
+
+    Without init_app (scripts, seeding) hashing runs inline.
+    """
+
+    def __init__(self, app=None):
+        self.method = _normalize_method('pbkdf2:sha256')
+        self.workers = 0
+        self.queue_size = 0
+        self._executor = None
+        self._slots = None
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.rejected = 0
+        self.completed = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.method = _normalize_method(app.config.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256'))
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+        self.queue_size = app.config.get('PASSWORD_HASH_QUEUE_SIZE', 32)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self.workers > 0:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+            self._slots = threading.BoundedSemaphore(self.workers + self.queue_size)
+        app.extensions['password_hasher'] = self
+        app.register_error_handler(PasswordHashingBusy, self._busy_response)
+
+    @staticmethod
+    def _busy_response(error):
+        response = jsonify({'error': 'Too many authentication requests, please retry shortly'})
+        response.headers['Retry-After'] = '1'
+        return response, 429
+
+    def _run(self, fn, *args):
+        if self._executor is None:
+            return fn(*args)
+
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise PasswordHashingBusy()
+
+        with self._lock:
+            self.in_flight += 1
+        try:
+            return self._executor.submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self.completed += 1
+            self._slots.release()
+
+    def hash(self, password):
+        """
+        Hash a password with the configured method.
+
+        Raises:
+            PasswordHashingBusy: The hashing queue is full
+        """
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, pwhash, password):
+        """
+        Check a password against a stored hash.
+
+        Raises:
+            PasswordHashingBusy: The hashing queue is full
+        """
+        if not pwhash:
+            return False
+        return self._run(check_password_hash, pwhash, password)
+
+    def needs_rehash(self, pwhash):
+        """True if the hash was made with other cost parameters than configured."""
+        return bool(pwhash) and pwhash.split('$', 1)[0] != self.method
+
+    def stats(self):
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'max_queue': self.queue_size,
+                'in_flight': self.in_flight,
+                'queued': max(self.in_flight - self.workers, 0),
+                'completed': self.completed,
+                'rejected': self.rejected
+            }
+
+
+# One pool per worker process
+password_hasher = PasswordHasher()
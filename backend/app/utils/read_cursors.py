@@ -0,0 +1,157 @@
+from itertools import groupby
+from sqlalchemy import tuple_
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from app.models.models import Communication, MessageReadCursor
+from app.utils.unread_counters import UPSERT_DIALECTS, decrement_unread
+
+# Rows fetched per round trip by backfill_read_cursors
+BACKFILL_BATCH_SIZE = 1000
+
+MESSAGE_POSITION = tuple_(Communication.created_at, Communication.id)
+
+
+def read_cursors(project_id):
+    """
+    Read cursor positions of every participant of a project's conversation.
+
+    Args:
+        project_id: Project ID
+
+    Returns:
+        dict: user_id -> (read_up_to_at, read_up_to_id)
+    """
+    rows = db.session.query(
+        MessageReadCursor.user_id, MessageReadCursor.read_up_to_at, MessageReadCursor.read_up_to_id
+    ).filter(MessageReadCursor.project_id == project_id)
+    return {user_id: (read_up_to_at, read_up_to_id) for user_id, read_up_to_at, read_up_to_id in rows}
+
+
+def _create_cursor(user_id, project_id, position):
+    """
+    Insert a read cursor unless one exists already.
+
+    Two first reads of the same conversation race to create the cursor; the loser
+    gets False instead of a primary key violation.
+
+    Returns:
+        bool: True if this call created the cursor
+    """
+    table = MessageReadCursor.__table__
+    values = {
+        'user_id': user_id,
+        'project_id': project_id,
+        'read_up_to_at': position[0],
+        'read_up_to_id': position[1]
+    }
+    connection = db.session.connection()
+    dialect = UPSERT_DIALECTS.get(connection.dialect.name)
+
+    if dialect is not None:
+        result = connection.execute(dialect.insert(table).values(**values).on_conflict_do_nothing(
+            index_elements=[table.c.user_id, table.c.project_id]
+        ))
+        return result.rowcount == 1
+
+    try:
+        with db.session.begin_nested():
+            db.session.connection().execute(table.insert().values(**values))
+    except IntegrityError:
+        return False
+    return True
+
+
+def advance_read_cursor(user_id, project_id, message):
+    """
+    Mark a user's conversation read up to and including a message. The caller commits.
+
+    The cursor never moves backwards. The user's unread counter is decremented by
+    the received messages the move covers, which one range count finds. Concurrent
+    calls for the same conversation are serialized on the cursor row.
+
+    Args:
+        user_id: Participant's user ID
+        project_id: Project of the conversation
+        message: Communication to read up to
+
+    Returns:
+        tuple: (MessageReadCursor, number of messages newly marked read)
+    """
+    cursor_query = MessageReadCursor.query.filter_by(user_id=user_id, project_id=project_id).with_for_update()
+    cursor = cursor_query.first()
+    created = False
+    if cursor is None:
+        created = _create_cursor(user_id, project_id, message.position)
+        # Either ours or the one a concurrent first read just committed
+        cursor = cursor_query.one()
+    if not created and message.position <= cursor.position:
+        return cursor, 0
+
+    covered = Communication.query.filter(
+        Communication.project_id == project_id,
+        Communication.recipient_id == user_id,
+        MESSAGE_POSITION <= tuple_(*message.position)
+    )
+    if not created:
+        covered = covered.filter(MESSAGE_POSITION > tuple_(*cursor.position))
+    covered = covered.count()
+
+    cursor.read_up_to_at, cursor.read_up_to_id = message.position
+    if covered:
+        decrement_unread(user_id, project_id, covered)
+    return cursor, covered
+
+
+def latest_message(user_id, project_id):
+    """Newest message of a project's conversation sent to or by the user, or None."""
+    return Communication.query.filter(
+        Communication.project_id == project_id,
+        (Communication.sender_id == user_id) | (Communication.recipient_id == user_id)
+    ).order_by(Communication.created_at.desc(), Communication.id.desc()).first()
+
+
+def backfill_read_cursors(batch_size=BACKFILL_BATCH_SIZE):
+    """
+    Create read cursors from the legacy per-message is_read flags.
+
+    A recipient's cursor is placed on the last message before their first unread
+    one, so no unread message is ever marked read; read messages after an unread
+    one become unread again. Conversations that already have a cursor are left
+    alone, which makes the backfill safe to rerun. The caller commits and should
+    then run reconcile_unread_counters.
+
+    Returns:
+        int: Number of cursors created
+    """
+    existing = set(db.session.query(MessageReadCursor.user_id, MessageReadCursor.project_id))
+
+    rows = db.session.query(
+        Communication.recipient_id, Communication.project_id, Communication.created_at, Communication.id,
+        Communication.is_read
+    ).order_by(
+        Communication.recipient_id, Communication.project_id, Communication.created_at, Communication.id
+    ).yield_per(batch_size)
+
+    cursors = []
+    for (recipient_id, project_id), messages in groupby(rows, key=lambda row: (row[0], row[1])):
+        if (recipient_id, project_id) in existing:
+            continue
+        last_read = None
+        for message in messages:
+            # NULL never counted as unread
+            if message.is_read is False:
+                break
+            last_read = message
+        if last_read is not None:
+            cursors.append({
+                'user_id': recipient_id,
+                'project_id': project_id,
+                'read_up_to_at': last_read.created_at,
+                'read_up_to_id': last_read.id
+            })
+
+    table = MessageReadCursor.__table__
+    connection = db.session.connection()
+    for start in range(0, len(cursors), batch_size):
+        connection.execute(table.insert(), cursors[start:start + batch_size])
+    return len(cursors)
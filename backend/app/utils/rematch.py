@@ -0,0 +1,90 @@
+"""
+Full-book rematch: every project rescored against every lender.
+
+The work is split into chunks of project ids that run in a multiprocessing pool.
+Each worker process builds its own app, and with it its own database engine, and
+encodes all lenders once into a LenderCriteriaMatrix that every chunk reuses.
+"""
+import json
+import os
+from collections import namedtuple
+from extensions import db
+from app.models.models import Lender, LenderMatch, Project
+from app.utils.match_algorithm import LenderCriteriaMatrix, iter_score_matrix
+from app.utils.match_store import PROJECT_MATCH_COLUMNS, apply_match_diff, existing_match_rows
+
+ChunkResult = namedtuple('ChunkResult', ['last_project_id', 'projects', 'inserted', 'updated', 'deleted'])
+
+# Per-process state set up by init_worker
+_worker = {}
+
+
+def init_worker(database_uri, min_score):
+    """Pool initializer: a fresh app and engine for this process, and the encoded lender book."""
+    from app import create_app
+
+    app = create_app()
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['MATCH_JOB_WORKERS'] = 0
+
+    # The context lives as long as the worker process
+    context = app.app_context()
+    context.push()
+
+    lenders = db.session.query(Lender).all()
+    # Detach so commits in rematch_chunk do not expire the cached criteria
+    db.session.expunge_all()
+
+    _worker.update(app=app, context=context, matrix=LenderCriteriaMatrix(lenders), min_score=min_score)
+
+
+def rematch_chunk(project_ids, dry_run=False):
+    """
+    Rescore one chunk of projects and write the match diff with batched statements.
+
+    Args:
+        project_ids: Sorted list of project ids
+        dry_run: Count the churn without writing
+
+    Returns:
+        ChunkResult: Last project id of the chunk and the diff counts
+    """
+    matrix, min_score = _worker['matrix'], _worker['min_score']
+
+    try:
+        projects = db.session.query(*PROJECT_MATCH_COLUMNS).filter(Project.id.in_(project_ids)).all()
+
+        desired = {}
+        for chunk, scores in iter_score_matrix(projects, matrix):
+            for project, row in zip(chunk, scores):
+                for column in (row >= min_score).nonzero()[0]:
+                    desired[(project.id, matrix.lenders[column].id)] = (project.borrower_id, float(row[column]))
+
+        existing_matches = existing_match_rows(LenderMatch.project_id.in_(project_ids))
+        diff = apply_match_diff(existing_matches, desired, dry_run=dry_run)
+
+        if dry_run:
+            db.session.rollback()
+        else:
+            db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    return ChunkResult(project_ids[-1], len(projects), *diff)
+
+
+def load_checkpoint(path):
+    """Checkpoint dict written by save_checkpoint, or None."""
+    if not path or not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(path, checkpoint):
+    """Write the checkpoint atomically so an interruption never leaves a torn file."""
+    temporary_path = f'{path}.tmp'
+    with open(temporary_path, 'w') as f:
+        json.dump(checkpoint, f)
+    os.replace(temporary_path, path)
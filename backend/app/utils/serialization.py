@@ -0,0 +1,166 @@
+from datetime import datetime
+from flask import Response, json
+from sqlalchemy.orm import aliased
+from extensions import db
+from app.models.models import User, Project, LenderMatch
+
+try:
+    import orjson
+except ImportError:  # Optional: falls back to Flask's encoder
+    orjson = None
+
+
+def dumps(value):
+    """Encode JSON with orjson when installed, else with Flask's encoder."""
+    if orjson is not None:
+        return orjson.dumps(value).decode()
+    return json.dumps(value)
+
+
+def json_response(value):
+    """Like jsonify, using dumps."""
+    return Response(dumps(value), mimetype='application/json')
+
+
+class FieldPlan:
+    """
+    Precompiled mapping from a slice of selected columns to one output dict.
+
+    Replaces to_dict on hydrated objects for hot listings: the query selects only
+    plan.columns, and build() zips a row slice with the output keys. Timestamps are
+    converted to ISO strings here unless orjson, which encodes them natively with
+    the same format, is doing the encoding.
+
+    Args:
+        model: Mapped class
+        fields: Attribute names, in output order
+        prefix: Label prefix keeping column names unique when several plans share
+            a query; the root plan of a query uses none so rows keep the model's
+            attribute names
+    """
+
+    def __init__(self, model, fields, prefix=None):
+        self.model = model
+        self.fields = tuple(fields)
+        self.prefix = prefix
+        self.columns = [
+            getattr(model, field).label(f'{prefix}__{field}' if prefix else field) for field in self.fields
+        ]
+        self._timestamps = () if orjson is not None else tuple(
+            field for field in self.fields
+            if getattr(getattr(model, field).type, 'python_type', None) is datetime
+        )
+
+    def select(self, fields):
+        """Plan limited to the given fields, keeping this plan's order."""
+        return FieldPlan(self.model, [field for field in self.fields if field in fields], self.prefix)
+
+    def build(self, row, offset=0):
+        """
+        Output dict from row[offset:offset + len(plan.fields)].
+
+        Args:
+            row: Result row or tuple
+            offset: Position of this plan's first column in the row
+
+        Returns:
+            dict
+        """
+        data = dict(zip(self.fields, row[offset:offset + len(self.fields)]))
+        for field in self._timestamps:
+            value = data[field]
+            if value is not None:
+                data[field] = value.isoformat()
+        return data
+
+
+# Field plans mirroring the models' to_dict output
+MATCH_FIELDS = ('id', 'project_id', 'lender_id', 'borrower_id', 'match_score', 'created_at')
+PROJECT_FIELDS = (
+    'id', 'borrower_id', 'project_address', 'asset_type', 'deal_type', 'capital_type', 'debt_request',
+    'total_cost', 'completed_value', 'project_description', 'created_at', 'updated_at'
+)
+PARTY_FIELDS = ('id', 'company_name', 'first_name', 'last_name')
+
+
+class MatchListing:
+    """
+    Column-projected match listing: one row per match with its project and the
+    summaries of the requested parties, serialized without loading ORM objects.
+
+    Args:
+        parties: Which of 'borrower' and 'lender' to embed
+        fields: Sparse fieldset from parse_fields, or None for everything
+    """
+
+    # Always selected so keyset pagination can read the last row's key
+    KEY_COLUMNS = (LenderMatch.id, LenderMatch.created_at, LenderMatch.match_score)
+
+    def __init__(self, parties=('borrower', 'lender'), fields=None):
+        self.parties = tuple(parties)
+        self.match_plan = FieldPlan(LenderMatch, _selected(MATCH_FIELDS, fields))
+        self.project_plan = None
+        if _wanted(fields, 'project'):
+            self.project_plan = FieldPlan(Project, _selected(PROJECT_FIELDS, _nested(fields, 'project')), prefix='project')
+        self.party_plans = []
+        self._party_users = []
+        for party in self.parties:
+            if not _wanted(fields, party):
+                continue
+            user = aliased(User, name=f'{party}_user')
+            self._party_users.append((party, user))
+            self.party_plans.append((party, FieldPlan(user, _selected(PARTY_FIELDS, _nested(fields, party)), prefix=party)))
+
+    def select(self, fields):
+        """Listing narrowed to a sparse fieldset (None keeps everything)."""
+        if fields is None:
+            return self
+        return MatchListing(self.parties, fields)
+
+    def query(self):
+        """Query selecting exactly the plans' columns, joined to the match's project and parties."""
+        columns = list(self.match_plan.columns)
+        if self.project_plan is not None:
+            columns += self.project_plan.columns
+        for _, plan in self.party_plans:
+            columns += plan.columns
+        columns += [column.label(column.key) for column in self.KEY_COLUMNS if column.key not in self.match_plan.fields]
+
+        # Project stays joined for the asset_type filter even when not selected
+        query = db.session.query(*columns).select_from(LenderMatch).join(
+            Project, LenderMatch.project_id == Project.id
+        )
+        for party, user in self._party_users:
+            query = query.outerjoin(user, getattr(LenderMatch, f'{party}_id') == user.id)
+        return query
+
+    def serialize(self, row):
+        """Output dict of one row, in the shape of the listing endpoints."""
+        data = self.match_plan.build(row)
+        offset = len(self.match_plan.fields)
+
+        if self.project_plan is not None:
+            data['project'] = self.project_plan.build(row, offset)
+            offset += len(self.project_plan.fields)
+
+        for party, plan in self.party_plans:
+            party_data = plan.build(row, offset)
+            offset += len(plan.fields)
+            # Same as before: parties whose user row is missing are left out
+            if party_data.get('id', True) is not None:
+                data[party] = party_data
+        return data
+
+
+def _wanted(fields, name):
+    return fields is None or name in fields
+
+
+def _nested(fields, name):
+    return None if fields is None else fields[name]
+
+
+def _selected(all_fields, fields):
+    if fields is None:
+        return all_fields
+    return [field for field in all_fields if field in fields]
@@ -0,0 +1,69 @@
+from flask import Response, stream_with_context
+from app.utils.pagination import NEXT_CURSOR_HEADER
+from app.utils.serialization import dumps, json_response
+from app.utils.fieldsets import pending_fields, prune
+
+# Rows serialized per chunk written to the client
+STREAM_CHUNK_ROWS = 100
+
+
+def stream_json_array(rows, serialize):
+    """
+    Stream rows as a JSON array without building the whole list in memory.
+
+    The query is started before the response is returned, so database errors
+    still surface in the view. An error after the first chunk can only cut the
+    response short.
+
+    Args:
+        rows: Query (ideally with yield_per, see UNPAGED_BATCH_SIZE) or any iterable of rows
+        serialize: Function turning one row into a JSON-serializable value
+
+    Returns:
+        Response: Streaming application/json response
+    """
+    rows = iter(rows)
+
+    fields = pending_fields()
+    if fields is not None:
+        serialize = _pruned(serialize, fields)
+
+    def generate():
+        yield '['
+        chunk = []
+        first = True
+        for row in rows:
+            chunk.append(dumps(serialize(row)))
+            if len(chunk) >= STREAM_CHUNK_ROWS:
+                yield ('' if first else ',') + ','.join(chunk)
+                first = False
+                chunk = []
+        if chunk:
+            yield ('' if first else ',') + ','.join(chunk)
+        yield ']'
+
+    return Response(stream_with_context(generate()), mimetype='application/json')
+
+
+def _pruned(serialize, fields):
+    return lambda row: prune(serialize(row), fields)
+
+
+def listing_response(page, serialize):
+    """
+    Response for a listing: a JSON page when the client paged, a stream otherwise.
+
+    Args:
+        page: Page from keyset_page/match_page
+        serialize: Function turning one row into a JSON-serializable value
+
+    Returns:
+        Response
+    """
+    if not page.paged:
+        return stream_json_array(page.rows, serialize)
+
+    response = json_response([serialize(row) for row in page.rows])
+    if page.next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = page.next_cursor
+    return response
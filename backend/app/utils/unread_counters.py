@@ -0,0 +1,116 @@
+from sqlalchemy import and_, case, func, or_
+from sqlalchemy.dialects import postgresql, sqlite
+from extensions import db
+from app.models.models import Communication, MessageReadCursor, UnreadCounter
+
+# Dialects with INSERT ... ON CONFLICT DO UPDATE
+UPSERT_DIALECTS = {'postgresql': postgresql, 'sqlite': sqlite}
+
+
+def increment_unread(user_id, project_id, amount=1):
+    """
+    Add to a recipient's unread count for a project in the current transaction.
+
+    Args:
+        user_id: Recipient's user ID
+        project_id: Project the messages belong to
+        amount: Number of new unread messages
+    """
+    table = UnreadCounter.__table__
+    connection = db.session.connection()
+    dialect = UPSERT_DIALECTS.get(connection.dialect.name)
+
+    if dialect is not None:
+        statement = dialect.insert(table).values(user_id=user_id, project_id=project_id, unread_count=amount)
+        connection.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.user_id, table.c.project_id],
+            set_={'unread_count': table.c.unread_count + statement.excluded.unread_count}
+        ))
+        return
+
+    result = connection.execute(table.update().where(
+        (table.c.user_id == user_id) & (table.c.project_id == project_id)
+    ).values(unread_count=table.c.unread_count + amount))
+    if not result.rowcount:
+        connection.execute(table.insert().values(user_id=user_id, project_id=project_id, unread_count=amount))
+
+
+def decrement_unread(user_id, project_id, amount=1):
+    """Subtract from a recipient's unread count for a project, never going below zero."""
+    table = UnreadCounter.__table__
+    db.session.connection().execute(table.update().where(
+        (table.c.user_id == user_id) & (table.c.project_id == project_id)
+    ).values(unread_count=case((table.c.unread_count > amount, table.c.unread_count - amount), else_=0)))
+
+
+def unread_counts(user_id):
+    """
+    A user's unread message counts, read from the counter table by primary key prefix.
+
+    Args:
+        user_id: Recipient's user ID
+
+    Returns:
+        tuple: (total, dict project_id -> count) with zero counts left out
+    """
+    rows = db.session.query(UnreadCounter.project_id, UnreadCounter.unread_count).filter(
+        UnreadCounter.user_id == user_id,
+        UnreadCounter.unread_count > 0
+    ).all()
+    projects = {project_id: count for project_id, count in rows}
+    return sum(projects.values()), projects
+
+
+def reconcile_unread_counters(user_id=None):
+    """
+    Repair counters that drifted from communications, e.g. after manual edits or a crash mid-deploy.
+
+    Recounts the messages past each recipient's read cursor with one grouped query
+    and rewrites only the counters that differ. Messages sent while it runs can be
+    counted twice or missed; the next run corrects them. The caller commits.
+
+    Args:
+        user_id: Only reconcile this recipient (default: everyone)
+
+    Returns:
+        int: Number of counters changed
+    """
+    actual_query = db.session.query(
+        Communication.recipient_id, Communication.project_id, func.count(Communication.id)
+    ).outerjoin(MessageReadCursor, and_(
+        MessageReadCursor.user_id == Communication.recipient_id,
+        MessageReadCursor.project_id == Communication.project_id
+    )).filter(or_(
+        MessageReadCursor.user_id.is_(None),
+        Communication.created_at > MessageReadCursor.read_up_to_at,
+        and_(Communication.created_at == MessageReadCursor.read_up_to_at,
+             Communication.id > MessageReadCursor.read_up_to_id)
+    )).group_by(Communication.recipient_id, Communication.project_id)
+    stored_query = db.session.query(UnreadCounter.user_id, UnreadCounter.project_id, UnreadCounter.unread_count)
+    if user_id is not None:
+        actual_query = actual_query.filter(Communication.recipient_id == user_id)
+        stored_query = stored_query.filter(UnreadCounter.user_id == user_id)
+
+    actual = {(recipient_id, project_id): count for recipient_id, project_id, count in actual_query}
+    stored = {(recipient_id, project_id): count for recipient_id, project_id, count in stored_query}
+
+    table = UnreadCounter.__table__
+    connection = db.session.connection()
+    inserts = []
+    repaired = 0
+
+    for key in stored.keys() | actual.keys():
+        count = actual.get(key, 0)
+        if stored.get(key) == count:
+            continue
+        repaired += 1
+        if key in stored:
+            connection.execute(table.update().where(
+                (table.c.user_id == key[0]) & (table.c.project_id == key[1])
+            ).values(unread_count=count))
+        else:
+            inserts.append({'user_id': key[0], 'project_id': key[1], 'unread_count': count})
+
+    if inserts:
+        connection.execute(table.insert(), inserts)
+    return repaired
@@ -0,0 +1,121 @@
+"""
+Bytes and latency saved by response compression on the match listing endpoints.
+
+For each listing and encoding (identity, gzip, br when installed) reports the
+body size, the median server time through the Flask test client, and the
+estimated time to first byte plus transfer over a link of --mbps megabits.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_compression [--matches 10000] [--mbps 20] [--repeat 5]
+
+Runs against in-memory SQLite unless BENCH_DATABASE_URL points elsewhere.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+from config import Config
+from extensions import db
+from app import create_app
+from app.models.models import Project, User
+from app.utils.auth import issue_access_token
+from app.utils.compression import brotli
+from app.utils.match_store import write_matches
+from benchmarks import synthetic
+
+# Lenders per project; sizes are reached by adding projects
+LENDERS = 500
+
+WORDS = ('stabilized', 'multifamily', 'value-add', 'renovation', 'tenant', 'occupancy', 'lease-up', 'market',
+         'downtown', 'submarket', 'construction', 'sponsor', 'equity', 'refinance', 'cash', 'flow', 'capital',
+         'units', 'retail', 'amenities', 'parking', 'transit', 'zoning', 'approved', 'plans', 'budget')
+
+
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.environ.get('BENCH_DATABASE_URL', 'sqlite://')
+    JWT_SECRET_KEY = 'benchmark'
+    MATCH_JOB_WORKERS = 0
+    PASSWORD_HASH_WORKERS = 0
+
+
+def _seed(matches, seed=0):
+    """Matches with realistic project descriptions; returns tokens of one lender, borrower and mediator."""
+    db.drop_all()
+    db.create_all()
+    rng = random.Random(seed)
+    ids = synthetic.seed(lenders=min(matches, LENDERS), projects=max(matches // LENDERS, 1), seed=seed)
+
+    connection = db.session.connection()
+    table = Project.__table__
+    for project_id in ids['project_ids']:
+        description = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(60, 160)))
+        connection.execute(table.update().where(table.c.id == project_id).values(project_description=description))
+
+    borrower_id = ids['borrower_ids'][0]
+    write_matches([
+        {'id': f'{project_id[:18]}{lender_id[:18]}', 'project_id': project_id, 'lender_id': lender_id,
+         'borrower_id': borrower_id, 'match_score': rng.choice([0.5, 0.75, 1.0])}
+        for project_id in ids['project_ids']
+        for lender_id in ids['lender_ids']
+    ][:matches])
+
+    mediator = User(email='mediator@synthetic.test', role='mediator')
+    db.session.add(mediator)
+    db.session.commit()
+
+    return {
+        'mediator': issue_access_token(mediator),
+        'lender': issue_access_token(db.session.get(User, ids['lender_ids'][0])),
+        'borrower': issue_access_token(db.session.get(User, borrower_id)),
+    }
+
+
+def _request(client, url, token, encoding):
+    headers = {'Authorization': f'Bearer {token}', 'Accept-Encoding': encoding}
+    start = time.perf_counter()
+    response = client.get(url, headers=headers)
+    body = response.get_data()
+    return time.perf_counter() - start, len(body), response.headers.get('Content-Encoding', 'identity')
+
+
+def run(app, matches, mbps, repeat):
+    with app.app_context():
+        tokens = _seed(matches)
+
+    encodings = ['identity', 'gzip'] + (['br'] if brotli is not None else [])
+    endpoints = [
+        ('/mediator/matches', 'mediator'),
+        ('/lender/matches', 'lender'),
+        ('/borrower/matches', 'borrower'),
+        ('/mediator/matches?limit=50', 'mediator'),
+    ]
+
+    client = app.test_client()
+    results = []
+    for url, role in endpoints:
+        for encoding in encodings:
+            samples = [_request(client, url, tokens[role], encoding) for _ in range(repeat)]
+            seconds = statistics.median(sample[0] for sample in samples)
+            size, applied = samples[-1][1], samples[-1][2]
+            results.append((url, applied, size, seconds, seconds + size * 8 / (mbps * 1e6)))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--matches', type=int, default=10000)
+    parser.add_argument('--mbps', type=float, default=20.0, help='Link speed for the transfer estimate.')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app(BenchmarkConfig)
+    print(f"{'endpoint':<28} {'encoding':<9} {'bytes':>11} {'server s':>9} {'total s':>9} {'saved s':>8}")
+    baseline = {}
+    for url, encoding, size, seconds, total in run(app, args.matches, args.mbps, args.repeat):
+        baseline.setdefault(url, total)
+        print(f'{url:<28} {encoding:<9} {size:>11,} {seconds:>9.4f} {total:>9.4f} {baseline[url] - total:>8.4f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Throughput of LenderMatch persistence: per-object ORM inserts versus the batched
+match store, for one project matched against N lenders.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_match_store [--sizes 10 1000 100000]
+
+Runs against in-memory SQLite unless BENCH_DATABASE_URL points elsewhere, e.g. a
+scratch PostgreSQL database to exercise the ON CONFLICT upsert path.
+"""
+import argparse
+import os
+import time
+from config import Config
+from extensions import db
+from app import create_app
+from app.models.models import Project, LenderMatch
+from app.utils.match_store import save_project_matches
+from benchmarks import synthetic
+
+
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.environ.get('BENCH_DATABASE_URL', 'sqlite://')
+    JWT_SECRET_KEY = 'benchmark'
+    MATCH_JOB_WORKERS = 0
+
+
+class _Ref:
+    """Stand-in for a Lender object; the store only needs the id."""
+
+    def __init__(self, id):
+        self.id = id
+
+
+def _seed(size):
+    """One project and `size` synthetic lenders, all of which the project will match."""
+    db.drop_all()
+    db.create_all()
+    ids = synthetic.seed(lenders=size, projects=1)
+    return Project.query.get(ids['project_ids'][0]), ids['lender_ids']
+
+
+def _clear(project):
+    db.session.connection().execute(LenderMatch.__table__.delete().where(LenderMatch.project_id == project.id))
+    db.session.commit()
+
+
+def _time(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def run(size):
+    project, lender_ids = _seed(size)
+    matches = [(_Ref(lender_id), 0.75) for lender_id in lender_ids]
+    rescored = [(lender, 1.0 if i % 2 else score) for i, (lender, score) in enumerate(matches)]
+
+    def orm_insert():
+        for lender, score in matches:
+            db.session.add(LenderMatch(project_id=project.id, lender_id=lender.id,
+                                       borrower_id=project.borrower_id, match_score=score))
+        db.session.commit()
+
+    def bulk_insert():
+        save_project_matches(project, matches)
+        db.session.commit()
+
+    def bulk_rescore():
+        save_project_matches(project, rescored)
+        db.session.commit()
+
+    results = {}
+    results['orm_insert'] = _time(orm_insert)
+    _clear(project)
+    results['bulk_insert'] = _time(bulk_insert)
+    results['bulk_rescore'] = _time(bulk_rescore)
+    _clear(project)
+
+    return {name: (seconds, size / seconds if seconds else float('inf')) for name, seconds in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10, 1000, 100000])
+    args = parser.parse_args()
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        print(f"{'matches':>8}  {'path':<13} {'seconds':>9} {'rows/sec':>12}")
+        for size in args.sizes:
+            for name, (seconds, rate) in run(size).items():
+                print(f'{size:>8}  {name:<13} {seconds:>9.4f} {rate:>12,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+"""
+Matching micro-benchmarks at realistic lender book sizes.
+
+Times each stage of matching separately against in-memory SQLite seeded with
+synthetic data: JSON parsing of lending criteria, candidate loading, scoring
+(per-pair Python and the NumPy batch scorer), end-to-end find_matching_lenders,
+and match persistence. Results are written as JSON so runs from different commits
+can be compared.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_matching [--sizes 1000 10000 100000] [--output results.json]
+    python -m benchmarks.bench_matching --compare before.json after.json
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from config import Config
+from extensions import db
+from app import create_app
+from app.models.models import Lender, Project
+from app.utils.lender_index import lender_index
+from app.utils.match_algorithm import (
+    LenderCriteriaMatrix, calculate_match_score, candidate_lender_query, find_matching_lenders, iter_score_matrix
+)
+from app.utils.match_store import save_project_matches
+from benchmarks import synthetic
+
+
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.environ.get('BENCH_DATABASE_URL', 'sqlite://')
+    JWT_SECRET_KEY = 'benchmark'
+    MATCH_JOB_WORKERS = 0
+
+
+def _measure(fn, repeat):
+    """Median wall time of fn over repeat runs, plus the last return value."""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), result
+
+
+def run_size(lenders, projects, repeat, seed):
+    db.drop_all()
+    db.create_all()
+    synthetic.seed(lenders=lenders, projects=projects, seed=seed)
+    db.session.expire_all()
+
+    sample = Project.query.order_by(Project.id).all()
+    raw_criteria = [text for text, in db.session.query(Lender.lending_criteria)]
+    stages = {}
+
+    stages['json_parsing'], _ = _measure(lambda: [json.loads(text) for text in raw_criteria], repeat)
+    stages['candidate_loading_orm'], lender_rows = _measure(lambda: Lender.query.all(), repeat)
+    stages['index_build'], _ = _measure(lender_index.rebuild, repeat)
+    stages['index_candidates'], _ = _measure(
+        lambda: [lender_index.candidate_ids(project) for project in sample], repeat)
+    stages['candidate_query_sql'], _ = _measure(
+        lambda: [candidate_lender_query(project).all() for project in sample], repeat)
+
+    stages['scoring_python'], _ = _measure(
+        lambda: [[calculate_match_score(project, lender) for lender in lender_rows] for project in sample], repeat)
+    stages['matrix_encode'], matrix = _measure(lambda: LenderCriteriaMatrix(lender_rows), repeat)
+    stages['scoring_numpy'], _ = _measure(lambda: list(iter_score_matrix(sample, matrix)), repeat)
+
+    stages['find_matching_lenders'], matches = _measure(
+        lambda: [find_matching_lenders(project) for project in sample], repeat)
+
+    def persist():
+        for project, project_matches in zip(sample, matches):
+            save_project_matches(project, project_matches)
+        db.session.commit()
+        count = sum(len(project_matches) for project_matches in matches)
+        # Leave the table empty so every repeat inserts the full match set
+        db.session.connection().execute(db.metadata.tables['lender_matches'].delete())
+        db.session.commit()
+        return count
+
+    stages['match_persistence'], persisted = _measure(persist, repeat)
+
+    return {
+        'lenders': lenders,
+        'projects': len(sample),
+        'matches': persisted,
+        'seconds': stages,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL,
+                                       cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = {run['lenders']: run for run in json.load(f)['runs']}
+    with open(after_path) as f:
+        after = json.load(f)
+
+    print(f"{'lenders':>8}  {'stage':<24} {'before':>10} {'after':>10} {'change':>8}")
+    for run in after['runs']:
+        baseline = before.get(run['lenders'])
+        if not baseline:
+            continue
+        for stage, seconds in run['seconds'].items():
+            previous = baseline['seconds'].get(stage)
+            if previous is None:
+                continue
+            change = (seconds - previous) / previous * 100 if previous else 0.0
+            print(f"{run['lenders']:>8}  {stage:<24} {previous:>10.4f} {seconds:>10.4f} {change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Matching micro-benchmarks')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                        help='Lender book sizes to benchmark')
+    parser.add_argument('--projects', type=int, default=20, help='Projects scored per size')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per stage; the median is reported')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='Write results JSON to this file (default: stdout)')
+    parser.add_argument('--compare', nargs=2, metavar=('BEFORE', 'AFTER'), help='Compare two result files')
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    app = create_app(BenchmarkConfig)
+    with app.app_context():
+        runs = []
+        for size in args.sizes:
+            runs.append(run_size(size, args.projects, args.repeat, args.seed))
+            print(f'{size} lenders done', file=sys.stderr)
+
+    results = {
+        'commit': _git_commit(),
+        'created_at': datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'database': BenchmarkConfig.SQLALCHEMY_DATABASE_URI.split(':', 1)[0],
+        'seed': args.seed,
+        'repeat': args.repeat,
+        'runs': runs,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
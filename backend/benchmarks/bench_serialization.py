@@ -0,0 +1,120 @@
+"""
+Serialization cost of a match listing: hydrated ORM objects with to_dict and
+Flask's encoder versus the column-projected field plans, with orjson and with
+the fallback encoder.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_serialization [--sizes 10000] [--repeat 5]
+
+Runs against in-memory SQLite unless BENCH_DATABASE_URL points elsewhere.
+"""
+import argparse
+import os
+import statistics
+import time
+from flask import json
+from sqlalchemy.orm import joinedload
+from config import Config
+from extensions import db
+from app import create_app
+from app.models.models import Borrower, Lender, LenderMatch
+from app.utils import serialization
+from app.utils.match_store import write_matches
+from benchmarks import synthetic
+
+# Lenders per project; sizes are reached by adding projects
+LENDERS = 1000
+
+
+class BenchmarkConfig(Config):
+    SQLALCHEMY_DATABASE_URI = os.environ.get('BENCH_DATABASE_URL', 'sqlite://')
+    JWT_SECRET_KEY = 'benchmark'
+    MATCH_JOB_WORKERS = 0
+
+
+def _seed(size):
+    """size matches spread over size / LENDERS projects."""
+    db.drop_all()
+    db.create_all()
+    ids = synthetic.seed(lenders=min(size, LENDERS), projects=max(size // LENDERS, 1))
+    borrower_id = ids['borrower_ids'][0]
+    rows = [
+        {'id': f'{project_id[:18]}{lender_id[:18]}', 'project_id': project_id, 'lender_id': lender_id,
+         'borrower_id': borrower_id, 'match_score': 0.75}
+        for project_id in ids['project_ids']
+        for lender_id in ids['lender_ids']
+    ][:size]
+    write_matches(rows)
+    db.session.commit()
+
+
+def _median(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        db.session.expunge_all()
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings)
+
+
+def orm_to_dict():
+    """The previous path: joinedload, to_dict per object and Flask's encoder."""
+    matches = LenderMatch.query.options(
+        joinedload(LenderMatch.project),
+        joinedload(LenderMatch.borrower).joinedload(Borrower.user),
+        joinedload(LenderMatch.lender).joinedload(Lender.user)
+    ).order_by(LenderMatch.created_at.desc(), LenderMatch.id.desc()).all()
+
+    result = []
+    for match in matches:
+        match_data = match.to_dict()
+        match_data['project'] = match.project.to_dict()
+        for party, record in (('borrower', match.borrower), ('lender', match.lender)):
+            match_data[party] = {
+                'id': record.id,
+                'company_name': record.user.company_name,
+                'first_name': record.user.first_name,
+                'last_name': record.user.last_name
+            }
+        result.append(match_data)
+    return json.dumps(result)
+
+
+def projected(listing):
+    rows = listing.query().order_by(LenderMatch.created_at.desc(), LenderMatch.id.desc()).all()
+    return serialization.dumps([listing.serialize(row) for row in rows])
+
+
+def run(size, repeat):
+    _seed(size)
+    results = {'orm_to_dict': _median(orm_to_dict, repeat)}
+
+    encoder = serialization.orjson
+    if encoder is not None:
+        results['projected_orjson'] = _median(lambda: projected(serialization.MatchListing()), repeat)
+    serialization.orjson = None
+    try:
+        results['projected_stdlib'] = _median(lambda: projected(serialization.MatchListing()), repeat)
+    finally:
+        serialization.orjson = encoder
+
+    return {name: (seconds, size / seconds if seconds else float('inf')) for name, seconds in results.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = create_app(BenchmarkConfig)
+    with app.test_request_context():
+        print(f"{'matches':>8}  {'path':<17} {'seconds':>9} {'rows/sec':>12}")
+        for size in args.sizes:
+            for name, (seconds, rate) in run(size, args.repeat).items():
+                print(f'{size:>8}  {name:<17} {seconds:>9.4f} {rate:>12,.0f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+"""
+Deterministic synthetic lenders and projects for the matching benchmarks.
+
+Distributions follow the seed data in db_schema.sql: a long tail of asset types,
+purchase/refinance dominated deal types, mostly debt capital, and log-normal loan
+sizes between a few hundred thousand and a hundred million dollars.
+"""
+import json
+import math
+import random
+import uuid
+from datetime import datetime
+from extensions import db
+from app.models.models import User, Borrower, Lender, LenderCriterionValue, Project
+
+ASSET_TYPES = {
+    'residential': 12, 'office': 9, 'retail': 8, 'industrial': 8, 'mixed-use': 7, 'multi-family': 6,
+    'commercial': 4, 'hotel': 3, 'warehouse': 2, 'single-family': 1, 'logistics': 1,
+    'student housing': 1, 'medical office': 1, 'resort': 1,
+}
+DEAL_TYPES = {
+    'purchase': 18, 'refinance': 13, 'value-add': 7, 'construction': 5, 'development': 4,
+    'renovation': 3, 'sale-leaseback': 1, 'recapitalization': 1,
+}
+CAPITAL_TYPES = {
+    'debt': 36, 'equity': 14, 'mezzanine': 3, 'preferred equity': 2, 'joint venture': 1,
+}
+REGIONS = ['Northeast', 'Southeast', 'Midwest', 'Southwest', 'West', 'Mid-Atlantic', 'Pacific Northwest']
+
+
+def _sample(rng, weights, low, high):
+    """Distinct weighted picks, between low and high of them."""
+    values, weight_list = list(weights), list(weights.values())
+    picks = set()
+    for _ in range(rng.randint(low, high)):
+        picks.add(rng.choices(values, weight_list)[0])
+    return sorted(picks)
+
+
+def _loan_size(rng, median, sigma):
+    # Round to the nearest 50k like real term sheets
+    return max(50000, int(round(rng.lognormvariate(math.log(median), sigma) / 50000)) * 50000)
+
+
+def _uuid(rng):
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def lending_criteria(rng):
+    """One lender's criteria dict, as stored in Lender.lending_criteria."""
+    criteria = {
+        'asset_types': _sample(rng, ASSET_TYPES, 1, 4),
+        'deal_types': _sample(rng, DEAL_TYPES, 1, 3),
+        'capital_types': _sample(rng, CAPITAL_TYPES, 1, 2),
+        'preferred_regions': rng.sample(REGIONS, rng.randint(1, 3)),
+    }
+    # A minority of lenders leave the loan range open
+    if rng.random() < 0.9:
+        min_size = _loan_size(rng, 2000000, 0.8)
+        criteria['min_loan_size'] = min_size
+        criteria['max_loan_size'] = min_size * rng.choice([5, 8, 10, 15, 20])
+    return criteria
+
+
+def project_values(rng):
+    """Column values of one Project row."""
+    debt_request = _loan_size(rng, 12000000, 0.9)
+    total_cost = int(debt_request * rng.uniform(1.2, 1.8))
+    return {
+        'project_address': f'{rng.randint(1, 9999)} Synthetic Ave',
+        'asset_type': rng.choices(list(ASSET_TYPES), list(ASSET_TYPES.values()))[0],
+        'deal_type': rng.choices(list(DEAL_TYPES), list(DEAL_TYPES.values()))[0],
+        'capital_type': rng.choices(list(CAPITAL_TYPES), list(CAPITAL_TYPES.values()))[0],
+        'debt_request': float(debt_request),
+        'total_cost': float(total_cost),
+        'completed_value': float(int(total_cost * rng.uniform(1.1, 1.5))),
+        'project_description': 'Synthetic benchmark project',
+    }
+
+
+def seed(lenders, projects, borrowers=1, seed=0, batch_size=5000):
+    """
+    Insert users, lenders, borrowers and projects with Core executemany and commit.
+
+    Args:
+        lenders: Number of lenders
+        projects: Number of projects, spread over the borrowers
+        borrowers: Number of borrowers
+        seed: Random seed; the same seed always produces the same rows
+        batch_size: Rows per executemany
+
+    Returns:
+        dict: 'lender_ids', 'borrower_ids' and 'project_ids' lists
+    """
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    connection = db.session.connection()
+
+    def insert(table, rows):
+        for start in range(0, len(rows), batch_size):
+            connection.execute(table.insert(), rows[start:start + batch_size])
+
+    lender_ids = [_uuid(rng) for _ in range(lenders)]
+    borrower_ids = [_uuid(rng) for _ in range(borrowers)]
+
+    insert(User.__table__, [
+        {'id': user_id, 'email': f'{user_id}@synthetic.test', 'role': role, 'created_at': now, 'updated_at': now}
+        for role, ids in (('lender', lender_ids), ('borrower', borrower_ids))
+        for user_id in ids
+    ])
+    lender_rows, value_rows = [], []
+    for lender_id in lender_ids:
+        criteria = lending_criteria(rng)
+        lender_rows.append({
+            'id': lender_id,
+            'lending_criteria': json.dumps(criteria),
+            'min_loan_size': criteria.get('min_loan_size'),
+            'max_loan_size': criteria.get('max_loan_size'),
+            'criteria_normalized': True,
+            'created_at': now,
+            'updated_at': now,
+        })
+        value_rows.extend({'lender_id': lender_id, 'criterion': criterion, 'value': value}
+                          for criterion in Lender.CATEGORICAL_CRITERIA
+                          for value in criteria[criterion])
+    insert(Lender.__table__, lender_rows)
+    insert(LenderCriterionValue.__table__, value_rows)
+    insert(Borrower.__table__, [
+        {'id': borrower_id, 'created_at': now, 'updated_at': now}
+        for borrower_id in borrower_ids
+    ])
+
+    project_rows = [
+        {'id': _uuid(rng), 'borrower_id': borrower_ids[i % borrowers], 'created_at': now, 'updated_at': now,
+         **project_values(rng)}
+        for i in range(projects)
+    ]
+    insert(Project.__table__, project_rows)
+
+    db.session.commit()
+
+    return {
+        'lender_ids': lender_ids,
+        'borrower_ids': borrower_ids,
+        'project_ids': [row['id'] for row in project_rows],
+    }
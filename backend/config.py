@@ -7,5 +7,40 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=1)
+    JWT_REFRESH_TOKEN_EXPIRES = timedelta(days=30)
+    # How long a worker trusts its cached users.token_version before rechecking
+    TOKEN_VERSION_CACHE_SECONDS = int(os.environ.get('TOKEN_VERSION_CACHE_SECONDS', 30))
+    # Revoked refresh tokens are cached for good; live ones are rechecked after this long
+    REFRESH_TOKEN_CACHE_SECONDS = int(os.environ.get('REFRESH_TOKEN_CACHE_SECONDS', 30))
+    REFRESH_TOKEN_CACHE_SIZE = int(os.environ.get('REFRESH_TOKEN_CACHE_SIZE', 10000))
+
+    # Password hashing pool; raise the iterations to have hashes upgraded on login
+    # Workers + queue size must stay below gunicorn's threads for the 429 limit to apply
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:260000')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_QUEUE_SIZE = int(os.environ.get('PASSWORD_HASH_QUEUE_SIZE', 32))
+
+    # Response compression; bodies under COMPRESS_MIN_SIZE bytes are sent uncompressed
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+
+    # Server-sent events; 'postgres' shares events between workers with LISTEN/NOTIFY
+    EVENT_BACKEND = os.environ.get('EVENT_BACKEND', 'memory')
+    EVENT_CHANNEL = os.environ.get('EVENT_CHANNEL', 'app_events')
+    EVENT_BUFFER_SIZE = int(os.environ.get('EVENT_BUFFER_SIZE', 1000))
+    EVENT_QUEUE_SIZE = int(os.environ.get('EVENT_QUEUE_SIZE', 100))
+    SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', 15))
+    SSE_MAX_STREAM_SECONDS = int(os.environ.get('SSE_MAX_STREAM_SECONDS', 300))
+    # Each open stream holds a worker thread; keep this below gunicorn's threads
+    SSE_MAX_CONNECTIONS = int(os.environ.get('SSE_MAX_CONNECTIONS', 50))
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+    JSON_FIELD_CACHE_SIZE = int(os.environ.get('JSON_FIELD_CACHE_SIZE', 10000))
 
+    # Background matching: 0 workers runs match jobs inline in the request
+    MATCH_JOB_WORKERS = int(os.environ.get('MATCH_JOB_WORKERS', 2))
+    MATCH_JOB_LEASE_SECONDS = int(os.environ.get('MATCH_JOB_LEASE_SECONDS', 300))
+    # Must stay well under the lease, or jobs that are still running get requeued
+    MATCH_JOB_HEARTBEAT_SECONDS = int(os.environ.get('MATCH_JOB_HEARTBEAT_SECONDS', 60))
+    MATCH_JOB_MAX_ATTEMPTS = int(os.environ.get('MATCH_JOB_MAX_ATTEMPTS', 3))
+    MATCH_JOB_SWEEP_SECONDS = int(os.environ.get('MATCH_JOB_SWEEP_SECONDS', 60))
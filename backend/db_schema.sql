@@ -2,15 +2,21 @@
 -- Database schema and extensive seed data for the Real Estate Matching Platform
 
 -- Drop tables if they exist (in reverse order of dependencies)
+DROP TABLE IF EXISTS message_read_cursors;
+DROP TABLE IF EXISTS unread_counters;
+DROP TABLE IF EXISTS refresh_tokens;
+DROP TABLE IF EXISTS match_jobs;
 DROP TABLE IF EXISTS communications;
 DROP TABLE IF EXISTS introduction_requests;
 DROP TABLE IF EXISTS lender_matches;
 DROP TABLE IF EXISTS documents;
 DROP TABLE IF EXISTS projects;
 DROP TABLE IF EXISTS mediators;
+DROP TABLE IF EXISTS lender_criteria_values;
 DROP TABLE IF EXISTS lenders;
 DROP TABLE IF EXISTS borrowers;
 DROP TABLE IF EXISTS users;
+DROP SEQUENCE IF EXISTS event_ids;
 
 -- Create tables
 CREATE TABLE users (
@@ -22,6 +28,7 @@ CREATE TABLE users (
     company_name VARCHAR(100),
     phone_number VARCHAR(20),
     role VARCHAR(20) NOT NULL,
+    token_version INTEGER NOT NULL DEFAULT 0,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
@@ -36,10 +43,20 @@ CREATE TABLE borrowers (
 CREATE TABLE lenders (
     id VARCHAR(36) PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
     lending_criteria TEXT,
+    min_loan_size FLOAT,
+    max_loan_size FLOAT,
+    criteria_normalized BOOLEAN,
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE TABLE lender_criteria_values (
+    lender_id VARCHAR(36) NOT NULL REFERENCES lenders(id) ON DELETE CASCADE,
+    criterion VARCHAR(20) NOT NULL,
+    value VARCHAR(50) NOT NULL,
+    PRIMARY KEY (lender_id, criterion, value)
+);
+
 CREATE TABLE mediators (
     id VARCHAR(36) PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
     commission_rate FLOAT,
@@ -78,8 +95,10 @@ CREATE TABLE lender_matches (
     project_id VARCHAR(36) NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
     lender_id VARCHAR(36) NOT NULL REFERENCES lenders(id) ON DELETE CASCADE,
     borrower_id VARCHAR(36) NOT NULL REFERENCES borrowers(id) ON DELETE CASCADE,
-    match_score FLOAT,
-    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    match_score FLOAT NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_lender_matches_project_lender UNIQUE (project_id, lender_id)
 );
 
 CREATE TABLE introduction_requests (
@@ -102,15 +121,73 @@ CREATE TABLE communications (
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE TABLE match_jobs (
+    id VARCHAR(36) PRIMARY KEY,
+    project_id VARCHAR(36) NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    status VARCHAR(20) DEFAULT 'pending',
+    attempts INTEGER DEFAULT 0,
+    match_count INTEGER,
+    worker_id VARCHAR(64),
+    error TEXT,
+    heartbeat_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE refresh_tokens (
+    jti VARCHAR(36) PRIMARY KEY,
+    user_id VARCHAR(36) NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    family_id VARCHAR(36) NOT NULL,
+    replaced_by VARCHAR(36),
+    expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    revoked_at TIMESTAMP WITH TIME ZONE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE unread_counters (
+    user_id VARCHAR(36) NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    project_id VARCHAR(36) NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    unread_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, project_id)
+);
+
+CREATE TABLE message_read_cursors (
+    user_id VARCHAR(36) NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    project_id VARCHAR(36) NOT NULL REFERENCES projects(id) ON DELETE CASCADE,
+    read_up_to_at TIMESTAMP WITH TIME ZONE NOT NULL,
+    read_up_to_id VARCHAR(36) NOT NULL,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (user_id, project_id)
+);
+
+-- Ids of server-sent events, shared by all workers (EVENT_BACKEND=postgres)
+CREATE SEQUENCE event_ids;
+
 -- Create indexes for performance
 CREATE INDEX idx_projects_borrower_id ON projects(borrower_id);
+CREATE INDEX idx_lenders_min_loan_size ON lenders(min_loan_size);
+CREATE INDEX idx_lenders_max_loan_size ON lenders(max_loan_size);
+CREATE INDEX idx_lender_criteria_values_lookup ON lender_criteria_values(criterion, value, lender_id);
 CREATE INDEX idx_lender_matches_lender_id ON lender_matches(lender_id);
 CREATE INDEX idx_lender_matches_borrower_id ON lender_matches(borrower_id);
+-- Keyset pagination of match listings: (created_at, id) and (match_score, id), globally and per filter
+CREATE INDEX idx_lender_matches_created ON lender_matches(created_at, id);
+CREATE INDEX idx_lender_matches_score ON lender_matches(match_score, id);
+CREATE INDEX idx_lender_matches_lender_created ON lender_matches(lender_id, created_at, id);
+CREATE INDEX idx_lender_matches_lender_score ON lender_matches(lender_id, match_score, id);
+CREATE INDEX idx_lender_matches_borrower_created ON lender_matches(borrower_id, created_at, id);
+CREATE INDEX idx_lender_matches_borrower_score ON lender_matches(borrower_id, match_score, id);
+CREATE INDEX idx_lender_matches_project_created ON lender_matches(project_id, created_at, id);
+CREATE INDEX idx_lender_matches_project_score ON lender_matches(project_id, match_score, id);
+CREATE INDEX idx_projects_asset_type ON projects(asset_type);
 CREATE INDEX idx_introduction_requests_lender_id ON introduction_requests(lender_id);
 CREATE INDEX idx_introduction_requests_borrower_id ON introduction_requests(borrower_id);
 CREATE INDEX idx_communications_sender_id ON communications(sender_id);
 CREATE INDEX idx_communications_recipient_id ON communications(recipient_id);
-CREATE INDEX idx_communications_project_id ON communications(project_id);
+CREATE INDEX idx_communications_project_created ON communications(project_id, created_at, id);
+CREATE INDEX idx_match_jobs_status ON match_jobs(status);
+CREATE INDEX idx_refresh_tokens_user_id ON refresh_tokens(user_id);
+CREATE INDEX idx_refresh_tokens_family_id ON refresh_tokens(family_id);
 
 -- ===========================
 -- EXTENSIVE SEED DATA
@@ -445,4 +522,44 @@ VALUES
 ('d1000000-0000-0000-0000-000000001017', 'p3000000-0000-0000-0000-000000000030', 'b1500000-0000-0000-0000-000000000015', 'building_condition_report.pdf', 'application/pdf', 'projects/p3000000-0000-0000-0000-000000000030/building_condition_report.pdf', 'Engineering assessment of the building condition', CURRENT_TIMESTAMP - INTERVAL '10 days'),
 ('d1000000-0000-0000-0000-000000001018', 'p3500000-0000-0000-0000-000000000035', 'b1800000-0000-0000-0000-000000000018', 'historic_tax_credits.pdf', 'application/pdf', 'projects/p3500000-0000-0000-0000-000000000035/historic_tax_credits.pdf', 'Analysis of available historic tax credits for the property', CURRENT_TIMESTAMP - INTERVAL '5 days'),
 ('d1000000-0000-0000-0000-000000001019', 'p4000000-0000-0000-0000-000000000040', 'b2000000-0000-0000-0000-000000000020', 'tech_tenants_overview.pptx', 'application/vnd.openxmlformats-officedocument.presentationml.presentation', 'projects/p4000000-0000-0000-0000-000000000040/tech_tenants_overview.pptx', 'Presentation on the technology tenant landscape in Silicon Valley', CURRENT_TIMESTAMP - INTERVAL '12 hours'),
-('d1000000-0000-0000-0000-000000001020', 'p4700000-0000-0000-0000-000000000047', 'b7000000-0000-0000-0000-000000000007', 'construction_schedule.pdf', 'application/pdf', 'projects/p4700000-0000-0000-0000-000000000047/construction_schedule.pdf', 'Detailed construction timeline and milestones', CURRENT_TIMESTAMP - INTERVAL '4 hours');
\ No newline at end of file
+('d1000000-0000-0000-0000-000000001020', 'p4700000-0000-0000-0000-000000000047', 'b7000000-0000-0000-0000-000000000007', 'construction_schedule.pdf', 'application/pdf', 'projects/p4700000-0000-0000-0000-000000000047/construction_schedule.pdf', 'Detailed construction timeline and milestones', CURRENT_TIMESTAMP - INTERVAL '4 hours');
+-- NORMALIZED LENDING CRITERIA
+-- Mirrors lenders.lending_criteria for SQL candidate selection; existing databases
+-- can run `flask backfill-lender-criteria` instead
+UPDATE lenders SET
+    min_loan_size = CASE WHEN lending_criteria::json ->> 'max_loan_size' IS NOT NULL
+                         THEN (lending_criteria::json ->> 'min_loan_size')::FLOAT END,
+    max_loan_size = CASE WHEN lending_criteria::json ->> 'min_loan_size' IS NOT NULL
+                         THEN (lending_criteria::json ->> 'max_loan_size')::FLOAT END,
+    criteria_normalized = TRUE
+WHERE lending_criteria IS NOT NULL;
+
+INSERT INTO lender_criteria_values (lender_id, criterion, value)
+SELECT DISTINCT lenders.id, criteria.criterion, json_array_elements_text(lenders.lending_criteria::json -> criteria.criterion)
+FROM lenders
+CROSS JOIN (VALUES ('asset_types'), ('deal_types'), ('capital_types')) AS criteria(criterion)
+WHERE lenders.lending_criteria IS NOT NULL;
+
+-- READ CURSORS AND UNREAD COUNTERS
+-- Derived from the seeded communications: each recipient has read up to the message
+-- before their first unread one. Existing databases can run `flask backfill-read-cursors` instead
+INSERT INTO message_read_cursors (user_id, project_id, read_up_to_at, read_up_to_id)
+SELECT DISTINCT ON (recipient_id, project_id) recipient_id, project_id, created_at, id
+FROM (
+    SELECT recipient_id, project_id, created_at, id,
+           bool_and(is_read IS NOT FALSE) OVER (
+               PARTITION BY recipient_id, project_id ORDER BY created_at, id
+           ) AS read_so_far
+    FROM communications
+) AS messages
+WHERE read_so_far
+ORDER BY recipient_id, project_id, created_at DESC, id DESC;
+
+INSERT INTO unread_counters (user_id, project_id, unread_count)
+SELECT communications.recipient_id, communications.project_id, COUNT(*)
+FROM communications
+LEFT JOIN message_read_cursors AS cursors
+    ON cursors.user_id = communications.recipient_id AND cursors.project_id = communications.project_id
+WHERE cursors.user_id IS NULL
+   OR (communications.created_at, communications.id) > (cursors.read_up_to_at, cursors.read_up_to_id)
+GROUP BY communications.recipient_id, communications.project_id;
@@ -0,0 +1,21 @@
+"""
+Gunicorn settings: gunicorn -c gunicorn.conf.py run:app
+
+Workers are threaded. Every open /events/stream connection holds a thread for up
+to SSE_MAX_STREAM_SECONDS, so the per-process SSE_MAX_CONNECTIONS must stay below
+the thread count to leave threads for ordinary requests. Use EVENT_BACKEND=postgres
+with more than one worker so every worker sees every event.
+
+Threads are also what lets logins queue for the password hashing pool: with more
+threads than PASSWORD_HASH_WORKERS + PASSWORD_HASH_QUEUE_SIZE, a login burst beyond
+the queue is answered with a 429 instead of waiting.
+"""
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:5050')
+workers = int(os.environ.get('GUNICORN_WORKERS', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 64))
+# gthread workers keep checking in while streams are open; this is not a request time limit
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
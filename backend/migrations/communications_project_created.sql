@@ -0,0 +1,13 @@
+-- communications_project_created.sql
+-- Adds idx_communications_project_created, which message thread windows and read
+-- cursor range counts read in (project_id, created_at, id) order. It replaces
+-- idx_communications_project_id, whose single column is its prefix.
+-- Safe to run more than once: psql -f migrations/communications_project_created.sql
+--
+-- CONCURRENTLY keeps the table writable while the index builds; it cannot run
+-- inside a transaction, so do not wrap this file in one. A build that fails leaves an
+-- INVALID index that IF NOT EXISTS then skips; drop it and rerun.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_communications_project_created
+    ON communications(project_id, created_at, id);
+DROP INDEX CONCURRENTLY IF EXISTS idx_communications_project_id;
@@ -0,0 +1,5 @@
+-- event_ids_sequence.sql
+-- Creates the sequence that numbers server-sent events for EVENT_BACKEND=postgres.
+-- Safe to run more than once: psql -f migrations/event_ids_sequence.sql
+
+CREATE SEQUENCE IF NOT EXISTS event_ids;
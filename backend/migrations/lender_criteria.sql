@@ -0,0 +1,20 @@
+-- lender_criteria.sql
+-- Adds the normalized lending criteria: the loan size and criteria_normalized columns
+-- on lenders and the lender_criteria_values table, with their indexes.
+-- Safe to run more than once: psql -f migrations/lender_criteria.sql
+-- Then fill them in with: flask backfill-lender-criteria
+
+ALTER TABLE lenders ADD COLUMN IF NOT EXISTS min_loan_size FLOAT;
+ALTER TABLE lenders ADD COLUMN IF NOT EXISTS max_loan_size FLOAT;
+ALTER TABLE lenders ADD COLUMN IF NOT EXISTS criteria_normalized BOOLEAN;
+
+CREATE TABLE IF NOT EXISTS lender_criteria_values (
+    lender_id VARCHAR(36) NOT NULL REFERENCES lenders(id) ON DELETE CASCADE,
+    criterion VARCHAR(20) NOT NULL,
+    value VARCHAR(50) NOT NULL,
+    PRIMARY KEY (lender_id, criterion, value)
+);
+
+CREATE INDEX IF NOT EXISTS idx_lenders_min_loan_size ON lenders(min_loan_size);
+CREATE INDEX IF NOT EXISTS idx_lenders_max_loan_size ON lenders(max_loan_size);
+CREATE INDEX IF NOT EXISTS idx_lender_criteria_values_lookup ON lender_criteria_values(criterion, value, lender_id);
@@ -0,0 +1,21 @@
+-- lender_matches_keyset.sql
+-- Adds the composite indexes that keyset pagination of match listings reads
+-- (see app/utils/pagination.py) and makes match_score NOT NULL, since a NULL in the
+-- (match_score, id) key would end score-ordered paging early.
+-- Safe to run more than once: psql -f migrations/lender_matches_keyset.sql
+--
+-- CONCURRENTLY keeps the table writable while a large index builds; it cannot run
+-- inside a transaction, so do not wrap this file in one. A build that fails leaves an
+-- INVALID index that IF NOT EXISTS then skips; drop it and rerun.
+
+UPDATE lender_matches SET match_score = 0 WHERE match_score IS NULL;
+ALTER TABLE lender_matches ALTER COLUMN match_score SET NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_lender_matches_created ON lender_matches(created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_lender_matches_score ON lender_matches(match_score, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_lender_matches_lender_created ON lender_matches(lender_id, created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_lender_matches_lender_score ON lender_matches(lender_id, match_score, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_lender_matches_borrower_created ON lender_matches(borrower_id, created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_lender_matches_borrower_score ON lender_matches(borrower_id, match_score, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_lender_matches_project_created ON lender_matches(project_id, created_at, id);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_lender_matches_project_score ON lender_matches(project_id, match_score, id);
@@ -0,0 +1,31 @@
+-- lender_matches_unique_pair.sql
+-- Adds uq_lender_matches_project_lender, which the ON CONFLICT (project_id, lender_id)
+-- upsert in app/utils/match_store.py requires. Duplicate pairs are deleted first,
+-- keeping the row with the highest id of each pair.
+-- Safe to run more than once: psql -f migrations/lender_matches_unique_pair.sql
+
+BEGIN;
+
+-- Block writers until the constraint exists so no new duplicate slips in
+LOCK TABLE lender_matches IN SHARE ROW EXCLUSIVE MODE;
+
+DELETE FROM lender_matches duplicate
+USING lender_matches kept
+WHERE duplicate.project_id = kept.project_id
+  AND duplicate.lender_id = kept.lender_id
+  AND duplicate.id < kept.id;
+
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conname = 'uq_lender_matches_project_lender'
+          AND conrelid = 'lender_matches'::regclass
+    ) THEN
+        ALTER TABLE lender_matches
+            ADD CONSTRAINT uq_lender_matches_project_lender UNIQUE (project_id, lender_id);
+    END IF;
+END
+$$;
+
+COMMIT;
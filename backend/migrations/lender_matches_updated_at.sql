@@ -0,0 +1,5 @@
+-- lender_matches_updated_at.sql
+-- Adds lender_matches.updated_at, which match listing ETags read to notice rescoring.
+-- Safe to run more than once: psql -f migrations/lender_matches_updated_at.sql
+
+ALTER TABLE lender_matches ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP;
@@ -0,0 +1,5 @@
+-- users_token_version.sql
+-- Adds users.token_version, which every access and refresh token carries as its 'ver' claim.
+-- Safe to run more than once: psql -f migrations/users_token_version.sql
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS token_version INTEGER NOT NULL DEFAULT 0;
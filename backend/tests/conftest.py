@@ -0,0 +1,50 @@
+import os
+import sys
+from contextlib import contextmanager
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import Config
+from extensions import db
+from app import create_app
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SECRET_KEY = 'test'
+    JWT_SECRET_KEY = 'test'
+    MATCH_JOB_WORKERS = 0
+
+
+@contextmanager
+def app_with_database():
+    """An app on a fresh in-memory database, with its context pushed."""
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        try:
+            yield app
+        finally:
+            db.session.remove()
+            db.drop_all()
+
+
+@pytest.fixture
+def app():
+    with app_with_database() as app:
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def register(client, email, role):
+    """Register a user through the API and return (user id, Authorization headers)."""
+    response = client.post('/auth/register', json={'email': email, 'password': 'password123', 'role': role})
+    assert response.status_code == 201, response.get_json()
+    body = response.get_json()
+    return body['user']['id'], {'Authorization': f"Bearer {body['access_token']}"}
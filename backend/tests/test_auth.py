@@ -0,0 +1,28 @@
+from tests.conftest import register
+
+
+def test_change_password_revokes_old_tokens_at_once(client):
+    _, headers = register(client, 'borrower@example.com', 'borrower')
+    # Caches the current token version in this worker
+    assert client.get('/auth/profile', headers=headers).status_code == 200
+
+    response = client.post('/auth/change-password', headers=headers,
+                           json={'currentPassword': 'password123', 'newPassword': 'password456'})
+    assert response.status_code == 200
+    new_headers = {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+
+    assert client.get('/auth/profile', headers=headers).status_code == 401
+    assert client.get('/auth/profile', headers=new_headers).status_code == 200
+
+
+def test_logout_all_revokes_refresh_tokens(client):
+    response = client.post('/auth/register',
+                           json={'email': 'lender@example.com', 'password': 'password123', 'role': 'lender'})
+    body = response.get_json()
+    headers = {'Authorization': f"Bearer {body['access_token']}"}
+    refresh_headers = {'Authorization': f"Bearer {body['refresh_token']}"}
+
+    assert client.post('/auth/logout-all', headers=headers).status_code == 200
+
+    assert client.get('/auth/profile', headers=headers).status_code == 401
+    assert client.post('/auth/refresh', headers=refresh_headers).status_code == 401
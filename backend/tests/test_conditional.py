@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta, timezone
+from extensions import db
+from app.models.models import LenderMatch, Project
+from app.utils.conditional import not_modified
+from app.utils.match_store import update_match_scores
+from tests.conftest import register
+
+
+def test_swapped_scores_change_match_etag(app, client):
+    borrower_id, _ = register(client, 'borrower@example.com', 'borrower')
+    lender_ids = [register(client, f'lender{n}@example.com', 'lender')[0] for n in range(2)]
+    _, headers = register(client, 'mediator@example.com', 'mediator')
+
+    project = Project(borrower_id=borrower_id, project_address='1 Test St', asset_type='office',
+                      deal_type='purchase', capital_type='debt')
+    db.session.add(project)
+    db.session.flush()
+    matches = [LenderMatch(project_id=project.id, lender_id=lender_id, borrower_id=borrower_id, match_score=score)
+               for lender_id, score in zip(lender_ids, (0.9, 0.4))]
+    db.session.add_all(matches)
+    db.session.commit()
+
+    etag = client.get('/mediator/matches', headers=headers).headers['ETag']
+    update_match_scores([(matches[0].id, 0.4), (matches[1].id, 0.9)])
+    db.session.commit()
+
+    response = client.get('/mediator/matches', headers={**headers, 'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+
+
+def test_last_modified_waits_for_its_second_to_end(client):
+    _, headers = register(client, 'borrower@example.com', 'borrower')
+
+    response = client.get('/auth/profile', headers=headers)
+    assert 'Last-Modified' not in response.headers
+
+    # A date from the current second never answers 304
+    since = datetime.utcnow().strftime('%a, %d %b %Y %H:%M:%S GMT')
+    response = client.get('/auth/profile', headers={**headers, 'If-Modified-Since': since})
+    assert response.status_code == 200
+
+
+def test_aware_last_modified_is_compared_in_utc(app):
+    # PostgreSQL returns TIMESTAMP WITH TIME ZONE columns timezone-aware
+    last_modified = datetime(2024, 1, 1, 14, 0, tzinfo=timezone(timedelta(hours=2)))
+
+    with app.test_request_context(headers={'If-Modified-Since': 'Mon, 01 Jan 2024 12:00:00 GMT'}):
+        cached = not_modified('tag', last_modified)
+        assert cached is not None and cached.status_code == 304
+        assert cached.headers['Last-Modified'] == 'Mon, 01 Jan 2024 12:00:00 GMT'
+
+    with app.test_request_context(headers={'If-Modified-Since': 'Mon, 01 Jan 2024 11:59:59 GMT'}):
+        assert not_modified('tag', last_modified) is None
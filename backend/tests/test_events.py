@@ -0,0 +1,40 @@
+from app.utils.events import MATCH_EVENT_DETAIL_LIMIT, PENDING_EVENTS_KEY, event_bus, stage_match_events
+from tests.conftest import register
+
+
+class FakeSession:
+    def __init__(self):
+        self.info = {}
+
+
+def match_row(n, lender_id):
+    return {'id': f'match-{n}', 'project_id': f'project-{n}', 'lender_id': lender_id,
+            'borrower_id': f'borrower-{n}', 'match_score': 0.5}
+
+
+def test_match_events_are_coalesced_per_user():
+    session = FakeSession()
+    rows = [match_row(n, 'busy-lender') for n in range(MATCH_EVENT_DETAIL_LIMIT + 1)]
+    rows.append(match_row('quiet', 'quiet-lender'))
+
+    stage_match_events(session, rows)
+
+    by_user = {}
+    for event_type, user_ids, data in session.info[PENDING_EVENTS_KEY]:
+        for user_id in user_ids:
+            by_user.setdefault(user_id, []).append((event_type, data))
+    assert by_user['busy-lender'] == [('matches', {'count': MATCH_EVENT_DETAIL_LIMIT + 1})]
+    assert [event_type for event_type, _ in by_user['quiet-lender']] == ['match']
+    assert [event_type for event_type, _ in by_user['borrower-0']] == ['match']
+
+
+def test_streams_beyond_the_cap_are_refused(client):
+    _, headers = register(client, 'borrower@example.com', 'borrower')
+    max_connections = event_bus.max_connections
+    event_bus.max_connections = 0
+    try:
+        response = client.get('/events/stream', headers=headers)
+    finally:
+        event_bus.max_connections = max_connections
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
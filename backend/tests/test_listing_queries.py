@@ -0,0 +1,88 @@
+"""The listing endpoints must issue the same number of statements however many rows they return."""
+import pytest
+from sqlalchemy import event
+from extensions import db
+from app.models.models import User, Borrower, Lender, Project, LenderMatch, IntroductionRequest, Communication
+from tests.conftest import app_with_database, register
+
+SIZES = (10, 1000)
+
+LISTINGS = [
+    ('mediator', '/mediator/matches'),
+    ('lender', '/lender/matches'),
+    ('lender', '/lender/introduction-requests'),
+    ('borrower', '/borrower/matches'),
+    ('borrower', '/borrower/projects/{project_id}/messages'),
+]
+
+
+def _project(borrower_id):
+    project = Project(borrower_id=borrower_id, project_address='1 Test St', asset_type='office',
+                      deal_type='purchase', capital_type='debt')
+    db.session.add(project)
+    db.session.flush()
+    return project
+
+
+def _seed(client, rows):
+    """Users of every role, each with `rows` rows in every listing; returns (headers by role, project id)."""
+    _, mediator = register(client, 'mediator@test.com', 'mediator')
+    lender_id, lender = register(client, 'lender@test.com', 'lender')
+    borrower_id, borrower = register(client, 'borrower@test.com', 'borrower')
+
+    project = _project(borrower_id)
+    for i in range(rows):
+        other_borrower = User(email=f'borrower{i}@test.com', password_hash='x', role='borrower')
+        other_lender = User(email=f'lender{i}@test.com', password_hash='x', role='lender')
+        db.session.add_all([other_borrower, other_lender])
+        db.session.flush()
+        db.session.add_all([Borrower(id=other_borrower.id), Lender(id=other_lender.id)])
+        other_project = _project(other_borrower.id)
+
+        db.session.add_all([
+            LenderMatch(project_id=other_project.id, lender_id=lender_id, borrower_id=other_borrower.id,
+                        match_score=0.5),
+            LenderMatch(project_id=project.id, lender_id=other_lender.id, borrower_id=borrower_id, match_score=0.5),
+            IntroductionRequest(project_id=other_project.id, borrower_id=other_borrower.id, lender_id=lender_id),
+            Communication(project_id=project.id, sender_id=borrower_id, recipient_id=other_lender.id, message='Hi'),
+        ])
+    db.session.commit()
+
+    return {'mediator': mediator, 'lender': lender, 'borrower': borrower}, project.id
+
+
+def _statement_counts(rows):
+    """Statements issued by each listing when every listing holds `rows` rows."""
+    with app_with_database() as app:
+        client = app.test_client()
+        headers, project_id = _seed(client, rows)
+
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, 'before_cursor_execute', count)
+        try:
+            counts = {}
+            for role, url in LISTINGS:
+                statements.clear()
+                response = client.get(url.format(project_id=project_id), headers=headers[role])
+                body = response.get_json()
+                assert response.status_code == 200, (url, body)
+                assert len(body) >= rows, url
+                counts[url] = len(statements)
+            return counts
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', count)
+
+
+@pytest.fixture(scope='module')
+def statement_counts():
+    return {rows: _statement_counts(rows) for rows in SIZES}
+
+
+@pytest.mark.parametrize('url', [url for _, url in LISTINGS])
+def test_statement_count_does_not_grow_with_rows(statement_counts, url):
+    small, large = (statement_counts[rows][url] for rows in SIZES)
+    assert small == large, f'{url}: {small} statements for {SIZES[0]} rows, {large} for {SIZES[1]}'
@@ -0,0 +1,66 @@
+from datetime import datetime, timedelta
+from extensions import db
+from app.models.models import User, Borrower, Project, LenderMatch, MatchJob
+from app.utils.match_jobs import MatchJobRunner
+
+
+def _job():
+    user = User(email='borrower@test.com', password_hash='x', role='borrower')
+    db.session.add(user)
+    db.session.flush()
+    db.session.add(Borrower(id=user.id))
+    project = Project(borrower_id=user.id, project_address='1 Test St', asset_type='office',
+                      deal_type='purchase', capital_type='debt')
+    db.session.add(project)
+    db.session.flush()
+    job = MatchJob(project_id=project.id, status='pending', attempts=0)
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def _runner(app, worker):
+    runner = MatchJobRunner()
+    runner.app = app
+    runner.worker_id = worker
+    return runner
+
+
+def test_pending_job_is_claimed_by_one_process_only(app):
+    job_id = _job()
+    first, second = _runner(app, 'first'), _runner(app, 'second')
+
+    assert first._claim_pending(5) == [job_id]
+    assert second._claim_pending(5) == []
+    assert not second.run_job(job_id)
+    assert db.session.get(MatchJob, job_id).worker_id == 'first'
+
+
+def test_heartbeat_keeps_a_long_job_from_being_requeued(app):
+    job_id = _job()
+    runner = _runner(app, 'worker')
+    assert runner._claim(job_id)
+
+    job = db.session.get(MatchJob, job_id)
+    job.heartbeat_at = datetime.utcnow() - timedelta(days=1)
+    db.session.commit()
+
+    assert runner.heartbeat() == 1
+    runner.recover()
+    assert db.session.get(MatchJob, job_id).status == 'running'
+
+
+def test_run_that_lost_its_lease_writes_nothing(app):
+    job_id = _job()
+    stale, current = _runner(app, 'stale'), _runner(app, 'current')
+    assert stale._claim(job_id)
+
+    # The sweeper requeued the job and another process took it over
+    MatchJob.query.filter_by(id=job_id).update({'status': 'pending'})
+    db.session.commit()
+    assert current._claim(job_id)
+
+    assert not stale._run_claimed(job_id)
+    job = db.session.get(MatchJob, job_id)
+    assert (job.status, job.worker_id) == ('running', 'current')
+    assert LenderMatch.query.count() == 0
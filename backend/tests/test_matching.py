@@ -0,0 +1,64 @@
+"""Every matching path must return exactly what calculate_match_score says."""
+import random
+import pytest
+from extensions import db
+from app.models.models import User, Lender, Project
+from app.utils.lender_index import lender_index
+from app.utils.match_algorithm import (
+    batch_find_matching_lenders, calculate_match_score, find_matching_lenders, top_matching_lenders
+)
+from benchmarks import synthetic
+
+THRESHOLDS = (0.25, 0.5, 0.6, 0.75, 1.0)
+
+# Shapes the normalized columns cannot capture, scored on the fallback paths
+IRREGULAR_CRITERIA = [
+    {},
+    {'asset_types': 'office retail', 'deal_types': ['purchase']},
+    {'asset_types': ['office', 7], 'capital_types': ['debt'], 'min_loan_size': 1000000},
+    {'deal_types': ['refinance'], 'min_loan_size': 0, 'max_loan_size': 2 ** 60},
+]
+
+
+@pytest.fixture
+def book(app):
+    synthetic.seed(lenders=300, projects=60, seed=7)
+    for n, criteria in enumerate(IRREGULAR_CRITERIA):
+        user = User(email=f'irregular{n}@example.com', password_hash='x', role='lender')
+        db.session.add(user)
+        db.session.flush()
+        lender = Lender(id=user.id)
+        lender.set_lending_criteria(criteria)
+        db.session.add(lender)
+    db.session.commit()
+
+    lender_index.rebuild()
+    return Project.query.all(), Lender.query.all()
+
+
+def expected_matches(project, lenders, min_score):
+    scores = ((lender.id, calculate_match_score(project, lender)) for lender in lenders)
+    return sorted(((lender_id, score) for lender_id, score in scores if score >= min_score),
+                  key=lambda match: (-match[1], match[0]))
+
+
+def as_ids(matches):
+    return sorted(((lender.id, score) for lender, score in matches), key=lambda match: (-match[1], match[0]))
+
+
+@pytest.mark.parametrize('min_score', THRESHOLDS)
+def test_matching_paths_equal_calculate_match_score(book, min_score):
+    projects, lenders = book
+    batch = batch_find_matching_lenders(projects, lenders, min_score=min_score)
+
+    for project in projects:
+        expected = expected_matches(project, lenders, min_score)
+
+        assert as_ids(find_matching_lenders(project, min_score)) == expected
+        assert as_ids(find_matching_lenders(project, min_score, use_index=False)) == expected
+        assert as_ids(batch[project.id]) == expected
+
+        k = random.Random(project.id).randint(1, 25)
+        top = top_matching_lenders(project, k=k, min_score=min_score)
+        assert [score for _, score in top] == [score for _, score in expected[:k]]
+        assert all(calculate_match_score(project, lender) == score for lender, score in top)
@@ -0,0 +1,76 @@
+import base64
+import json
+import pytest
+from extensions import db
+from app.models.models import LenderMatch, Project
+from tests.conftest import register
+
+
+def make_cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+
+@pytest.mark.parametrize('payload', [
+    ['created_at', [[1], 'a']],
+    ['created_at', [{'dt': 5}, 'a']],
+    ['created_at', ['2024-01-01T00:00:00', 'a']],
+    ['created_at', [{'dt': '2024-01-01T00:00:00'}, 7]],
+    ['match_score', ['high', 'a']],
+    ['match_score', [True, 'a']],
+    ['match_score', [0.5, None]],
+    ['match_score', [None, 'a']],
+    ['unknown', [0.5, 'a']],
+    [['created_at'], [{'dt': '2024-01-01T00:00:00'}, 'a']],
+    {'created_at': 1, 'values': 2},
+    'created_at',
+])
+def test_tampered_cursor_is_rejected(client, payload):
+    _, headers = register(client, 'mediator@example.com', 'mediator')
+    sort = payload[0] if isinstance(payload, list) and payload[0] == 'match_score' else 'created_at'
+
+    response = client.get('/mediator/matches', headers=headers,
+                          query_string={'sort': sort, 'cursor': make_cursor(payload)})
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('payload', [
+    ['created_at', [{'dt': '2024-01-01T00:00:00'}, 'a']],
+    ['match_score', [1, 'a']],
+    ['match_score', [0.5, 'a']],
+])
+def test_well_formed_cursor_is_accepted(client, payload):
+    _, headers = register(client, 'mediator@example.com', 'mediator')
+
+    response = client.get('/mediator/matches', headers=headers,
+                          query_string={'sort': payload[0], 'cursor': make_cursor(payload)})
+    assert response.status_code == 200
+
+
+def test_score_order_pages_through_every_match(client):
+    borrower_id, _ = register(client, 'borrower@example.com', 'borrower')
+    lender_ids = [register(client, f'lender{n}@example.com', 'lender')[0] for n in range(5)]
+    _, headers = register(client, 'mediator@example.com', 'mediator')
+
+    project = Project(borrower_id=borrower_id, project_address='1 Test St', asset_type='office',
+                      deal_type='purchase', capital_type='debt')
+    db.session.add(project)
+    db.session.flush()
+    # Equal scores make the id the tie-breaker
+    scores = (0.9, 0.5, 0.5, 0.0, 0.7)
+    db.session.add_all([LenderMatch(project_id=project.id, lender_id=lender_id, borrower_id=borrower_id,
+                                    match_score=score) for lender_id, score in zip(lender_ids, scores)])
+    db.session.commit()
+
+    seen, cursor = [], None
+    while True:
+        query_string = {'sort': 'match_score', 'limit': 2}
+        if cursor:
+            query_string['cursor'] = cursor
+        response = client.get('/mediator/matches', headers=headers, query_string=query_string)
+        assert response.status_code == 200
+        seen += [match['match_score'] for match in response.get_json()]
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+
+    assert seen == [0.9, 0.7, 0.5, 0.5, 0.0]
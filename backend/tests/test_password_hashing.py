@@ -0,0 +1,30 @@
+import threading
+import pytest
+from flask import Flask
+from app.utils.password_hashing import PasswordHasher, PasswordHashingBusy
+
+
+def test_hashes_beyond_the_queue_are_rejected():
+    app = Flask(__name__)
+    app.config.update(PASSWORD_HASH_WORKERS=1, PASSWORD_HASH_QUEUE_SIZE=0)
+    hasher = PasswordHasher(app)
+
+    started, release = threading.Event(), threading.Event()
+
+    def slow_hash():
+        started.set()
+        release.wait(5)
+
+    # A concurrent request thread holds the only slot
+    thread = threading.Thread(target=hasher._run, args=(slow_hash,))
+    thread.start()
+    started.wait(5)
+    try:
+        with pytest.raises(PasswordHashingBusy):
+            hasher.hash('password123')
+    finally:
+        release.set()
+        thread.join()
+
+    assert hasher.stats()['rejected'] == 1
+    assert hasher.verify(hasher.hash('password123'), 'password123')
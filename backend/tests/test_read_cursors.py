@@ -0,0 +1,54 @@
+from datetime import datetime, timedelta
+from extensions import db
+from app.models.models import Communication, MessageReadCursor, Project, User
+from app.utils import read_cursors
+from app.utils.read_cursors import advance_read_cursor
+
+
+def _conversation(messages):
+    borrower = User(email='borrower@example.com', password_hash='x', role='borrower')
+    lender = User(email='lender@example.com', password_hash='x', role='lender')
+    db.session.add_all([borrower, lender])
+    db.session.flush()
+    project = Project(borrower_id=borrower.id, project_address='1 Test St', asset_type='office',
+                      deal_type='purchase', capital_type='debt')
+    db.session.add(project)
+    db.session.flush()
+
+    start = datetime(2024, 1, 1)
+    thread = [Communication(project_id=project.id, sender_id=borrower.id, recipient_id=lender.id, message='Hi',
+                            created_at=start + timedelta(minutes=n)) for n in range(messages)]
+    db.session.add_all(thread)
+    db.session.commit()
+    return lender.id, project.id, thread
+
+
+def test_concurrent_first_read_is_not_an_error(app, monkeypatch):
+    lender_id, project_id, thread = _conversation(3)
+    create_cursor = read_cursors._create_cursor
+
+    def lose_the_race(user_id, project_id, position):
+        # Another request creates the cursor between our lookup and our insert
+        db.session.add(MessageReadCursor(user_id=user_id, project_id=project_id,
+                                         read_up_to_at=thread[0].created_at, read_up_to_id=thread[0].id))
+        db.session.flush()
+        return create_cursor(user_id, project_id, position)
+
+    monkeypatch.setattr(read_cursors, '_create_cursor', lose_the_race)
+    cursor, covered = advance_read_cursor(lender_id, project_id, thread[2])
+    db.session.commit()
+
+    assert cursor.read_up_to_id == thread[2].id
+    # The message the other request already covered is not counted again
+    assert covered == 2
+
+
+def test_first_read_creates_the_cursor(app):
+    lender_id, project_id, thread = _conversation(3)
+
+    cursor, covered = advance_read_cursor(lender_id, project_id, thread[1])
+    db.session.commit()
+    assert (cursor.read_up_to_id, covered) == (thread[1].id, 2)
+
+    cursor, covered = advance_read_cursor(lender_id, project_id, thread[0])
+    assert (cursor.read_up_to_id, covered) == (thread[1].id, 0)